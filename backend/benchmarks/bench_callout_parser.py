@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Benchmark callouts.parse_callout against the regex chain it replaced.
+
+The old helpers are kept below verbatim as ``legacy_*``: the three-pass
+``_validate_callout``, the ``re.split`` in ``_estimate_duration`` and
+``MuscleInfoCache.normalize``, and the substring scans in
+``_static_muscle_info`` / ``_static_break_tip``. tests/test_callout_parser.py
+fuzzes them against the parser, so behaviour stays pinned; this script only
+times each endpoint operation both ways over a corpus of catalog commands,
+grammar-shaped LLM outputs and chatty LLM outputs.
+
+Both sides are timed on equal terms, twice:
+
+  uncached   the parse cache is bypassed, so every call scans its input
+  cached     the legacy helpers get the same lru_cache(4096) as _parse_cached,
+             and every input has been seen once before the timed pass
+
+The parser does not win either comparison. Uncached, building a
+ParsedCallout costs a few microseconds of interpreter time where the old code
+made one or two C-level regex calls: it is about even on grammar-shaped
+output, roughly 1.3x slower on muscle-info keys and 2x slower on chatty output,
+where the combo search needs the full token scan. (ASCII input skips that scan
+for the summary fields, which is what keeps muscle-info keys close.) Cached,
+both sides are sub-microsecond for lookups, but the legacy helpers memoize
+whole answers while ``_validate_callout`` still strips prefixes on every call.
+What the parser buys is one parse shared by every endpoint, a linear-time
+bound on client input and the intended differences tests/test_callout_parser.py
+lists, not per-call speed.
+
+    cd backend
+    python benchmarks/bench_callout_parser.py --output parser.json
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+from pathlib import Path
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "brutality_bench")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import callouts  # noqa: E402
+import server  # noqa: E402
+from callouts import parse_callout  # noqa: E402
+from combos import callout_duration_ms, combo_catalog  # noqa: E402
+
+STATIC_KEYS = ("1", "2", "3", "4", "Defense")
+
+
+def legacy_validate_callout(raw: str) -> Optional[str]:
+    cleaned = raw.strip().strip('"\'').strip()
+    for prefix in ("here's", "here is", "call out", "combo:", "move:", "i say", "say", "call"):
+        if cleaned.lower().startswith(prefix):
+            cleaned = cleaned[len(prefix):].strip(' :-')
+    if re.fullmatch(r'[\d,\-\s]*(Defense[\s,\-]*[\d,\-\s]*)*', cleaned, re.IGNORECASE):
+        result = cleaned.strip()
+        return result if result else None
+    match = re.search(
+        r'\b(?:Defense[\s,\-]*)?[1-4](?:[\s,\-]+[1-4])*(?:[\s,\-]+Defense)?',
+        cleaned,
+        re.IGNORECASE,
+    )
+    if match:
+        return match.group(0).strip(' ,\\-')
+    first = cleaned.split()[0] if cleaned.split() else ''
+    if first in ('1', '2', '3', '4'):
+        return first
+    return None
+
+
+def legacy_estimate_duration(command: str) -> int:
+    tokens = [t.strip() for t in re.split(r'[,\-\s]+', command) if t.strip()]
+    return callout_duration_ms(len(tokens))
+
+
+def legacy_normalize(move: str) -> str:
+    return "-".join(t for t in re.split(r'[,\-\s]+', move.strip().lower()) if t)
+
+
+def legacy_static_key(move: str) -> Optional[str]:
+    for key in STATIC_KEYS:
+        if key.lower() in move.lower():
+            return key
+    return None
+
+
+CHATTY = [
+    "Sure! Here's a combo: {c} then reset",
+    "Combo: {c}",
+    "\"{c}\"",
+    "Call out {c}!",
+    "Next up, {c}. Keep your guard high.",
+    "{c} -- nice and sharp",
+    "I say {c}",
+]
+
+
+def bench(func: Callable[[str], object], corpus: List[str], repeat: int) -> float:
+    """Best-of-``repeat`` mean microseconds per call over ``corpus``, after one untimed pass."""
+    def loop():
+        for raw in corpus:
+            func(raw)
+    loop()
+    best = min(timeit.repeat(loop, number=1, repeat=repeat))
+    return round(best / len(corpus) * 1e6, 3)
+
+
+def cached_legacy() -> dict:
+    """The legacy helpers behind the same cache parse_callout uses."""
+    return {name: lru_cache(maxsize=4096)(func) for name, func in (
+        ("validate", legacy_validate_callout),
+        ("duration", legacy_estimate_duration),
+        ("normalize", legacy_normalize),
+        ("static_key", legacy_static_key),
+    )}
+
+
+LEGACY = {
+    "validate": legacy_validate_callout,
+    "duration": legacy_estimate_duration,
+    "normalize": legacy_normalize,
+    "static_key": legacy_static_key,
+}
+
+
+def legacy_callout(raw: str):
+    command = LEGACY["validate"](raw)
+    return command and LEGACY["duration"](command)
+
+
+def parsed_callout(raw: str):
+    callout = server._validate_callout(raw)
+    return callout and callout.duration_ms
+
+
+def legacy_muscle_info(move: str):
+    return LEGACY["normalize"](move), LEGACY["static_key"](move)
+
+
+def parsed_muscle_info(move: str):
+    callout = parse_callout(move)
+    return callout.key, callout.key_move
+
+
+def run_bench(repeat: int) -> dict:
+    catalog = [entry.command for entry in combo_catalog.entries.values()]
+    numeric = [command for command in catalog if not any(name in command for name in ("straight", "hook", "uppercut"))]
+    chatty = [template.format(c=command) for command in numeric[:200] for template in CHATTY]
+    corpora = {
+        "llm_grammar_output": numeric,  # what constrained decoding produces
+        "llm_chatty_output": chatty,  # unconstrained outputs with preambles and prose
+        "catalog_commands": catalog,  # rule-based commands, including named combos
+    }
+    uncached_legacy, cache_limit = dict(LEGACY), callouts._CACHE_MAX_LENGTH
+    results = []
+    for corpus_name, corpus in corpora.items():
+        for operation, legacy, parsed in (
+            ("callout_validate_and_duration", legacy_callout, parsed_callout),
+            ("muscle_info_key_and_lookup", legacy_muscle_info, parsed_muscle_info),
+        ):
+            if operation.startswith("callout") and corpus_name == "catalog_commands":
+                continue
+            timings = {}
+            try:
+                callouts._CACHE_MAX_LENGTH = -1
+                timings["legacy_uncached_us"] = bench(legacy, corpus, repeat)
+                timings["parser_uncached_us"] = bench(parsed, corpus, repeat)
+            finally:
+                callouts._CACHE_MAX_LENGTH = cache_limit
+            try:
+                LEGACY.update(cached_legacy())
+                timings["legacy_cached_us"] = bench(legacy, corpus, repeat)
+                timings["parser_cached_us"] = bench(parsed, corpus, repeat)
+            finally:
+                LEGACY.update(uncached_legacy)
+            for mode in ("uncached", "cached"):
+                parser_us = timings[f"parser_{mode}_us"]
+                timings[f"speedup_{mode}"] = round(timings[f"legacy_{mode}_us"] / parser_us, 2) if parser_us else None
+            results.append({"corpus": corpus_name, "operation": operation, "inputs": len(corpus), **timings})
+            print(f"{corpus_name:20} {operation:30} "
+                  f"uncached: legacy={timings['legacy_uncached_us']:6.2f}us parser={timings['parser_uncached_us']:6.2f}us "
+                  f"(x{timings['speedup_uncached']})  "
+                  f"cached: legacy={timings['legacy_cached_us']:6.2f}us parser={timings['parser_cached_us']:6.2f}us "
+                  f"(x{timings['speedup_cached']})", file=sys.stderr)
+    return {"results": results}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="timing repetitions; the best is reported")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    report = run_bench(args.repeat)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
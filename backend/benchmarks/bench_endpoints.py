@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark every route in server.api_router in-process.
+
+HTTP routes are driven through httpx's ASGI transport, so there is no network
+and no uvicorn. The workout WebSocket is driven the same way, by calling the
+ASGI app directly; its latency is from connect to the first ``callout``
+message, the wait an athlete sees when a workout starts. MongoDB is replaced by mongomock-motor unless --mongo-url points
+at a real server. The model is replaced by a deterministic fake with a
+configurable per-batch latency; it sits behind the real LlmBatcher, grammar
+lookup, validation and fallback code. OpenAI TTS is faked the same way.
+
+Reports p50/p95/p99/mean latency and requests/s per route as JSON. Pass an
+earlier result with --compare to flag routes whose p95 regressed.
+
+    cd backend
+    pip install -r requirements-dev.txt
+    python benchmarks/bench_endpoints.py --requests 200 --concurrency 8 --output bench.json
+    python benchmarks/bench_endpoints.py --compare bench.json --threshold 1.2
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Routes that are not safe or meaningful to hammer, with the reason reported in the output
+SKIPPED_ROUTES = {
+    ("POST", "/admin/llm/reload"): "starts a model load",
+}
+
+CANNED_CALLOUTS = ["1", "2", "3", "4", "1-2", "2-3", "3-4", "1-2-3", "2-3-4", "1-2-3-4"]
+CANNED_MUSCLE_INFO = (
+    '{"primary": ["Deltoids", "Triceps"], "secondary": ["Core"], '
+    '"description": "Drive from the rear foot and extend straight through the target."}'
+)
+CANNED_BREAK_TIP = "Shake out your shoulders and breathe slowly through your nose before the next round."
+
+
+class FakeModelState:
+    """Stands in for server._LoadedModel: fixed latency per batch, grammar-valid output."""
+
+    def __init__(self, server, latency_ms: float):
+        self.server = server
+        self.latency = latency_ms / 1000.0
+        self.model_id = "fake"
+        self.backend = "fake"
+        self.batches = 0
+        self.rows = 0
+
+    def _reply(self, messages: list, grammar) -> str:
+        if grammar is not None:
+            for text in (CANNED_MUSCLE_INFO, *CANNED_CALLOUTS, *(f"Defense {c}" for c in CANNED_CALLOUTS)):
+                if grammar.matches(text):
+                    return text
+        if messages and messages[0]["content"] == self.server.BREAK_TIP_SYSTEM:
+            return CANNED_BREAK_TIP
+        return CANNED_CALLOUTS[len(messages[-1]["content"]) % len(CANNED_CALLOUTS)]
+
+    def generate_batch(self, batch_messages: List[list], max_new_tokens: int, grammar=None, controls=None) -> List[str]:
+        time.sleep(self.latency)
+        self.batches += 1
+        self.rows += len(batch_messages)
+        return [self._reply(messages, grammar) for messages in batch_messages]
+
+
+class InMemoryGridOut:
+    def __init__(self, data: bytes):
+        self._data = data
+        self._position = 0
+        self.length = len(data)
+
+    def seek(self, position: int) -> None:
+        self._position = position
+
+    async def read(self, size: int = -1) -> bytes:
+        end = self.length if size < 0 else self._position + size
+        chunk = self._data[self._position:end]
+        self._position += len(chunk)
+        return chunk
+
+
+class InMemoryGridIn:
+    def __init__(self, files: Dict[object, bytes]):
+        from bson import ObjectId
+
+        self._id = ObjectId()
+        self._files = files
+        self._parts: List[bytes] = []
+
+    async def write(self, data: bytes) -> None:
+        self._parts.append(data)
+
+    async def close(self) -> None:
+        self._files[self._id] = b"".join(self._parts)
+
+
+class InMemoryGridFS:
+    """The slice of AsyncIOMotorGridFSBucket server.py uses; motor's GridFS cannot run on mongomock."""
+
+    def __init__(self):
+        self._files: Dict[object, bytes] = {}
+
+    async def upload_from_stream(self, filename: str, source, metadata: Optional[dict] = None):
+        from bson import ObjectId
+
+        file_id = ObjectId()
+        self._files[file_id] = source if isinstance(source, bytes) else source.read()
+        return file_id
+
+    def open_upload_stream(self, filename: str, metadata: Optional[dict] = None) -> InMemoryGridIn:
+        return InMemoryGridIn(self._files)
+
+    async def open_download_stream(self, file_id) -> InMemoryGridOut:
+        return InMemoryGridOut(self._files[file_id])
+
+
+def install_stand_ins(server, args) -> FakeModelState:
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+
+        server.client = AsyncIOMotorClient(args.mongo_url)
+        server.db = server.client[os.environ["DB_NAME"]]
+        server.audio_fs = AsyncIOMotorGridFSBucket(
+            server.db, bucket_name="audio_track_files", chunk_size_bytes=server.AUDIO_CHUNK_SIZE
+        )
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("mongomock-motor is required without --mongo-url: pip install -r requirements-dev.txt")
+        server.client = AsyncMongoMockClient()
+        server.db = server.client[os.environ["DB_NAME"]]
+        server.audio_fs = InMemoryGridFS()
+
+    state = FakeModelState(server, args.llm_latency_ms)
+    server.LlmEngine._state = state
+    server.LlmEngine._loaded = True
+    server.LlmEngine._load_status = {**server.LlmEngine._load_status, "state": "ready", "model": "fake"}
+
+    tts_latency = args.tts_latency_ms / 1000.0
+    fake_audio = b"\xff\xfb\x90\x00" * 1024
+
+    async def fake_synthesize(text, voice, speed, api_key):
+        await asyncio.sleep(tts_latency)
+        return fake_audio
+
+    async def fake_stream(text, voice, speed, api_key, chunk_size=4096):
+        await asyncio.sleep(tts_latency)
+        for offset in range(0, len(fake_audio), chunk_size):
+            yield fake_audio[offset:offset + chunk_size]
+
+    server.synthesize_speech = fake_synthesize
+    server.stream_speech = fake_stream
+    return state
+
+
+def route_specs(context: dict) -> Dict[Tuple[str, str], Callable[[int], dict]]:
+    """httpx request kwargs per (method, api_router path), given the iteration number.
+
+    WebSocket routes use the method "WS"; only ``path`` and ``params`` apply.
+    """
+    moves = ["1", "1-2", "Defense", "3-4", "2-3-4", "Defense 1-2"]
+    track_payload = {
+        "name": "Bench Track",
+        "artist": "Bench",
+        "audio_base64": base64.b64encode(b"\x00" * 64 * 1024).decode(),
+        "duration_ms": 180000,
+    }
+    upload_chunk = b"\x00" * 64 * 1024
+    return {
+        ("GET", "/health"): lambda i: {},
+        ("GET", "/health/live"): lambda i: {},
+        ("GET", "/health/ready"): lambda i: {},
+        ("GET", "/"): lambda i: {},
+        ("POST", "/workout/start"): lambda i: {"json": {"user_id": f"bench_{i % 50}"}},
+        ("GET", "/workout/{session_id}"): lambda i: {"path": {"session_id": context["session_id"]}},
+        ("POST", "/workout/{session_id}/complete"): lambda i: {"path": {"session_id": context["session_id"]}},
+        ("POST", "/workout/{session_id}/round-plan"): lambda i: {
+            "path": {"session_id": context["session_id"]},
+            "json": {"round_number": 1 + i % 7},
+        },
+        ("POST", "/workout/{session_id}/progress"): lambda i: {
+            "path": {"session_id": context["session_id"]},
+            "json": {"events": [
+                {"round_number": 1 + i % 7, "offset_ms": 1000 * k, "command": moves[k % len(moves)]}
+                for k in range(5)
+            ]},
+        },
+        ("GET", "/workout/{session_id}/progress"): lambda i: {
+            "path": {"session_id": context["session_id"]},
+            "params": {"round_number": 1 + i % 7},
+        },
+        ("POST", "/workout/move-command"): lambda i: {
+            "params": {"complexity": (i % 10) / 10, "intensity": (i % 7) / 7, "round_number": 1 + i % 7},
+        },
+        ("POST", "/llm/callout"): lambda i: {
+            "json": {"complexity": (i % 10) / 10, "intensity": (i % 7) / 7, "round_number": 1 + i % 7},
+        },
+        ("POST", "/llm/muscle-info"): lambda i: {"json": {"move": moves[i % len(moves)]}},
+        ("POST", "/llm/break-tip"): lambda i: {
+            "json": {"move": moves[i % len(moves)], "primary_muscles": ["Deltoids"], "round_number": 1 + i % 7},
+        },
+        ("POST", "/tts/stream"): lambda i: {"json": {"text": moves[i % len(moves)]}},
+        ("POST", "/tts/generate"): lambda i: {"json": {"text": moves[i % len(moves)]}},
+        ("POST", "/audio/upload"): lambda i: {"json": track_payload},
+        ("GET", "/audio/tracks"): lambda i: {},
+        ("POST", "/audio/uploads"): lambda i: {
+            "json": {key: track_payload[key] for key in ("name", "artist", "duration_ms")},
+        },
+        ("GET", "/audio/uploads/{upload_id}"): lambda i: {"path": {"upload_id": context["upload_ids"][0]}},
+        # Each iteration appends one chunk to its own session, which the finalize spec then completes
+        ("POST", "/audio/uploads/{upload_id}/chunks"): lambda i: {
+            "path": {"upload_id": context["upload_ids"][i]},
+            "params": {"offset": 0},
+            "content": upload_chunk,
+        },
+        ("POST", "/audio/uploads/{upload_id}/finalize"): lambda i: {"path": {"upload_id": context["upload_ids"][i]}},
+        ("GET", "/audio/track/{track_id}"): lambda i: {"path": {"track_id": context["track_id"]}},
+        ("GET", "/audio/track/{track_id}/stream"): lambda i: {
+            "path": {"track_id": context["track_id"]},
+            "headers": {"Range": "bytes=0-16383"},
+        },
+        ("WS", "/ws/workout/{session_id}"): lambda i: {"path": {"session_id": context["session_id"]}},
+    }
+
+
+async def websocket_first_callout(app, url: str, params: Optional[dict] = None) -> int:
+    """Open ``url`` on the ASGI app, wait for the first callout, then disconnect.
+
+    Returns 101 once a callout arrives, or the close code if the server closed
+    the socket first. httpx's ASGI transport only speaks HTTP, so this plays
+    the client side of the ASGI WebSocket protocol itself.
+    """
+    from urllib.parse import urlencode
+
+    inbound: asyncio.Queue = asyncio.Queue()
+    outbound: asyncio.Queue = asyncio.Queue()
+    scope = {
+        "type": "websocket",
+        "asgi": {"version": "3.0"},
+        "scheme": "ws",
+        "path": url,
+        "raw_path": url.encode(),
+        "root_path": "",
+        "query_string": urlencode(params or {}).encode(),
+        "headers": [(b"host", b"bench")],
+        "client": ("bench", 0),
+        "server": ("bench", 80),
+        "subprotocols": [],
+    }
+    await inbound.put({"type": "websocket.connect"})
+    task = asyncio.create_task(app(scope, inbound.get, outbound.put))
+    try:
+        while True:
+            message = await outbound.get()
+            if message["type"] == "websocket.close":
+                return message.get("code", 1000)
+            if message["type"] == "websocket.send" and json.loads(message["text"]).get("type") == "callout":
+                return 101
+    finally:
+        await inbound.put({"type": "websocket.disconnect", "code": 1000})
+        try:
+            await asyncio.wait_for(task, timeout=5.0)
+        except asyncio.TimeoutError:
+            task.cancel()
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+async def bench_route(client, server_prefix: str, method: str, path: str, spec: Callable[[int], dict], args) -> dict:
+    from server import app
+
+    latencies: List[float] = []
+    status_codes: Dict[str, int] = {}
+    counter = iter(range(args.warmup + args.requests))
+
+    async def one(i: int, record: bool) -> None:
+        kwargs = dict(spec(i))
+        url = server_prefix + path.format(**kwargs.pop("path", {}))
+        started = time.perf_counter()
+        if method == "WS":
+            status_code = await websocket_first_callout(app, url, kwargs.get("params"))
+        else:
+            response = await client.request(method, url, **kwargs)
+            await response.aread()
+            status_code = response.status_code
+        elapsed = time.perf_counter() - started
+        if record:
+            latencies.append(elapsed)
+            status_codes[str(status_code)] = status_codes.get(str(status_code), 0) + 1
+
+    async def worker() -> None:
+        for i in counter:
+            await one(i, record=i >= args.warmup)
+
+    # Warm-up requests run first, sequentially, and are not recorded
+    for _ in range(args.warmup):
+        await one(next(counter), record=False)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    # 101: a WebSocket was accepted and delivered its first message
+    errors = sum(n for code, n in status_codes.items() if not code.startswith("2") and code != "101")
+    return {
+        "method": method,
+        "path": path,
+        "requests": len(latencies),
+        "errors": errors,
+        "status_codes": status_codes,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "rps": round(len(latencies) / wall, 1) if wall else 0.0,
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+    from fastapi.routing import APIRoute, APIWebSocketRoute
+
+    import server
+
+    state = install_stand_ins(server, args)
+    if args.callout_pool:
+        server.callout_pool.start()
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60.0) as client:
+        session = (await client.post("/api/workout/start", json={"user_id": "bench"})).json()
+        track = (await client.post("/api/audio/upload", json=route_specs({})[("POST", "/audio/upload")](0)["json"])).json()
+        upload_ids = [
+            (await client.post("/api/audio/uploads", json={"name": "Bench Upload", "artist": "Bench",
+                                                          "duration_ms": 180000})).json()["upload_id"]
+            for _ in range(args.warmup + args.requests)
+        ]
+        specs = route_specs({"session_id": session["id"], "track_id": track["id"], "upload_ids": upload_ids})
+
+        results, skipped = [], []
+        prefix = server.api_router.prefix
+        for route in server.api_router.routes:
+            path = route.path[len(prefix):]
+            if args.routes and not any(pattern in path for pattern in args.routes):
+                continue
+            if isinstance(route, APIWebSocketRoute):
+                methods = ["WS"]
+            elif isinstance(route, APIRoute):
+                methods = sorted(route.methods)
+            else:
+                skipped.append({"path": path, "reason": "unsupported route type"})
+                continue
+            for method in methods:
+                key = (method, path)
+                if key in SKIPPED_ROUTES or key not in specs:
+                    skipped.append({"method": method, "path": path,
+                                    "reason": SKIPPED_ROUTES.get(key, "no request spec")})
+                    continue
+                result = await bench_route(client, prefix, method, path, specs[key], args)
+                results.append(result)
+                print(f"{method:6} {path:40} p50={result['p50_ms']:8.2f}ms "
+                      f"p95={result['p95_ms']:8.2f}ms p99={result['p99_ms']:8.2f}ms "
+                      f"{result['rps']:8.1f} rps  errors={result['errors']}", file=sys.stderr)
+
+    await server.callout_pool.stop()
+    await server.progress_buffer.stop()
+    await server.audit_log.stop()
+    await server.LlmEngine.shutdown()
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "llm_latency_ms": args.llm_latency_ms,
+            "tts_latency_ms": args.tts_latency_ms,
+            "callout_pool": args.callout_pool,
+            "mongo": args.mongo_url or "mongomock",
+            "llm_batches": state.batches,
+            "llm_rows": state.rows,
+        },
+        "routes": results,
+        "skipped": skipped,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> int:
+    """Print p95 ratios against ``baseline``; returns 1 if any route got slower than ``threshold``."""
+    previous = {(r["method"], r["path"]): r for r in baseline["routes"]}
+    regressed = 0
+    for route in current["routes"]:
+        before = previous.get((route["method"], route["path"]))
+        if not before or not before["p95_ms"]:
+            continue
+        ratio = route["p95_ms"] / before["p95_ms"]
+        flag = "REGRESSED" if ratio > threshold else ""
+        regressed += bool(flag)
+        print(f"{route['method']:6} {route['path']:40} p95 {before['p95_ms']:8.2f} -> "
+              f"{route['p95_ms']:8.2f}ms  x{ratio:.2f} {flag}", file=sys.stderr)
+    return 1 if regressed else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100, help="measured requests per route")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per route")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="fake model time per batch")
+    parser.add_argument("--tts-latency-ms", type=float, default=20.0, help="fake synthesis time per request")
+    parser.add_argument("--callout-pool", action="store_true", help="serve callouts from the pre-generated pool")
+    parser.add_argument("--mongo-url", help="benchmark against a real MongoDB instead of mongomock-motor")
+    parser.add_argument("--routes", nargs="*", help="only routes whose path contains one of these")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=1.25, help="p95 ratio that counts as a regression")
+    args = parser.parse_args()
+
+    os.environ.setdefault("MONGO_URL", args.mongo_url or "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "brutality_bench")
+    os.environ["LLM_BACKEND"] = "tinyllama"
+    os.environ["OPENAI_API_KEY"] = "bench-fake-key"
+    os.environ.setdefault("TTS_CACHE_DIR", str(Path("/tmp") / "brutality-bench-tts-cache"))
+    if not args.callout_pool:
+        os.environ["CALLOUT_POOL_HIGH_WATERMARK"] = "0"
+    sys.path.insert(0, str(BACKEND_DIR))
+    # Keep per-request INFO logging from dominating the measurement
+    import logging
+
+    logging.disable(logging.INFO)
+
+    results = asyncio.run(run(args))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        return compare(results, json.loads(Path(args.compare).read_text()), args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
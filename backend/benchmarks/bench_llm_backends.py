@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Compare LlmEngine load modes on callout generation.
+
+Each backend runs in its own subprocess so peak RSS is measured cleanly.
+Reports load time, peak RSS, tokens/s, per-callout latency and the share of
+generations that pass _validate_callout, as one JSON object per backend.
+
+    cd backend
+    python benchmarks/bench_llm_backends.py --backends tinyllama tinyllama-int8 --callouts 50
+
+tinyllama-onnx loads the directory written by export_onnx.py:
+
+    python export_onnx.py --output models/tinyllama-onnx --quantize
+    python benchmarks/bench_llm_backends.py --backends tinyllama-int8 tinyllama-onnx --onnx-model models/tinyllama-onnx
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def run_worker(backend: str, callouts: int) -> dict:
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "brutality_bench")
+    os.environ["LLM_BACKEND"] = backend
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+
+    engine = server.LlmEngine
+    started = time.perf_counter()
+    engine._load_blocking()
+    load_s = time.perf_counter() - started
+
+    buckets = [(0.0, 0.0), (0.4, 0.0), (0.8, 0.0), (0.0, 1.0), (0.4, 1.0), (0.8, 1.0)]
+    latencies, tokens, valid = [], 0, 0
+    for i in range(callouts):
+        complexity, intensity = buckets[i % len(buckets)]
+        messages = server._build_callout_messages(complexity, intensity, 1 + i % 7, "")
+        grammar = server.CALLOUT_GRAMMARS[server._callout_bucket(complexity, intensity)]
+        started = time.perf_counter()
+        raw = engine._generate_batch_blocking([messages], 30, grammar)[0]
+        latencies.append(time.perf_counter() - started)
+        tokens += len(engine._state.tokenizer(raw, add_special_tokens=False).input_ids)
+        valid += server._validate_callout(raw) is not None
+
+    latencies.sort()
+    total_s = sum(latencies)
+    return {
+        "backend": backend,
+        "model": server._llm_model_id(),
+        "constrained_decoding": os.environ.get("LLM_CONSTRAINED_DECODING", "1") == "1",
+        "torch_compile": os.environ.get("LLM_TORCH_COMPILE", "0") == "1",
+        "load_s": round(load_s, 2),
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "callouts": callouts,
+        "tokens": tokens,
+        "tokens_per_s": round(tokens / total_s, 2) if total_s else 0.0,
+        "latency_p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "latency_p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1),
+        "validation_rate": round(valid / callouts, 3),
+        "torch_imported": "torch" in sys.modules,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["tinyllama", "tinyllama-int8"])
+    parser.add_argument("--callouts", type=int, default=30)
+    parser.add_argument("--onnx-model", help="export_onnx.py output directory for tinyllama-onnx")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.callouts)))
+        return 0
+
+    status = 0
+    for backend in args.backends:
+        env = dict(os.environ)
+        if backend == "tinyllama-onnx" and args.onnx_model:
+            env["TINYLLAMA_MODEL"] = args.onnx_model
+        proc = subprocess.run(
+            [sys.executable, __file__, "--worker", backend, "--callouts", str(args.callouts)],
+            capture_output=True, text=True, env=env,
+        )
+        if proc.returncode != 0:
+            print(f"{backend}: failed\n{proc.stderr[-2000:]}", file=sys.stderr)
+            status = 1
+            continue
+        print(proc.stdout.strip().splitlines()[-1], flush=True)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
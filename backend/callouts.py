@@ -0,0 +1,232 @@
+"""Linear-time parser for spoken callouts.
+
+Callouts reach the server as strings from the LLM, the rule-based engine and
+clients: ``"1-2"``, ``"Defense 3"``, ``"Left hook, Right uppercut"``.
+``parse_callout`` scans a string once with a single precompiled token pattern
+and returns a ``ParsedCallout``: a typed token sequence of punches (with their
+id), Defense, separators and any other text, where each move carries its
+offset and duration inside the callout from the formula the combo catalog uses.
+
+Validation, duration estimates, muscle-info cache keys and the static
+muscle-info and break-tip lookups all read this structure instead of running
+their own regexes. The token pattern has no nested quantifiers and bounded
+lookaheads, and the combo search is one pass over the tokens, so parsing is
+linear in the input length.
+
+The scan itself is a single ``findall`` and only runs when ``tokens`` or the
+combo search need it: for ASCII input the move count, the numeric check and the
+key move come from C-level string counts, otherwise from the scan's columns.
+Callouts are drawn from a small vocabulary (the catalog, grammar-shaped LLM
+output), so ``parse_callout`` also memoizes short strings and repeats cost a
+cache lookup.
+"""
+
+import re
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
+
+from combos import CALLOUT_BASE_MS, CALLOUT_PER_MOVE_MS, DEFENSE, MOVE_NAMES, MOVE_NUMBERS, callout_duration_ms
+
+PUNCH = "punch"
+DEFENSE_TOKEN = "defense"
+SEPARATOR = "separator"
+TEXT = "text"
+
+_NAMED_PUNCHES = {name.lower(): number for number, name in zip(MOVE_NUMBERS, MOVE_NAMES)}
+_NAMES = "|".join(r"\s+".join(map(re.escape, name.split())) for name in MOVE_NAMES)
+
+# One group per token kind: separator, numbered punch, Defense, named punch, text.
+# Text runs stop before anything that could start another token; the lookaheads
+# only run on d/l/r. A lone character is text when nothing else matched it.
+_TOKEN_PATTERN = re.compile(
+    r"""
+      ([\s,\-]+)
+    | ([1-4])
+    | (defense)
+    | \b({names})\b
+    | ((?:[^\s,\-1-4dlr]|d(?!efense)|[lr](?!(?:eft|ight)\s))+|.)
+    """.format(names=_NAMES),
+    re.IGNORECASE | re.VERBOSE | re.DOTALL,
+)
+_NAMED_PATTERN = re.compile(r"\b(?:{names})\b".format(names=_NAMES), re.IGNORECASE)
+# Everything a numeric callout may hold besides "defense": 1-4 and the separator characters
+_DROP_NUMERIC = str.maketrans("", "", "1234" + "".join(c for c in map(chr, range(128)) if re.fullmatch(r"[\s,\-]", c)))
+_WORD_CHAR = re.compile(r"\w")
+_UNSET = object()
+
+
+class CalloutToken(NamedTuple):
+    kind: str  # PUNCH, DEFENSE_TOKEN, SEPARATOR or TEXT
+    text: str
+    start: int
+    end: int
+    punch: Optional[int]  # 1..4 for punches, spelled as a number or by name
+    offset_ms: int  # when the move starts within the callout
+    duration_ms: int  # 0 for separators and text
+
+    @property
+    def is_move(self) -> bool:
+        return self.kind in (PUNCH, DEFENSE_TOKEN)
+
+    @property
+    def is_numeric_move(self) -> bool:
+        """Defense or a punch called by number, the only moves the LLM is asked for."""
+        return self.kind == DEFENSE_TOKEN or (self.kind == PUNCH and self.text.isdigit())
+
+    @property
+    def move(self) -> Optional[str]:
+        """"1".."4" or "Defense", as in ComboEntry.moves."""
+        if self.kind == PUNCH:
+            return str(self.punch)
+        return DEFENSE if self.kind == DEFENSE_TOKEN else None
+
+
+class ParsedCallout:
+    """One scanned callout. Build it with ``parse_callout``."""
+
+    __slots__ = ("source", "move_count", "is_numeric", "key_move", "_groups", "_tokens", "_key", "_combo")
+
+    def __init__(self, source: str):
+        self.source = source
+        self._groups: Optional[List[Tuple[str, str, str, str, str]]] = None
+        self._tokens: Optional[Tuple[CalloutToken, ...]] = None
+        self._key: Optional[str] = None
+        self._combo: object = _UNSET
+        if source.isascii():
+            self._summarize_ascii(source)
+        else:
+            self._summarize_groups(self.groups)
+
+    def _summarize_ascii(self, source: str) -> None:
+        """Summary straight from the string, without running the token scan.
+
+        In ASCII every 1-4 is a punch token, every "defense" a Defense token and
+        named punches match on word boundaries wherever they appear, so counts
+        and substring checks give the same answer as the token columns.
+        """
+        lowered = source.lower()
+        numbers = [digit for digit in MOVE_NUMBERS if digit in source]
+        names = _NAMED_PATTERN.findall(source) if "left" in lowered or "right" in lowered else ()
+        defenses = lowered.count("defense")
+        self.move_count = sum(map(source.count, numbers)) + defenses + len(names)
+        self.is_numeric = (
+            self.move_count > 0 and not names and not lowered.replace("defense", "").translate(_DROP_NUMERIC)
+        )
+        if names:
+            numbers = set(numbers).union(_NAMED_PUNCHES[" ".join(name.lower().split())] for name in names)
+        self.key_move = min(numbers) if numbers else (DEFENSE if defenses else None)
+
+    def _summarize_groups(self, groups: List[Tuple[str, str, str, str, str]]) -> None:
+        # Summarize column-wise so no Python code runs per token
+        _, numbers, defenses, names, texts = zip(*groups) if groups else ((),) * 5
+        total = len(numbers)
+        named = total - names.count("")
+        punch_ids = set(numbers)
+        if named:
+            punch_ids.update(_NAMED_PUNCHES[" ".join(name.lower().split())] for name in names if name)
+        punch_ids.discard("")
+        has_defense = defenses.count("") < total
+        self.move_count = (total - numbers.count("")) + (total - defenses.count("")) + named
+        # At least one move, and nothing but numbered punches, Defense and separators
+        self.is_numeric = self.move_count > 0 and not named and texts.count("") == total
+        # The move static lookups describe: the lowest punch id present, else Defense
+        self.key_move = min(punch_ids) if punch_ids else (DEFENSE if has_defense else None)
+
+    def __repr__(self) -> str:
+        return f"ParsedCallout({self.source!r})"
+
+    @property
+    def groups(self) -> List[Tuple[str, str, str, str, str]]:
+        """The token scan: one (separator, number, defense, name, text) row per token."""
+        if self._groups is None:
+            self._groups = _TOKEN_PATTERN.findall(self.source)
+        return self._groups
+
+    @property
+    def tokens(self) -> Tuple[CalloutToken, ...]:
+        if self._tokens is None:
+            tokens = []
+            position, offset_ms = 0, CALLOUT_BASE_MS
+            for separator, number, defense_text, name, text in self.groups:
+                value = separator or number or defense_text or name or text
+                end = position + len(value)
+                if number or name:
+                    punch = int(number or _NAMED_PUNCHES[" ".join(name.lower().split())])
+                    tokens.append(CalloutToken(PUNCH, value, position, end, punch, offset_ms, CALLOUT_PER_MOVE_MS))
+                    offset_ms += CALLOUT_PER_MOVE_MS
+                elif defense_text:
+                    tokens.append(CalloutToken(DEFENSE_TOKEN, value, position, end, None, offset_ms, CALLOUT_PER_MOVE_MS))
+                    offset_ms += CALLOUT_PER_MOVE_MS
+                else:
+                    tokens.append(CalloutToken(SEPARATOR if separator else TEXT, value, position, end, None, offset_ms, 0))
+                position = end
+            self._tokens = tuple(tokens)
+        return self._tokens
+
+    @property
+    def moves(self) -> Tuple[str, ...]:
+        return tuple(token.move for token in self.tokens if token.is_move)
+
+    @property
+    def duration_ms(self) -> int:
+        return callout_duration_ms(self.move_count)
+
+    @property
+    def key(self) -> str:
+        """Case-folded words joined by '-': '1, 2' -> '1-2', 'Defense 3' -> 'defense-3'."""
+        if self._key is None:
+            # Same word boundaries as the separator token: commas, hyphens, whitespace
+            self._key = "-".join(self.source.lower().replace(",", " ").replace("-", " ").split())
+        return self._key
+
+    def first_combo(self) -> Optional["ParsedCallout"]:
+        """The leftmost numbered combo inside free text, or None.
+
+        A combo starts at a word boundary and is an optional leading Defense, a
+        numbered punch, more punches after separators, then an optional
+        trailing Defense: "Try Defense 1-2 now" -> "Defense 1-2".
+        """
+        if self._combo is _UNSET:
+            self._combo = self._find_combo()
+        return self._combo
+
+    def _find_combo(self) -> Optional["ParsedCallout"]:
+        groups, source = self.groups, self.source
+        # Per token: "s"eparator, "p"unch by number, "d"efense or other "x"
+        kinds = ["s" if g[0] else "p" if g[1] else "d" if g[2] else "x" for g in groups]
+        starts = [0]
+        for group in groups:
+            starts.append(starts[-1] + len("".join(group)))
+        count = len(kinds)
+
+        for index, kind in enumerate(kinds):
+            if kind not in "pd":
+                continue
+            if starts[index] and _WORD_CHAR.match(source, starts[index] - 1):
+                continue
+            last = index
+            if kind == "d":
+                last = index + 2 if index + 1 < count and kinds[index + 1] == "s" else index + 1
+                if last >= count or kinds[last] != "p":
+                    continue
+            # Extend over "<separator> <punch>" pairs, then one "<separator> Defense"
+            while last + 2 < count and kinds[last + 1] == "s" and kinds[last + 2] == "p":
+                last += 2
+            if last + 2 < count and kinds[last + 1] == "s" and kinds[last + 2] == "d":
+                last += 2
+            return parse_callout(source[starts[index]:starts[last + 1]])
+        return None
+
+
+# Longer strings are free text from clients and are parsed without caching
+_CACHE_MAX_LENGTH = 128
+
+
+@lru_cache(maxsize=4096)
+def _parse_cached(text: str) -> ParsedCallout:
+    return ParsedCallout(text)
+
+
+def parse_callout(text: str) -> ParsedCallout:
+    """Scan ``text`` once; every character belongs to exactly one token."""
+    return _parse_cached(text) if len(text) <= _CACHE_MAX_LENGTH else ParsedCallout(text)
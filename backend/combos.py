@@ -0,0 +1,187 @@
+"""Precompiled combo catalog for the rule-based WorkoutEngine.
+
+Every command the rule-based engine can say is enumerated once at import:
+singles, "Defense and n", numbered pairs and 2–4 move combos (numbered or
+named), each with or without a leading Defense. Each entry carries its
+spoken string and a duration from the same formula the LLM path uses.
+
+The old per-request branching is expressed as a probability distribution
+over catalog entries for each (generator, complexity regime, intensity
+level). Each distribution is compiled to a Vose alias table. A callout is
+then one constant-time draw from a caller-supplied ``random.Random``, so a
+seeded RNG replays the same workout exactly.
+
+Intensity only scales how often Defense appears, so it is quantized to
+``INTENSITY_LEVELS`` steps. Whether callout combos may include Defense at all
+is decided from the unrounded intensity, so draws match the old continuous
+behaviour to within 1/``INTENSITY_LEVELS`` in Defense probability.
+"""
+
+import hashlib
+import random
+from itertools import permutations, product
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+MOVE_NUMBERS = ("1", "2", "3", "4")
+MOVE_NAMES = ("Left straight", "Right straight", "Left hook", "Right uppercut")
+DEFENSE = "Defense"
+
+# One duration formula for every callout source: a fixed lead-in plus time per move
+CALLOUT_BASE_MS = 800
+CALLOUT_PER_MOVE_MS = 1200
+
+INTENSITY_LEVELS = 20
+
+
+def callout_duration_ms(move_count: int) -> int:
+    """Time allotted to perform a callout of ``move_count`` moves, Defense included."""
+    return CALLOUT_BASE_MS + CALLOUT_PER_MOVE_MS * max(1, move_count)
+
+
+def intensity_level(intensity: float) -> int:
+    return round(min(1.0, max(0.0, intensity)) * INTENSITY_LEVELS)
+
+
+class ComboEntry(NamedTuple):
+    command: str
+    moves: Tuple[str, ...]  # move numbers "1".."4" and "Defense", in order
+    duration_ms: int
+
+
+class AliasTable:
+    """Vose alias table: O(n) to build, O(1) weighted draws."""
+
+    def __init__(self, entries: Sequence[ComboEntry], weights: Sequence[float]):
+        total = float(sum(weights))
+        if not entries or total <= 0:
+            raise ValueError("AliasTable needs at least one entry with positive weight")
+        count = len(entries)
+        self.entries = list(entries)
+        self._probability = [0.0] * count
+        self._alias = list(range(count))
+        scaled = [w * count / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            low, high = small.pop(), large.pop()
+            self._probability[low] = scaled[low]
+            self._alias[low] = high
+            scaled[high] -= 1.0 - scaled[low]
+            (small if scaled[high] < 1.0 else large).append(high)
+        for index in small + large:
+            self._probability[index] = 1.0
+
+    def sample(self, rng: random.Random) -> ComboEntry:
+        index = rng.randrange(len(self.entries))
+        if rng.random() < self._probability[index]:
+            return self.entries[index]
+        return self.entries[self._alias[index]]
+
+
+class ComboCatalog:
+    """Every rule-based command plus prebuilt alias tables per generator bucket."""
+
+    def __init__(self):
+        self.entries: Dict[str, ComboEntry] = {}
+        self.singles = [self._entry((n,), n) for n in MOVE_NUMBERS]
+        self.defense_singles = [self._entry((DEFENSE, n), f"Defense and {n}") for n in MOVE_NUMBERS]
+        self.pairs = [self._entry((a, b), f"{a}-{b}") for a, b in permutations(MOVE_NUMBERS, 2)]
+        # combos[(named, defense)] -> [(length, entry)] for lengths 2..4
+        self.combos: Dict[Tuple[bool, bool], List[Tuple[int, ComboEntry]]] = {}
+        for named, defense in product((False, True), (False, True)):
+            labels = dict(zip(MOVE_NUMBERS, MOVE_NAMES)) if named else {n: n for n in MOVE_NUMBERS}
+            rows = []
+            for length in (2, 3, 4):
+                for moves in product(MOVE_NUMBERS, repeat=length):
+                    parts = [DEFENSE] * defense + [labels[m] for m in moves]
+                    rows.append((length, self._entry((DEFENSE,) * defense + moves, ", ".join(parts))))
+            self.combos[(named, defense)] = rows
+
+        # _callout_tables[(regime, level, defense_on)]
+        self._callout_tables: Dict[Tuple[int, int, bool], AliasTable] = {}
+        self._move_command_tables: Dict[Tuple[int, int], AliasTable] = {}
+        for regime in range(4):
+            without_defense = self._build_callout_table(regime, 0.0)
+            for level in range(INTENSITY_LEVELS + 1):
+                self._callout_tables[(regime, level, False)] = without_defense
+                self._callout_tables[(regime, level, True)] = (
+                    self._build_callout_table(regime, level / INTENSITY_LEVELS) if regime >= 2 else without_defense
+                )
+        for level in range(INTENSITY_LEVELS + 1):
+            for regime in range(3):
+                self._move_command_tables[(regime, level)] = self._build_move_command_table(regime, level)
+
+    def _entry(self, moves: Tuple[str, ...], command: str) -> ComboEntry:
+        entry = self.entries.get(command)
+        if entry is None:
+            entry = self.entries[command] = ComboEntry(command, moves, callout_duration_ms(len(moves)))
+        return entry
+
+    def _combo_weights(self, named: bool, defense_probability: float) -> List[Tuple[ComboEntry, float]]:
+        """Length uniform over 2..4, each move uniform, leading Defense with the given probability."""
+        weighted = []
+        for defense, p_defense in ((False, 1.0 - defense_probability), (True, defense_probability)):
+            if p_defense <= 0:
+                continue
+            for length, entry in self.combos[(named, defense)]:
+                weighted.append((entry, p_defense / 3 / len(MOVE_NUMBERS) ** length))
+        return weighted
+
+    def _build_callout_table(self, regime: int, p_defense: float) -> AliasTable:
+        if regime == 0:
+            weighted = [(e, 1.0) for e in self.singles]
+        elif regime == 1:
+            weighted = [(e, 1.0) for e in self.pairs]
+        else:
+            weighted = self._combo_weights(named=regime == 3, defense_probability=p_defense)
+        return AliasTable([e for e, _ in weighted], [w for _, w in weighted])
+
+    def _build_move_command_table(self, regime: int, level: int) -> AliasTable:
+        p_defense = level / INTENSITY_LEVELS
+        single_mix = [(e, (1.0 - p_defense) / 4) for e in self.singles]
+        single_mix += [(e, p_defense / 4) for e in self.defense_singles]
+        if regime == 0:
+            weighted = [(e, 1.0) for e in self.singles]
+        elif regime == 1:
+            weighted = single_mix
+        else:
+            # Half named combos, half (Defense and) singles
+            weighted = [(e, w / 2) for e, w in single_mix]
+            weighted += [(e, w / 2) for e, w in self._combo_weights(named=True, defense_probability=p_defense)]
+        weighted = [(e, w) for e, w in weighted if w > 0]
+        return AliasTable([e for e, _ in weighted], [w for _, w in weighted])
+
+    @staticmethod
+    def callout_regime(complexity: float) -> int:
+        if complexity < 0.2:
+            return 0
+        if complexity < 0.5:
+            return 1
+        return 3 if complexity > 0.6 else 2
+
+    @staticmethod
+    def move_command_regime(complexity: float) -> int:
+        if complexity == 0.0:
+            return 0
+        return 1 if complexity <= 0.4 else 2
+
+    def callout_table(self, complexity: float, intensity: float) -> AliasTable:
+        # Defense only joins callout combos once intensity passes 0.5. Testing the
+        # rounded level instead would turn it off for intensities just above 0.5
+        defense_on = intensity > 0.5
+        return self._callout_tables[(self.callout_regime(complexity), intensity_level(intensity), defense_on)]
+
+    def move_command_table(self, complexity: float, intensity: float) -> AliasTable:
+        return self._move_command_tables[(self.move_command_regime(complexity), intensity_level(intensity))]
+
+    def single_other_than(self, previous_move: str, rng: random.Random) -> ComboEntry:
+        return rng.choice([e for e in self.singles if e.command != previous_move])
+
+
+def seeded_rng(*parts: object, salt: Optional[str] = None) -> random.Random:
+    """A Random seeded stably from ``parts`` (unlike hash(), identical across processes)."""
+    material = ":".join([salt or ""] + [str(p) for p in parts])
+    return random.Random(int.from_bytes(hashlib.sha256(material.encode("utf-8")).digest()[:8], "big"))
+
+
+combo_catalog = ComboCatalog()
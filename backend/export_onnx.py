@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Export a Hugging Face causal LM to ONNX for LLM_BACKEND=tinyllama-onnx.
+
+Writes ``<output>/model.onnx`` (weights in ``model.onnx.data``) and the
+tokenizer files. The graph takes ``input_ids``, ``attention_mask``,
+``position_ids`` and ``past_key_values.N.key/value`` and returns ``logits``
+and ``present.N.key/value``, the same names as optimum's
+text-generation-with-past export, so the server can keep the KV cache in
+ONNX Runtime between decode steps. ``--quantize`` stores the MatMul weights
+as int8 (ONNX Runtime dynamic quantization), the usual choice on CPU.
+
+Run it once, offline, on a machine with torch, transformers and onnx
+installed. The API then only needs onnxruntime and the tokenizer:
+
+    cd backend
+    python export_onnx.py --model TinyLlama/TinyLlama-1.1B-Chat-v1.0 --output models/tinyllama-onnx --quantize
+    LLM_BACKEND=tinyllama-onnx TINYLLAMA_MODEL=models/tinyllama-onnx uvicorn server:app --port 8001
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+logger = logging.getLogger("export_onnx")
+
+
+def _decoder_wrapper(model):
+    """Wrap ``model`` so its KV cache is a flat list of tensors in and out, as ONNX needs."""
+    import torch
+    from transformers import DynamicCache
+
+    layers = model.config.num_hidden_layers
+
+    class DecoderWithPast(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, position_ids, *past):
+            cache = DynamicCache.from_legacy_cache(tuple((past[2 * i], past[2 * i + 1]) for i in range(layers)))
+            output = self.model(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                position_ids=position_ids,
+                past_key_values=cache,
+                use_cache=True,
+            )
+            present = output.past_key_values.to_legacy_cache()
+            return (output.logits, *(tensor for layer in present for tensor in layer))
+
+    return DecoderWithPast()
+
+
+def _cache_names(layers: int, prefix: str) -> list:
+    return [f"{prefix}.{layer}.{kind}" for layer in range(layers) for kind in ("key", "value")]
+
+
+def export(model_id: str, path: Path, opset: int) -> None:
+    import torch
+    from transformers import AutoModelForCausalLM
+
+    # Eager attention traces to plain MatMul/Softmax ops that every ONNX Runtime build supports
+    model = AutoModelForCausalLM.from_pretrained(model_id, torch_dtype=torch.float32, attn_implementation="eager")
+    model.eval()
+    config = model.config
+    layers = config.num_hidden_layers
+    kv_heads = getattr(config, "num_key_value_heads", None) or config.num_attention_heads
+    head_dim = getattr(config, "head_dim", None) or config.hidden_size // config.num_attention_heads
+
+    # Trace with a non-empty cache and a multi-token step so neither axis gets specialized
+    rows, past_length, step = 2, 3, 4
+    sample = (
+        torch.ones((rows, step), dtype=torch.long),
+        torch.ones((rows, past_length + step), dtype=torch.long),
+        torch.arange(past_length, past_length + step).expand(rows, -1),
+        *(torch.zeros((rows, kv_heads, past_length, head_dim)) for _ in range(2 * layers)),
+    )
+    past_names = _cache_names(layers, "past_key_values")
+    present_names = _cache_names(layers, "present")
+    dynamic_axes = {
+        "input_ids": {0: "batch", 1: "sequence"},
+        "attention_mask": {0: "batch", 1: "total_sequence"},
+        "position_ids": {0: "batch", 1: "sequence"},
+        "logits": {0: "batch", 1: "sequence"},
+        **{name: {0: "batch", 2: "past_sequence"} for name in past_names},
+        **{name: {0: "batch", 2: "total_sequence"} for name in present_names},
+    }
+    with torch.no_grad():
+        torch.onnx.export(
+            _decoder_wrapper(model),
+            sample,
+            str(path),
+            input_names=["input_ids", "attention_mask", "position_ids", *past_names],
+            output_names=["logits", *present_names],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            dynamo=False,
+        )
+
+
+def consolidate(source: Path, target: Path) -> None:
+    """Save ``source`` as ``target`` with every weight in one external data file."""
+    import onnx
+
+    model = onnx.load(str(source))
+    onnx.save_model(
+        model, str(target), save_as_external_data=True, all_tensors_to_one_file=True, location=target.name + ".data"
+    )
+
+
+def quantize(source: Path, target: Path) -> None:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(str(source), str(target), weight_type=QuantType.QInt8, use_external_data_format=True)
+
+
+def verify(model_id: str, path: Path) -> float:
+    """Largest logit difference between PyTorch and ONNX Runtime over a prefill and one cached step."""
+    import numpy as np
+    import onnxruntime as ort
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = AutoModelForCausalLM.from_pretrained(model_id, torch_dtype=torch.float32)
+    model.eval()
+    ids = tokenizer("Call out a 1-2 combo", return_tensors="np").input_ids.astype(np.int64)
+    with torch.no_grad():
+        expected = model(torch.from_numpy(ids)).logits.numpy()
+
+    session = ort.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+    inputs = {node.name: node for node in session.get_inputs()}
+    past_names = [name for name in inputs if name.startswith("past_key_values.")]
+    first = inputs[past_names[0]]
+    empty = np.zeros((1, first.shape[1], 0, first.shape[3]), dtype=np.float32)
+    length = ids.shape[1] - 1
+
+    # Prefill all but the last token, then feed it against the returned cache
+    outputs = session.run(None, {
+        "input_ids": ids[:, :length],
+        "attention_mask": np.ones((1, length), dtype=np.int64),
+        "position_ids": np.arange(length, dtype=np.int64)[None],
+        **{name: empty for name in past_names},
+    })
+    prefill = outputs[0]
+    present = dict(zip((node.name for node in session.get_outputs()[1:]), outputs[1:]))
+    step = session.run(["logits"], {
+        "input_ids": ids[:, length:],
+        "attention_mask": np.ones((1, length + 1), dtype=np.int64),
+        "position_ids": np.array([[length]], dtype=np.int64),
+        **{name: present[name.replace("past_key_values.", "present.", 1)] for name in past_names},
+    })[0]
+    return float(max(np.abs(prefill - expected[:, :length]).max(), np.abs(step - expected[:, length:]).max()))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.environ.get("TINYLLAMA_MODEL", "TinyLlama/TinyLlama-1.1B-Chat-v1.0"))
+    parser.add_argument("--output", required=True, help="directory for model.onnx and the tokenizer")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--quantize", action="store_true", help="int8 weights (dynamic quantization)")
+    parser.add_argument("--no-verify", action="store_true", help="skip comparing logits against PyTorch")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    from transformers import AutoTokenizer
+
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    target = output / "model.onnx"
+    with tempfile.TemporaryDirectory() as scratch:
+        exported = Path(scratch) / "model.onnx"
+        started = time.perf_counter()
+        logger.info(f"Exporting {args.model} (opset {args.opset})")
+        export(args.model, exported, args.opset)
+        for stale in (target, output / "model.onnx.data"):
+            if stale.exists():
+                stale.unlink()
+        if args.quantize:
+            logger.info("Quantizing weights to int8")
+            quantize(exported, target)
+        else:
+            consolidate(exported, target)
+        logger.info(f"Wrote {target} in {time.perf_counter() - started:.1f}s")
+
+    AutoTokenizer.from_pretrained(args.model).save_pretrained(output)
+
+    if not args.no_verify:
+        difference = verify(args.model, target)
+        logger.info(f"Max logit difference vs PyTorch: {difference:.2e}")
+        # Quantized weights move logits by design; fp32 exports should match to rounding
+        if not args.quantize and difference > 1e-3:
+            logger.error("Exported model does not match PyTorch")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
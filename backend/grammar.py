@@ -0,0 +1,313 @@
+"""Grammar-constrained decoding for LlmEngine.
+
+A grammar is built from a handful of combinators (``lit``, ``chars``, ``seq``,
+``alt``, ``opt``, ``star``, ``repeat``), compiled to a character-level NFA and
+determinized lazily. For every DFA state reached during generation we walk a
+trie of the tokenizer vocabulary once and cache which tokens keep the output
+inside the grammar, together with how many characters are still needed to
+finish it. ``GrammarLogitsProcessor`` then masks each decode step in a single
+indexed write, allows EOS only once the grammar is complete, forces EOS when
+nothing else can follow, and never lets the output grow so long that it can no
+longer be completed within ``max_new_tokens``.
+
+Allowed-token sets are numpy arrays, and ``GrammarLogitsProcessor`` masks
+numpy logits as well as torch ones, so the ONNX Runtime backend shares it
+without importing torch. torch is only imported when it is handed torch
+tensors, and the grammar definitions can be built without the model stack.
+"""
+
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+# ---------------------------------------------------------------------------
+# Grammar combinators
+# ---------------------------------------------------------------------------
+
+class CharSet:
+    """A set of characters, either listed explicitly or as 'anything but'."""
+
+    def __init__(self, chars: Iterable[str], negate: bool = False):
+        self.chars = frozenset(chars)
+        self.negate = negate
+
+    def __contains__(self, ch: str) -> bool:
+        return (ch in self.chars) != self.negate
+
+
+def lit(text: str) -> tuple:
+    return ("seq", [("chars", CharSet(ch)) for ch in text])
+
+
+def chars(charset: str, negate: bool = False) -> tuple:
+    return ("chars", CharSet(charset, negate))
+
+
+def seq(*nodes: tuple) -> tuple:
+    return ("seq", list(nodes))
+
+
+def alt(*nodes: tuple) -> tuple:
+    return ("alt", list(nodes))
+
+
+def opt(node: tuple) -> tuple:
+    return ("alt", [node, ("seq", [])])
+
+
+def star(node: tuple) -> tuple:
+    return ("star", node)
+
+
+def repeat(node: tuple, low: int, high: int) -> tuple:
+    return seq(*([node] * low + [opt(node)] * (high - low)))
+
+
+class Grammar:
+    """A named, compiled grammar. The name keys per-tokenizer token-mask caches."""
+
+    def __init__(self, name: str, node: tuple):
+        self.name = name
+        self._edges: List[List[Tuple[Optional[CharSet], int]]] = []
+        start, self._final = self._compile(node)
+        self._distance = self._nfa_distances()
+        self._ids: Dict[FrozenSet[int], int] = {}
+        self._sets: List[FrozenSet[int]] = []
+        self._steps: Dict[Tuple[int, str], int] = {}
+        self.start = self._intern(self._closure({start}))
+
+    def __repr__(self) -> str:
+        return f"Grammar({self.name!r})"
+
+    # -- NFA construction (Thompson) ------------------------------------------
+
+    def _new_state(self) -> int:
+        self._edges.append([])
+        return len(self._edges) - 1
+
+    def _compile(self, node: tuple) -> Tuple[int, int]:
+        kind = node[0]
+        start = self._new_state()
+        if kind == "chars":
+            end = self._new_state()
+            self._edges[start].append((node[1], end))
+        elif kind == "seq":
+            end = start
+            for child in node[1]:
+                child_start, child_end = self._compile(child)
+                self._edges[end].append((None, child_start))
+                end = child_end
+        elif kind == "alt":
+            end = self._new_state()
+            for child in node[1]:
+                child_start, child_end = self._compile(child)
+                self._edges[start].append((None, child_start))
+                self._edges[child_end].append((None, end))
+        elif kind == "star":
+            end = self._new_state()
+            child_start, child_end = self._compile(node[1])
+            self._edges[start].append((None, child_start))
+            self._edges[start].append((None, end))
+            self._edges[child_end].append((None, child_start))
+            self._edges[child_end].append((None, end))
+        else:
+            raise ValueError(f"Unknown grammar node: {kind!r}")
+        return start, end
+
+    def _closure(self, states: Iterable[int]) -> FrozenSet[int]:
+        seen = set(states)
+        stack = list(seen)
+        while stack:
+            for label, target in self._edges[stack.pop()]:
+                if label is None and target not in seen:
+                    seen.add(target)
+                    stack.append(target)
+        return frozenset(seen)
+
+    def _nfa_distances(self) -> List[int]:
+        """Fewest characters from each NFA state to the final state (0-1 BFS on reversed edges)."""
+        reverse: List[List[Tuple[int, int]]] = [[] for _ in self._edges]
+        for source, edges in enumerate(self._edges):
+            for label, target in edges:
+                reverse[target].append((source, 0 if label is None else 1))
+        unreachable = len(self._edges) + 1
+        distance = [unreachable] * len(self._edges)
+        distance[self._final] = 0
+        queue = deque([self._final])
+        while queue:
+            state = queue.popleft()
+            for source, cost in reverse[state]:
+                if distance[state] + cost < distance[source]:
+                    distance[source] = distance[state] + cost
+                    if cost:
+                        queue.append(source)
+                    else:
+                        queue.appendleft(source)
+        return distance
+
+    # -- Lazy DFA ---------------------------------------------------------------
+
+    def _intern(self, states: FrozenSet[int]) -> int:
+        dfa_id = self._ids.get(states)
+        if dfa_id is None:
+            dfa_id = self._ids[states] = len(self._sets)
+            self._sets.append(states)
+        return dfa_id
+
+    def step(self, state: int, ch: str) -> int:
+        """Advance one character; returns -1 when ``ch`` is not allowed."""
+        key = (state, ch)
+        target = self._steps.get(key)
+        if target is None:
+            moved = {t for s in self._sets[state] for label, t in self._edges[s]
+                     if label is not None and ch in label}
+            target = self._intern(self._closure(moved)) if moved else -1
+            self._steps[key] = target
+        return target
+
+    def advance(self, state: int, text: str) -> int:
+        for ch in text:
+            state = self.step(state, ch)
+            if state < 0:
+                break
+        return state
+
+    def accepting(self, state: int) -> bool:
+        return self._final in self._sets[state]
+
+    def distance(self, state: int) -> int:
+        """Fewest further characters needed to complete the grammar."""
+        return min(self._distance[s] for s in self._sets[state])
+
+    def matches(self, text: str) -> bool:
+        state = self.advance(self.start, text)
+        return state >= 0 and self.accepting(state)
+
+
+# ---------------------------------------------------------------------------
+# Vocabulary index
+# ---------------------------------------------------------------------------
+
+class TokenVocabulary:
+    """Surface text of every token, arranged in a character trie."""
+
+    def __init__(self, tokenizer):
+        self.eos_token_id = tokenizer.eos_token_id
+        special = set(tokenizer.all_special_ids)
+        # Decoding behind a fixed anchor keeps SentencePiece leading spaces intact
+        anchor = tokenizer.encode("a", add_special_tokens=False)[-1:]
+        anchor_text = tokenizer.decode(anchor)
+        size = len(tokenizer)
+        self.texts: List[Optional[str]] = [None] * size
+        self.root: list = [{}, []]
+        for token_id in range(size):
+            if token_id in special:
+                continue
+            text = tokenizer.decode(anchor + [token_id])[len(anchor_text):]
+            if not text or "�" in text:
+                continue  # Partial UTF-8 byte tokens never fit our ASCII grammars
+            self.texts[token_id] = text
+            node = self.root
+            for ch in text:
+                node = node[0].setdefault(ch, [{}, []])
+            node[1].append(token_id)
+
+
+class GrammarIndex:
+    """Per-(grammar, vocabulary) cache of allowed tokens for each DFA state."""
+
+    def __init__(self, grammar: Grammar, vocab: TokenVocabulary):
+        self.grammar = grammar
+        self.vocab = vocab
+        self._allowed: Dict[int, tuple] = {}
+        self._advance: Dict[Tuple[int, int], int] = {}
+
+    def advance(self, state: int, token_id: int) -> int:
+        """State after emitting ``token_id``; -1 once the row is finished or derailed."""
+        if token_id == self.vocab.eos_token_id:
+            return -1
+        key = (state, token_id)
+        target = self._advance.get(key)
+        if target is None:
+            text = self.vocab.texts[token_id] if token_id < len(self.vocab.texts) else None
+            target = self.grammar.advance(state, text) if text else -1
+            self._advance[key] = target
+        return target
+
+    def _explore(self, state: int) -> tuple:
+        grammar = self.grammar
+        token_ids: List[int] = []
+        distances: List[int] = []
+        stack = [(self.vocab.root, state)]
+        while stack:
+            node, current = stack.pop()
+            for ch, child in node[0].items():
+                target = grammar.step(current, ch)
+                if target < 0:
+                    continue
+                if child[1]:
+                    token_ids.extend(child[1])
+                    distances.extend([grammar.distance(target)] * len(child[1]))
+                if child[0]:
+                    stack.append((child, target))
+        return np.array(token_ids, dtype=np.int64), np.array(distances, dtype=np.int64)
+
+    def allowed(self, state: int, remaining_tokens: int) -> np.ndarray:
+        """Token ids allowed from ``state`` with ``remaining_tokens`` left, EOS included when complete."""
+        cached = self._allowed.get(state)
+        if cached is None:
+            cached = self._allowed[state] = self._explore(state)
+        token_ids, distances = cached
+        # Every token adds at least one character, so a state needing d more
+        # characters is only safe if d <= tokens left after this one.
+        token_ids = token_ids[distances <= remaining_tokens - 1]
+        if self.grammar.accepting(state) or not len(token_ids):
+            token_ids = np.append(token_ids, self.vocab.eos_token_id)
+        return token_ids
+
+
+class GrammarLogitsProcessor:
+    """Masks logits so every row of a batch stays inside ``index.grammar``.
+
+    Tracks one DFA state per row, advanced by the token sampled on the previous
+    step. Rows that emitted EOS are left to generate's own padding. Follows the
+    transformers ``LogitsProcessor`` call protocol, so it can be passed in a
+    ``LogitsProcessorList`` without subclassing; given numpy ``input_ids`` and
+    ``scores`` it returns numpy scores.
+    """
+
+    def __init__(self, index: GrammarIndex, prompt_length: int, max_new_tokens: int):
+        self.index = index
+        self.prompt_length = prompt_length
+        self.max_new_tokens = max_new_tokens
+        self._states: Optional[List[int]] = None
+
+    def __call__(self, input_ids, scores):
+        generated = input_ids.shape[-1] - self.prompt_length
+        if self._states is None:
+            self._states = [self.index.grammar.start] * input_ids.shape[0]
+        elif generated > 0:
+            last = input_ids[:, -1].tolist()
+            self._states = [
+                self.index.advance(state, token) if state >= 0 else -1
+                for state, token in zip(self._states, last)
+            ]
+
+        remaining = self.max_new_tokens - generated
+        if isinstance(scores, np.ndarray):
+            mask = np.full_like(scores, -np.inf)
+            for row, state in enumerate(self._states):
+                mask[row, self.index.allowed(state, remaining) if state >= 0 else self.index.vocab.eos_token_id] = 0
+            return scores + mask
+
+        import torch
+
+        mask = torch.full_like(scores, float("-inf"))
+        for row, state in enumerate(self._states):
+            if state < 0:
+                mask[row, self.index.vocab.eos_token_id] = 0
+            else:
+                mask[row, torch.from_numpy(self.index.allowed(state, remaining)).to(scores.device)] = 0
+        return scores + mask
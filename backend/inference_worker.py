@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Out-of-process inference worker for LlmEngine.
+
+Loads the model once and serves generations to the API over a Unix socket,
+so PyTorch's threads and memory live outside the FastAPI event loop and the
+API process can restart (or run several uvicorn workers) without reloading
+weights. Requests from all clients go through the same LlmBatcher as the
+in-process path, so concurrent callers still share batched generate calls.
+
+Protocol: newline-delimited JSON.
+
+    -> {"id": "...", "op": "ping"}
+    <- {"id": "...", "ready": true, "backlog": 0}  (generations queued, not yet running)
+    -> {"id": "...", "op": "generate", "messages": [...], "max_new_tokens": 30,
+        "grammar": "callout-c1-i0" | null, "deadline": 1700000000.0 | null,
+        "priority": "callout" | "muscle_info" | "break_tip" | "pool"}
+    <- {"id": "...", "text": "..."}  or  {"id": "...", "error": "..."}
+       (plus "overloaded": true when the scheduler turned the request away)
+    -> {"id": "...", "op": "cancel"}  (no reply; the generation with that id stops)
+
+Run it next to the API and point the API at the same socket:
+
+    cd backend
+    LLM_BACKEND=tinyllama python inference_worker.py --socket /tmp/brutality-llm.sock
+    LLM_BACKEND=tinyllama LLM_WORKER_SOCKET=/tmp/brutality-llm.sock uvicorn server:app
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+# The worker always owns the model itself, even if the API's env leaked in
+os.environ.pop("LLM_WORKER_SOCKET", None)
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "brutality")
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import server  # noqa: E402
+from server import CALLOUT_GRAMMARS, LLM_PRIORITIES, MUSCLE_GRAMMAR, LlmEngine, LlmOverloaded  # noqa: E402
+
+logger = logging.getLogger("inference_worker")
+
+GRAMMARS = {grammar.name: grammar for grammar in [*CALLOUT_GRAMMARS.values(), MUSCLE_GRAMMAR]}
+
+
+async def _handle_request(request: dict) -> dict:
+    request_id = request.get("id")
+    op = request.get("op")
+    if op == "ping":
+        return {"id": request_id, "ready": LlmEngine._loaded, "backlog": await LlmEngine.backlog()}
+    if op != "generate":
+        return {"id": request_id, "error": f"unknown op {op!r}"}
+
+    grammar_name = request.get("grammar")
+    if grammar_name is not None and grammar_name not in GRAMMARS:
+        return {"id": request_id, "error": f"unknown grammar {grammar_name!r}"}
+    priority = request.get("priority", "callout")
+    if priority not in LLM_PRIORITIES:
+        return {"id": request_id, "error": f"unknown priority {priority!r}"}
+    deadline = request.get("deadline")
+    try:
+        generation = LlmEngine.generate(
+            request["messages"],
+            max_new_tokens=int(request.get("max_new_tokens", 60)),
+            grammar=GRAMMARS.get(grammar_name),
+            deadline=deadline,
+            priority=priority,
+        )
+        if deadline is not None:
+            text = await asyncio.wait_for(generation, timeout=max(0.0, deadline - time.time()))
+        else:
+            text = await generation
+    except LlmOverloaded as e:
+        return {"id": request_id, "error": str(e), "overloaded": True}
+    except asyncio.TimeoutError:
+        return {"id": request_id, "error": "deadline exceeded"}
+    except Exception as e:
+        logger.exception("Generation failed")
+        return {"id": request_id, "error": str(e) or type(e).__name__}
+    return {"id": request_id, "text": text}
+
+
+async def _serve_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    write_lock = asyncio.Lock()
+    tasks: Dict[object, asyncio.Task] = {}
+
+    async def respond(request: dict) -> None:
+        response = await _handle_request(request)
+        async with write_lock:
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("Dropping malformed request line")
+                continue
+            request_id = request.get("id")
+            if request.get("op") == "cancel":
+                # Cancelling the task cancels its batcher future, which stops its row mid-decode
+                task = tasks.get(request_id)
+                if task is not None:
+                    task.cancel()
+                continue
+            task = asyncio.create_task(respond(request))
+            tasks[request_id] = task
+            task.add_done_callback(lambda _, request_id=request_id: tasks.pop(request_id, None))
+    except ConnectionError:
+        pass
+    finally:
+        for task in list(tasks.values()):
+            task.cancel()
+        writer.close()
+
+
+async def serve(socket_path: str) -> None:
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    # Bind before loading so the API can connect and poll readiness with ping
+    unix_server = await asyncio.start_unix_server(_serve_connection, path=socket_path, limit=2 ** 20)
+    logger.info(f"Inference worker listening on {socket_path}, loading {server._llm_model_id()}")
+    await LlmEngine.load()
+    logger.info("Inference worker ready")
+    try:
+        async with unix_server:
+            await unix_server.serve_forever()
+    finally:
+        await LlmEngine.shutdown()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=os.environ.get("LLM_WORKER_SOCKET_PATH", "/tmp/brutality-llm.sock"))
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.socket))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
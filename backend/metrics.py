@@ -0,0 +1,211 @@
+"""Prometheus metrics for the API, the LLM path and its fallbacks.
+
+Everything is registered on the default ``prometheus_client`` registry and
+served by ``GET /metrics``. HTTP latency comes from ``PrometheusMiddleware``,
+a plain ASGI middleware that stops the clock when the last body chunk is
+sent, so streamed TTS and audio responses are timed end to end. MongoDB
+timings come from a pymongo command listener rather than wrapping each call
+site. Route labels use the route template (``/api/workout/{session_id}``),
+never the raw path, to keep label cardinality bounded.
+"""
+
+import threading
+import time
+from typing import Dict, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+from pymongo import monitoring
+
+# Latency buckets spanning in-process routes (sub-millisecond) up to slow generations
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency, until the last body chunk is sent.",
+    ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being served.",
+)
+
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "llm_queue_wait_seconds",
+    "Time a generation request waited in LlmBatcher before its batch started.",
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_GENERATE_SECONDS = Histogram(
+    "llm_generate_seconds",
+    "Wall time of one batched model.generate call.",
+    ["grammar"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_BATCH_SIZE = Histogram(
+    "llm_batch_size",
+    "Rows per batched model.generate call.",
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16, 32),
+)
+LLM_TOKENS_GENERATED = Counter(
+    "llm_tokens_generated_total",
+    "New tokens produced by the model, excluding padding.",
+    ["grammar"],
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "llm_tokens_per_second",
+    "Generated tokens per second of a batched generate call, summed over rows.",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+)
+LLM_QUEUE_DEPTH = Gauge(
+    "llm_queue_depth",
+    "Generation requests queued in LlmBatcher.",
+)
+LLM_GENERATIONS_ABORTED = Counter(
+    "llm_generations_aborted_total",
+    "Generation requests dropped because the caller gave up, by stage (queued, decoding) and reason (deadline, cancelled).",
+    ["stage", "reason"],
+)
+LLM_ABORTED_TOKENS = Counter(
+    "llm_aborted_tokens_total",
+    "Tokens decoded for generations that were aborted before finishing.",
+)
+LLM_ADMISSION_REJECTIONS = Counter(
+    "llm_admission_rejections_total",
+    "Generation requests LlmBatcher turned away to the fallback, by priority class and reason (deadline, queue_full, evicted).",
+    ["priority", "reason"],
+)
+LLM_READY = Gauge(
+    "llm_ready",
+    "1 once an LLM is loaded and serving, else 0.",
+)
+
+LLM_CALLOUT_VALIDATION_FAILURES = Counter(
+    "llm_callout_validation_failures_total",
+    "Generations rejected by _validate_callout.",
+)
+LLM_JSON_PARSE_FAILURES = Counter(
+    "llm_json_parse_failures_total",
+    "Muscle-info generations that did not contain parseable JSON.",
+)
+LLM_TIMEOUTS = Counter(
+    "llm_timeouts_total",
+    "LLM generations abandoned at the endpoint deadline.",
+    ["endpoint"],
+)
+LLM_FALLBACKS = Counter(
+    "llm_fallbacks_total",
+    "Responses served by the rule-based/static fallback instead of the LLM.",
+    ["endpoint", "reason"],
+)
+CALLOUT_POOL_REQUESTS = Counter(
+    "callout_pool_requests_total",
+    "Callout pool lookups by outcome.",
+    ["outcome"],
+)
+
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command latency as reported by the driver.",
+    ["command", "collection", "outcome"],
+    buckets=_LATENCY_BUCKETS,
+)
+
+TTS_REQUEST_SECONDS = Histogram(
+    "tts_request_duration_seconds",
+    "Speech synthesis latency; for streams, time until the last chunk.",
+    ["mode", "cache"],
+    buckets=_LATENCY_BUCKETS,
+)
+TTS_FIRST_CHUNK_SECONDS = Histogram(
+    "tts_first_chunk_seconds",
+    "Time until the first audio chunk of a streamed synthesis.",
+    ["cache"],
+    buckets=_LATENCY_BUCKETS,
+)
+
+PROGRESS_EVENTS = Counter(
+    "progress_events_total",
+    "Workout progress events by outcome (buffered, written, dropped).",
+    ["outcome"],
+)
+PROGRESS_FLUSH_SECONDS = Histogram(
+    "progress_flush_duration_seconds",
+    "Time to bulk-write one flush of buffered progress events.",
+    buckets=_LATENCY_BUCKETS,
+)
+PROGRESS_FLUSH_EVENTS = Histogram(
+    "progress_flush_events",
+    "Progress events written per flush.",
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+
+AUDIT_LOG_DOCUMENTS = Counter(
+    "audit_log_documents_total",
+    "Audit documents handled by AuditLogSink by outcome (queued, written, dropped, failed).",
+    ["collection", "outcome"],
+)
+AUDIT_LOG_QUEUE_DEPTH = Gauge(
+    "audit_log_queue_depth",
+    "Audit documents waiting in AuditLogSink.",
+)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command the driver runs, labelled by command and collection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started: Dict[Tuple[int, object], str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+        with self._lock:
+            self._started[(event.request_id, event.connection_id)] = collection
+
+    def _finish(self, event, outcome: str) -> None:
+        with self._lock:
+            collection = self._started.pop((event.request_id, event.connection_id), "")
+        MONGO_COMMAND_SECONDS.labels(event.command_name, collection, outcome).observe(
+            event.duration_micros / 1_000_000
+        )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, "ok")
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, "error")
+
+
+class PrometheusMiddleware:
+    """ASGI middleware recording ``http_request_duration_seconds`` per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners cannot blow up cardinality
+            template = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.labels(scope["method"], template, str(status)).observe(
+                time.perf_counter() - started
+            )
@@ -1,20 +1,49 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request
+from fastapi import FastAPI, APIRouter, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 import os
 import logging
 import asyncio
+import heapq
+import itertools
+import random
 import re
+import time
 import json
+import threading
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Callable, Deque, Dict, List, Literal, Optional, Tuple
+from collections import deque
 import uuid
-from datetime import datetime, timezone
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
 import base64
+import hashlib
+import hmac
+from cachetools import LRUCache, TTLCache
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from callouts import ParsedCallout, parse_callout
+from combos import combo_catalog, seeded_rng
+from grammar import (
+    Grammar, GrammarIndex, GrammarLogitsProcessor, TokenVocabulary,
+    alt, chars, lit, opt, repeat, seq, star,
+)
+from metrics import (
+    AUDIT_LOG_DOCUMENTS, AUDIT_LOG_QUEUE_DEPTH, CALLOUT_POOL_REQUESTS, LLM_ABORTED_TOKENS,
+    LLM_ADMISSION_REJECTIONS, LLM_BATCH_SIZE, LLM_CALLOUT_VALIDATION_FAILURES, LLM_FALLBACKS,
+    LLM_GENERATE_SECONDS, LLM_GENERATIONS_ABORTED, LLM_JSON_PARSE_FAILURES, LLM_QUEUE_DEPTH,
+    LLM_QUEUE_WAIT_SECONDS, LLM_READY, LLM_TIMEOUTS, LLM_TOKENS_GENERATED, LLM_TOKENS_PER_SECOND,
+    MongoCommandMetrics, PROGRESS_EVENTS, PROGRESS_FLUSH_EVENTS, PROGRESS_FLUSH_SECONDS,
+    PrometheusMiddleware,
+)
+from tts import close_openai_client, stream_speech, synthesize_speech, tts_cache
 
 ROOT_DIR = Path(__file__).parent
 try:
@@ -31,10 +60,14 @@ logger = logging.getLogger(__name__)
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics()])
 db = client[os.environ['DB_NAME']]
 logger.info(f"DB name: {os.environ['DB_NAME']}")
 
+# Audio track bytes live in GridFS; audio_tracks documents hold metadata only
+AUDIO_CHUNK_SIZE = 256 * 1024
+audio_fs = AsyncIOMotorGridFSBucket(db, bucket_name="audio_track_files", chunk_size_bytes=AUDIO_CHUNK_SIZE)
+
 # Create the main app without a prefix
 app = FastAPI(title="Brutality Fitness API", version="1.0.0")
 
@@ -58,6 +91,22 @@ class WorkoutSession(BaseModel):
 class WorkoutSessionCreate(BaseModel):
     user_id: str
 
+class ProgressEvent(BaseModel):
+    type: Literal["move", "round_complete"] = "move"
+    round_number: int = Field(ge=1)
+    offset_ms: int = Field(default=0, ge=0)  # position within the round
+    command: Optional[str] = None
+    complexity: float = 0.0
+    intensity: float = 0.0
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+class ProgressBatch(BaseModel):
+    events: List[ProgressEvent] = Field(min_length=1, max_length=500)
+
+class ProgressAccepted(BaseModel):
+    accepted: int
+    buffered: int
+
 class TTSRequest(BaseModel):
     text: str
     voice: str = "alloy"  # OpenAI TTS voices: alloy, echo, fable, onyx, nova, shimmer
@@ -76,31 +125,79 @@ class MoveCommand(BaseModel):
     round_number: int
 
 class AudioTrack(BaseModel):
+    """Track metadata; the audio itself is served by /audio/track/{id}/stream."""
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
     artist: str
-    audio_base64: str
     duration_ms: int
     genre: str = "techno_house"
+    content_type: str = "audio/mpeg"
+    size_bytes: int = 0
+    sha256: Optional[str] = None  # content hash; tracks with equal hashes share one GridFS blob
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class AudioTrackPage(BaseModel):
+    """One page of /audio/tracks; fields missing from ``tracks`` were not requested."""
+    tracks: List[dict]
+    next_cursor: Optional[str] = None
+
 class AudioTrackCreate(BaseModel):
     name: str
     artist: str
     audio_base64: str
     duration_ms: int
+    content_type: str = "audio/mpeg"
+
+class AudioUploadCreate(BaseModel):
+    """Track metadata for a chunked upload; ``size_bytes`` is checked at finalize when given."""
+    name: str
+    artist: str
+    duration_ms: int
+    content_type: str = "audio/mpeg"
+    genre: str = "techno_house"
+    size_bytes: Optional[int] = Field(default=None, ge=1)
+
+class AudioUploadStatus(BaseModel):
+    upload_id: str
+    status: Literal["open", "finalizing", "finalized"]
+    received_bytes: int  # resume by appending at this offset
+    size_bytes: Optional[int] = None
+    chunk_size: int
+    track_id: Optional[str] = None
 
 class CalloutRequest(BaseModel):
     complexity: float
     intensity: float
     round_number: int
     previous_move: str = ""
+    session_id: Optional[str] = None  # seeds the rule-based fallback per workout session
 
 class CalloutResponse(BaseModel):
     command: str
     duration_ms: int
     muscle_groups: List[str] = []
 
+class RoundPlanRequest(BaseModel):
+    round_number: int
+    round_length_ms: int = Field(default=300_000, gt=0, le=3_600_000)
+    intensity: Optional[float] = None  # defaults to the app's per-round ramp (0.1 per round)
+    complexity_step: float = 0.1
+    complexity_interval_ms: int = Field(default=30_000, gt=0)
+    previous_move: str = ""
+
+class PlannedCallout(BaseModel):
+    offset_ms: int
+    command: str
+    duration_ms: int
+    complexity: float
+    intensity: float
+
+class RoundPlan(BaseModel):
+    session_id: str
+    round_number: int
+    total_duration_ms: int
+    callouts: List[PlannedCallout]
+
 class MuscleInfoRequest(BaseModel):
     move: str
 
@@ -110,113 +207,104 @@ class MuscleInfoResponse(BaseModel):
     secondary_muscles: List[str]
     description: str
 
+class LlmReloadRequest(BaseModel):
+    model: Optional[str] = None  # defaults to the current TINYLLAMA_MODEL
+    backend: Optional[str] = None  # one of TINYLLAMA_BACKENDS; defaults to LLM_BACKEND
+
 # ---------------------------------------------------------------------------
 # WorkoutEngine (rule-based fallback)
 # ---------------------------------------------------------------------------
 
 class WorkoutEngine:
-    def __init__(self):
-        self.moves = {
-            1: "Left straight punch",
-            2: "Right straight punch",
-            3: "Left hook",
-            4: "Right uppercut"
-        }
-
-    def generate_move_command(self, complexity: float, intensity: float, round_num: int) -> MoveCommand:
+    """Rule-based callouts drawn from the precompiled combo catalog (see combos.py).
+
+    Every draw takes an optional ``rng``. Callers that know the workout session
+    pass ``session_rng(session_id)``, so a session's callouts replay identically
+    for a given ``WORKOUT_RNG_SEED``. Other callers share one engine-wide RNG.
+    """
+
+    def __init__(self, seed: Optional[str] = None):
+        self.seed = seed
+        self.catalog = combo_catalog
+        self._rng = seeded_rng("engine", salt=seed) if seed is not None else random.Random()
+        self._session_rngs: TTLCache = TTLCache(maxsize=4096, ttl=6 * 3600)
+
+    def session_rng(self, session_id: str) -> random.Random:
+        """The RNG for one workout session, created on first use and kept while the session is active."""
+        rng = self._session_rngs.get(session_id)
+        if rng is None:
+            rng = self._session_rngs[session_id] = seeded_rng("session", session_id, salt=self.seed)
+        return rng
+
+    def generate_move_command(
+        self, complexity: float, intensity: float, round_num: int, rng: Optional[random.Random] = None
+    ) -> MoveCommand:
         """Generate a move command based on complexity and intensity scores"""
-        import random
-
-        command = ""
-        duration_ms = 0
-
-        if complexity == 0.0:
-            move_number = random.randint(1, 4)
-            command = str(move_number)
-            duration_ms = move_number * 1000 + 1500
-
-        elif complexity <= 0.4:
-            if random.random() < intensity:
-                move_number = random.randint(1, 4)
-                command = f"Defense and {move_number}"
-                duration_ms = 1500 + (move_number * 1000) + 1500
-            else:
-                move_number = random.randint(1, 4)
-                command = str(move_number)
-                duration_ms = move_number * 1000 + 1500
-
-        else:
-            if random.random() < 0.5:
-                moves = ["Left straight", "Right straight", "Left hook", "Right uppercut"]
-                combo = []
-                num_moves = random.randint(2, 4)
-                if random.random() < intensity:
-                    combo.append("Defense")
-                for _ in range(num_moves):
-                    combo.append(random.choice(moves))
-                command = ", ".join(combo)
-                duration_ms = len(combo) * 1500
-            else:
-                move_number = random.randint(1, 4)
-                if random.random() < intensity:
-                    command = f"Defense and {move_number}"
-                    duration_ms = 1500 + (move_number * 1000) + 1500
-                else:
-                    command = str(move_number)
-                    duration_ms = move_number * 1000 + 1500
-
+        entry = self.catalog.move_command_table(complexity, intensity).sample(rng or self._rng)
         return MoveCommand(
-            command=command,
+            command=entry.command,
             complexity_score=complexity,
             intensity_score=intensity,
-            duration_ms=duration_ms,
+            duration_ms=entry.duration_ms,
             round_number=round_num
         )
 
-    def generate_callout(self, complexity: float, intensity: float, round_num: int, previous_move: str = "") -> CalloutResponse:
+    def generate_callout(
+        self,
+        complexity: float,
+        intensity: float,
+        round_num: int,
+        previous_move: str = "",
+        rng: Optional[random.Random] = None,
+    ) -> CalloutResponse:
         """Generate a callout response using rule-based logic (fallback for LLM)."""
-        import random
-
-        moves_short = ["1", "2", "3", "4"]
-        moves_named = ["Left straight", "Right straight", "Left hook", "Right uppercut"]
-
-        if complexity < 0.2:
-            command = random.choice(moves_short)
-            duration_ms = (int(command) * 1000) + 1500
-        elif complexity < 0.5:
-            a, b = random.sample(moves_short, 2)
-            command = f"{a}-{b}"
-            duration_ms = 3000
-        else:
-            combo_count = random.randint(2, 4)
-            parts = []
-            if intensity > 0.5 and random.random() < intensity:
-                parts.append("Defense")
-            for _ in range(combo_count):
-                parts.append(random.choice(moves_named if complexity > 0.6 else moves_short))
-            command = ", ".join(parts)
-            duration_ms = len(parts) * 1500
-
+        rng = rng or self._rng
+        entry = self.catalog.callout_table(complexity, intensity).sample(rng)
         # Avoid repeating the previous move
-        if command == previous_move:
-            command = random.choice(moves_short)
-            duration_ms = (int(command) * 1000) + 1500
-
-        return CalloutResponse(command=command, duration_ms=duration_ms, muscle_groups=[])
-
-
-workout_engine = WorkoutEngine()
+        if entry.command == previous_move:
+            entry = self.catalog.single_other_than(previous_move, rng)
+        return CalloutResponse(command=entry.command, duration_ms=entry.duration_ms, muscle_groups=[])
+
+    def plan_round(
+        self,
+        round_num: int,
+        round_length_ms: int,
+        intensity: float,
+        complexity_step: float = 0.1,
+        complexity_interval_ms: int = 30_000,
+        previous_move: str = "",
+        rng: Optional[random.Random] = None,
+    ) -> List[PlannedCallout]:
+        """Pre-generate a full round of timed callouts.
+
+        Mirrors the app's ramp: complexity restarts at 0.0 each round and climbs by
+        ``complexity_step`` every ``complexity_interval_ms``; intensity is fixed for
+        the round. Callouts are appended until their summed duration covers the round,
+        and each one is generated with the previous command to keep the no-repeat rule.
+        """
+        callouts: List[PlannedCallout] = []
+        offset_ms = 0
+        while offset_ms < round_length_ms:
+            complexity = min(1.0, (offset_ms // complexity_interval_ms) * complexity_step)
+            callout = self.generate_callout(complexity, intensity, round_num, previous_move, rng)
+            callouts.append(PlannedCallout(
+                offset_ms=offset_ms,
+                command=callout.command,
+                duration_ms=callout.duration_ms,
+                complexity=complexity,
+                intensity=intensity,
+            ))
+            offset_ms += callout.duration_ms
+            previous_move = callout.command
+        return callouts
+
+
+workout_engine = WorkoutEngine(seed=os.environ.get("WORKOUT_RNG_SEED"))
 
 # ---------------------------------------------------------------------------
 # LlmEngine (TinyLlama via HuggingFace transformers)
 # ---------------------------------------------------------------------------
 
-# Valid callout pattern: digits 1-4, "Defense", commas, hyphens, spaces
-_CALLOUT_PATTERN = re.compile(
-    r'^[\d,\-\s]*(Defense[\s,\-]*)?([\d,\-\s]*(Defense[\s,\-]*)?)*$',
-    re.IGNORECASE
-)
-
 CALLOUT_SYSTEM = (
     "You are a boxing trainer calling out combinations during a workout. "
     "Respond with ONLY the combination command — no explanation, no commentary, no punctuation beyond commas and hyphens. "
@@ -229,71 +317,1129 @@ MUSCLE_SYSTEM = (
     '{"primary": ["muscle1", "muscle2"], "secondary": ["muscle3"], "description": "one short sentence"}'
 )
 
+# Decoding grammars. Callouts get one grammar per prompt class of
+# _build_callout_messages: combo length (1, 2, or 3-4 moves) x Defense or not.
+_CALLOUT_MOVE = chars("1234")
+_CALLOUT_SEP = alt(lit("-"), lit(", "), lit(" "))
 
-class LlmEngine:
-    _tokenizer = None
-    _model = None
-    _loaded: bool = False
 
-    @classmethod
-    def _load_blocking(cls) -> None:
+def _callout_grammar_node(min_moves: int, max_moves: int, defense: bool) -> tuple:
+    moves = seq(_CALLOUT_MOVE, repeat(seq(_CALLOUT_SEP, _CALLOUT_MOVE), min_moves - 1, max_moves - 1))
+    if defense:
+        moves = seq(lit("Defense"), _CALLOUT_SEP, moves)
+    return seq(opt(lit(" ")), moves)
+
+
+CALLOUT_GRAMMARS: Dict[Tuple[int, int], Grammar] = {
+    (complexity_bucket, defense): Grammar(
+        f"callout-c{complexity_bucket}-i{defense}",
+        _callout_grammar_node(low, high, bool(defense)),
+    )
+    for complexity_bucket, (low, high) in enumerate(((1, 1), (2, 2), (3, 4)))
+    for defense in (0, 1)
+}
+
+_MUSCLE_NAME_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ -'"
+_MUSCLE_TEXT_CHARS = _MUSCLE_NAME_CHARS + "0123456789,.;()"
+_MUSCLE_NAME = seq(lit('"'), chars(_MUSCLE_NAME_CHARS), star(chars(_MUSCLE_NAME_CHARS)), lit('"'))
+_MUSCLE_LIST = seq(lit("["), _MUSCLE_NAME, repeat(seq(lit(", "), _MUSCLE_NAME), 0, 2), lit("]"))
+
+MUSCLE_GRAMMAR = Grammar("muscle-info", seq(
+    star(lit(" ")),
+    lit('{"primary": '), _MUSCLE_LIST,
+    lit(', "secondary": '), alt(lit("[]"), _MUSCLE_LIST),
+    lit(', "description": "'), chars(_MUSCLE_TEXT_CHARS), star(chars(_MUSCLE_TEXT_CHARS)),
+    lit('"}'),
+))
+
+
+# LLM_BACKEND values served by LlmEngine; everything else uses the rule-based engines
+TINYLLAMA_BACKENDS = ("tinyllama", "tinyllama-int8", "tinyllama-onnx")
+
+# Per-endpoint LLM budgets before falling back to the rule-based/static answers
+CALLOUT_TIMEOUT_S = 8.0
+MUSCLE_INFO_TIMEOUT_S = 10.0
+BREAK_TIP_TIMEOUT_S = 12.0
+
+# Decoding settings shared by every backend; top_k is transformers' generate() default
+LLM_SAMPLING = {"temperature": 0.7, "top_k": 50, "top_p": 0.9, "repetition_penalty": 1.1}
+
+# LlmBatcher scheduling classes, most urgent first. Callouts are on the critical
+# path of a running round; tips and pool refills can wait or fall back.
+LLM_PRIORITIES = {"callout": 0, "muscle_info": 1, "break_tip": 2, "pool": 3}
+LLM_LOWEST_PRIORITY = max(LLM_PRIORITIES.values())
+
+
+def _llm_model_id() -> str:
+    return os.environ.get("TINYLLAMA_MODEL", "TinyLlama/TinyLlama-1.1B-Chat-v1.0")
+
+
+class GenerationControl:
+    """Deadline and cancellation flag for one row of a batched generate.
+
+    ``cancel`` is called from the event loop when the caller stops waiting;
+    the model thread polls ``abort_reason`` once per decode step.
+    """
+
+    __slots__ = ("deadline", "_cancelled")
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def abort_reason(self, now: float) -> Optional[str]:
+        if self._cancelled.is_set():
+            return "cancelled"
+        if self.deadline is not None and now >= self.deadline:
+            return "deadline"
+        return None
+
+
+class _AbortCriteria:
+    """Per-row stopping criterion that ends rows whose caller has given up.
+
+    generate pads finished rows and returns once every row is done, so one
+    abandoned request no longer holds its batch (or the model thread) to
+    ``max_new_tokens``. Follows the transformers ``StoppingCriteria`` call
+    protocol, like GrammarLogitsProcessor does for logits processors; the
+    ONNX decode loop calls ``poll`` directly.
+    """
+
+    def __init__(self, controls: List[Optional[GenerationControl]]):
+        self.controls = controls
+        self.aborted: Dict[int, str] = {}
+
+    def poll(self) -> List[bool]:
+        """Per row, whether it has been aborted; records the reason the first time."""
+        now = time.time()
+        for row, control in enumerate(self.controls):
+            if control is not None and row not in self.aborted:
+                reason = control.abort_reason(now)
+                if reason is not None:
+                    self.aborted[row] = reason
+        return [row in self.aborted for row in range(len(self.controls))]
+
+    def __call__(self, input_ids, scores, **kwargs):
         import torch
-        from transformers import AutoTokenizer, AutoModelForCausalLM
 
-        model_id = os.environ.get("TINYLLAMA_MODEL", "TinyLlama/TinyLlama-1.1B-Chat-v1.0")
-        logger.info(f"Loading model: {model_id}")
-        cls._tokenizer = AutoTokenizer.from_pretrained(model_id)
-        cls._model = AutoModelForCausalLM.from_pretrained(
-            model_id, device_map="auto", torch_dtype="auto"
-        )
-        cls._model.eval()
-        cls._loaded = True
-        logger.info("LlmEngine: model loaded successfully")
+        return torch.tensor(self.poll(), dtype=torch.bool, device=input_ids.device)
+
+
+class _LoadedModel(ABC):
+    """Everything one loaded checkpoint needs to serve generations.
+
+    LlmEngine holds exactly one of these at a time and replaces it with a
+    single assignment, so a reload builds and warms the new model completely
+    before any request sees it, and a batch already running keeps the
+    tokenizer, weights and caches it started with.
+
+    This base class owns what does not depend on the inference runtime:
+    chat-prompt tokenization, grammar indexes and the choice of cached
+    system-prompt prefix. A backend subclass (see LLM_MODEL_CLASSES)
+    implements ``load``, ``_prefill`` and ``generate_batch``.
+    """
+
+    def __init__(self, model_id: str, backend: str, tokenizer):
+        self.model_id = model_id
+        self.backend = backend
+        self.tokenizer = tokenizer
+        self.vocab: Optional[TokenVocabulary] = None
+        self.grammar_indexes: Dict[str, GrammarIndex] = {}
+        # System prompt -> (token ids, per-layer key/value cache) prefilled once at load
+        self.prefix_caches: Dict[str, tuple] = {}
+        self.prompt_ids_cache: LRUCache = LRUCache(maxsize=1024)
 
     @classmethod
-    async def load(cls) -> None:
-        await asyncio.to_thread(cls._load_blocking)
+    @abstractmethod
+    def load(cls, model_id: str, backend: str, progress: Callable[[str, float], None]) -> "_LoadedModel":
+        """Load tokenizer and weights; ``progress(stage, fraction)`` reports each step."""
+
+    @staticmethod
+    def _load_tokenizer(model_id: str):
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(model_id)
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        return tokenizer
+
+    def grammar_index(self, grammar: Grammar) -> GrammarIndex:
+        index = self.grammar_indexes.get(grammar.name)
+        if index is None:
+            index = self.grammar_indexes[grammar.name] = GrammarIndex(grammar, self.vocab)
+        return index
+
+    def prompt_ids(self, messages: list) -> List[int]:
+        """Token ids of the rendered chat prompt, memoized per distinct conversation."""
+        key = tuple((m["role"], m["content"]) for m in messages)
+        ids = self.prompt_ids_cache.get(key)
+        if ids is None:
+            prompt = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+            # The chat template already carries its special tokens, matching apply_chat_template(tokenize=True)
+            ids = self.prompt_ids_cache[key] = self.tokenizer(prompt, add_special_tokens=False).input_ids
+        return ids
+
+    def prefill_system_prompt(self, system_prompt: str) -> None:
+        """Run prefill over the part of the prompt every request with this system message shares."""
+        probes = [
+            self.prompt_ids([{"role": "system", "content": system_prompt}, {"role": "user", "content": user}])
+            for user in ("1", "Move: Defense", "Round 7, 3 or 4 move combination.")
+        ]
+        shared = 0
+        while all(len(ids) > shared and ids[shared] == probes[0][shared] for ids in probes):
+            shared += 1
+        if shared == 0:
+            return
+        prefix_ids = probes[0][:shared]
+        self.prefix_caches[system_prompt] = (prefix_ids, self._prefill(prefix_ids))
+        logger.info(f"LlmEngine: cached {shared}-token prefix for system prompt {system_prompt[:32]!r}...")
+
+    @abstractmethod
+    def _prefill(self, prefix_ids: List[int]) -> tuple:
+        """Per-layer (key, value) cache for one row of ``prefix_ids``."""
+
+    def shared_prefix(self, batch_messages: List[list], batch_ids: List[List[int]]) -> Optional[tuple]:
+        """The cached prefix for this batch, if every row starts with the same cached system prompt."""
+        first = batch_messages[0][0] if batch_messages[0] else None
+        if not first or first.get("role") != "system":
+            return None
+        prefix = self.prefix_caches.get(first["content"])
+        if prefix is None:
+            return None
+        prefix_ids = prefix[0]
+        for messages, ids in zip(batch_messages, batch_ids):
+            # Guard against tokenizer merges across the prefix boundary as well as mixed system prompts
+            if messages[0] is not first and messages[0] != first:
+                return None
+            if len(ids) <= len(prefix_ids) or ids[:len(prefix_ids)] != prefix_ids:
+                return None
+        return prefix
+
+    @abstractmethod
+    def generate_batch(
+        self,
+        batch_messages: List[list],
+        max_new_tokens: int,
+        grammar: Optional[Grammar] = None,
+        controls: Optional[List[Optional[GenerationControl]]] = None,
+    ) -> List[Optional[str]]:
+        """Generate a reply for each chat prompt in one batch; aborted rows come back as None."""
+
+    def _finish_batch(
+        self,
+        grammar: Optional[Grammar],
+        rows: List[list],
+        row_tokens: List[int],
+        elapsed: float,
+        aborted: Dict[int, str],
+    ) -> List[Optional[str]]:
+        """Record batch metrics and decode the generated ids of every row that was not aborted."""
+        new_tokens = sum(row_tokens)
+        grammar_label = grammar.name if grammar is not None else "none"
+        LLM_GENERATE_SECONDS.labels(grammar_label).observe(elapsed)
+        LLM_BATCH_SIZE.observe(len(rows))
+        LLM_TOKENS_GENERATED.labels(grammar_label).inc(new_tokens)
+        if elapsed > 0:
+            LLM_TOKENS_PER_SECOND.observe(new_tokens / elapsed)
+
+        for row, reason in aborted.items():
+            LLM_GENERATIONS_ABORTED.labels("decoding", reason).inc()
+            LLM_ABORTED_TOKENS.inc(row_tokens[row])
+        return [
+            None if index in aborted else self.tokenizer.decode(row, skip_special_tokens=True).strip()
+            for index, row in enumerate(rows)
+        ]
+
+
+class _TorchModel(_LoadedModel):
+    """transformers model running eagerly in PyTorch (LLM_BACKEND=tinyllama, tinyllama-int8)."""
+
+    def __init__(self, model_id: str, backend: str, tokenizer, model):
+        super().__init__(model_id, backend, tokenizer)
+        self.model = model
 
     @classmethod
-    def _generate_blocking(cls, messages: list, max_new_tokens: int) -> str:
+    def load(cls, model_id: str, backend: str, progress: Callable[[str, float], None]) -> "_TorchModel":
         import torch
-
-        # apply_chat_template returns a BatchEncoding (dict-like) in transformers>=4.40,
-        # not a raw tensor — extract input_ids explicitly to avoid KeyError: 'shape'
-        raw = cls._tokenizer.apply_chat_template(
-            messages,
-            tokenize=True,
-            add_generation_prompt=True,
-            return_tensors="pt",
-        )
-        if hasattr(raw, 'input_ids'):
-            input_ids = raw.input_ids.to(cls._model.device)
-        elif isinstance(raw, dict):
-            input_ids = raw['input_ids'].to(cls._model.device)
+        from transformers import AutoModelForCausalLM
+
+        progress("loading tokenizer", 0.05)
+        tokenizer = cls._load_tokenizer(model_id)
+        progress("loading weights", 0.15)
+        if backend == "tinyllama-int8":
+            # Dynamic int8 quantization is CPU-only and expects fp32 Linear layers
+            model = AutoModelForCausalLM.from_pretrained(model_id, torch_dtype=torch.float32)
+            progress("quantizing", 0.55)
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
         else:
-            input_ids = raw.to(cls._model.device)
+            model = AutoModelForCausalLM.from_pretrained(model_id, device_map="auto", torch_dtype="auto")
+        model.eval()
+        if os.environ.get("LLM_TORCH_COMPILE", "0") == "1":
+            model.forward = torch.compile(model.forward, dynamic=True)
+        return cls(model_id, backend, tokenizer, model)
+
+    def _prefill(self, prefix_ids: List[int]) -> tuple:
+        import torch
+        from transformers import DynamicCache
+
+        with torch.no_grad():
+            output = self.model(
+                input_ids=torch.tensor([prefix_ids], device=self.model.device),
+                past_key_values=DynamicCache(),
+                use_cache=True,
+            )
+        return output.past_key_values.to_legacy_cache()
+
+    def generate_batch(
+        self,
+        batch_messages: List[list],
+        max_new_tokens: int,
+        grammar: Optional[Grammar] = None,
+        controls: Optional[List[Optional[GenerationControl]]] = None,
+    ) -> List[Optional[str]]:
+        """Run one padded model.generate over several chat prompts and decode each row.
+
+        When every row shares a system prompt whose KV cache was prefilled at load,
+        the batch is laid out as [cached prefix][left-padded user suffix] and only
+        the suffixes are prefilled. Position ids follow the attention mask, so the
+        padding between prefix and suffix does not shift positions.
+
+        ``controls`` holds one optional GenerationControl per row. A row whose
+        deadline passes or whose caller cancels stops decoding at the next step
+        and comes back as None.
+        """
+        import torch
+        from transformers import DynamicCache, LogitsProcessorList, StoppingCriteriaList
+
+        batch_ids = [self.prompt_ids(messages) for messages in batch_messages]
+        prefix = self.shared_prefix(batch_messages, batch_ids)
+        prefix_length = len(prefix[0]) if prefix else 0
+        suffixes = [ids[prefix_length:] for ids in batch_ids]
+
+        width = max(len(ids) for ids in suffixes)
+        pad_id = self.tokenizer.pad_token_id
+        device = self.model.device
+        input_ids = torch.tensor([[pad_id] * (width - len(ids)) + ids for ids in suffixes], device=device)
+        attention_mask = torch.tensor([[0] * (width - len(ids)) + [1] * len(ids) for ids in suffixes], device=device)
+
+        past_key_values = None
+        if prefix:
+            rows = len(batch_messages)
+            prefix_tensor = torch.tensor([prefix[0]], device=device).expand(rows, -1)
+            input_ids = torch.cat([prefix_tensor, input_ids], dim=-1)
+            attention_mask = torch.cat([torch.ones_like(prefix_tensor), attention_mask], dim=-1)
+            # generate() appends to the cache in place, so every call gets its own copy
+            past_key_values = DynamicCache.from_legacy_cache(tuple(
+                (key.expand(rows, -1, -1, -1).contiguous(), value.expand(rows, -1, -1, -1).contiguous())
+                for key, value in prefix[1]
+            ))
 
         input_length = input_ids.shape[-1]
 
+        logits_processor = None
+        if grammar is not None and self.vocab is not None:
+            # Restrict sampling to the grammar; generation stops as soon as it is complete
+            logits_processor = LogitsProcessorList([
+                GrammarLogitsProcessor(self.grammar_index(grammar), input_length, max_new_tokens)
+            ])
+
+        abort = None
+        if controls is not None and any(control is not None for control in controls):
+            abort = _AbortCriteria(controls)
+
+        started = time.perf_counter()
         with torch.no_grad():
-            output = cls._model.generate(
-                input_ids,
+            output = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                past_key_values=past_key_values,
+                logits_processor=logits_processor,
+                stopping_criteria=StoppingCriteriaList([abort]) if abort is not None else None,
                 max_new_tokens=max_new_tokens,
                 do_sample=True,
-                temperature=0.7,
-                top_p=0.9,
-                repetition_penalty=1.1,
-                pad_token_id=cls._tokenizer.eos_token_id,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **LLM_SAMPLING,
             )
+        elapsed = time.perf_counter() - started
+        generated = output[:, input_length:]
+        row_tokens = (generated != pad_id).sum(dim=-1).tolist()
+        return self._finish_batch(
+            grammar, generated.tolist(), row_tokens, elapsed, abort.aborted if abort is not None else {}
+        )
+
+
+class _OnnxModel(_LoadedModel):
+    """Exported decoder running in ONNX Runtime on CPU (LLM_BACKEND=tinyllama-onnx).
+
+    ``model_id`` is a directory written by export_onnx.py: ``model.onnx`` with
+    explicit KV-cache inputs and outputs (``past_key_values.N.key/value`` in,
+    ``present.N.key/value`` out, as in optimum's text-generation-with-past
+    export) next to the tokenizer files. Serving needs onnxruntime and the
+    transformers tokenizer, not torch.
+
+    The decode loop mirrors ``model.generate``: the same cached-prefix and
+    left-padding layout, repetition penalty, grammar mask, temperature, top-k
+    and top-p sampling, EOS and abort handling. Between steps the KV cache
+    stays in ORT-owned OrtValues: each step's ``present.*`` outputs are bound
+    as the next step's ``past_key_values.*`` inputs through IO binding, so the
+    growing cache is never copied out to numpy and back.
+    """
+
+    _DTYPES = {"tensor(float)": "float32", "tensor(float16)": "float16"}
+
+    def __init__(self, model_id: str, backend: str, tokenizer, session):
+        super().__init__(model_id, backend, tokenizer)
+        self.session = session
+        inputs = {node.name: node for node in session.get_inputs()}
+        self.past_names = sorted(
+            (name for name in inputs if name.startswith("past_key_values.")),
+            key=lambda name: (int(name.split(".")[1]), name.split(".")[2] != "key"),
+        )
+        self.present_names = [name.replace("past_key_values.", "present.", 1) for name in self.past_names]
+        self.output_names = ["logits", *self.present_names]
+        self.uses_position_ids = "position_ids" in inputs
+        first_past = inputs[self.past_names[0]]
+        # [batch, kv heads, past length, head dim]; the middle axes are fixed at export
+        self.kv_heads, self.head_dim = first_past.shape[1], first_past.shape[3]
+        self.kv_dtype = self._DTYPES[first_past.type]
+        self.rng = None
+
+    @classmethod
+    def load(cls, model_id: str, backend: str, progress: Callable[[str, float], None]) -> "_OnnxModel":
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("LLM_BACKEND=tinyllama-onnx needs onnxruntime: pip install -r requirements-onnx.txt")
+
+        model_file = Path(model_id) / "model.onnx"
+        if not model_file.is_file():
+            raise RuntimeError(f"{model_file} not found; create it with export_onnx.py")
+        progress("loading tokenizer", 0.05)
+        tokenizer = cls._load_tokenizer(model_id)
+        progress("loading ONNX model", 0.15)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = int(os.environ.get("LLM_ONNX_THREADS", "0"))
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        session = ort.InferenceSession(str(model_file), options, providers=["CPUExecutionProvider"])
+        return cls(model_id, backend, tokenizer, session)
+
+    def _empty_past(self, rows: int) -> list:
+        import numpy as np
+
+        shape = (rows, self.kv_heads, 0, self.head_dim)
+        return [np.zeros(shape, dtype=self.kv_dtype) for _ in self.past_names]
+
+    def _prefill(self, prefix_ids: List[int]) -> tuple:
+        import numpy as np
+
+        length = len(prefix_ids)
+        feeds = {
+            "input_ids": np.array([prefix_ids], dtype=np.int64),
+            "attention_mask": np.ones((1, length), dtype=np.int64),
+            **dict(zip(self.past_names, self._empty_past(1))),
+        }
+        if self.uses_position_ids:
+            feeds["position_ids"] = np.arange(length, dtype=np.int64)[None]
+        return tuple(self.session.run(self.present_names, feeds))
+
+    def generate_batch(
+        self,
+        batch_messages: List[list],
+        max_new_tokens: int,
+        grammar: Optional[Grammar] = None,
+        controls: Optional[List[Optional[GenerationControl]]] = None,
+    ) -> List[Optional[str]]:
+        """Same contract as _TorchModel.generate_batch, decoded step by step in ONNX Runtime."""
+        import numpy as np
+
+        if self.rng is None:
+            self.rng = np.random.default_rng()
+        batch_ids = [self.prompt_ids(messages) for messages in batch_messages]
+        prefix = self.shared_prefix(batch_messages, batch_ids)
+        prefix_length = len(prefix[0]) if prefix else 0
+        suffixes = [ids[prefix_length:] for ids in batch_ids]
+
+        rows = len(batch_messages)
+        width = max(len(ids) for ids in suffixes)
+        pad_id = self.tokenizer.pad_token_id
+        eos_id = self.tokenizer.eos_token_id
+        step_ids = np.array([[pad_id] * (width - len(ids)) + ids for ids in suffixes], dtype=np.int64)
+        attention_mask = np.array([[0] * (width - len(ids)) + [1] * len(ids) for ids in suffixes], dtype=np.int64)
+        if prefix:
+            attention_mask = np.concatenate([np.ones((rows, prefix_length), dtype=np.int64), attention_mask], axis=1)
+            past = [np.ascontiguousarray(np.broadcast_to(array, (rows, *array.shape[1:]))) for array in prefix[1]]
+        else:
+            past = self._empty_past(rows)
+        # Position ids follow the attention mask, as generate() computes them
+        position_ids = (np.cumsum(attention_mask, axis=1) - 1).clip(min=0)[:, -width:]
+
+        input_length = prefix_length + width
+        sequences = np.full((rows, input_length + max_new_tokens), pad_id, dtype=np.int64)
+        if prefix:
+            sequences[:, :prefix_length] = prefix[0]
+        sequences[:, prefix_length:input_length] = step_ids
+        seen = None
+
+        logits_processor = None
+        if grammar is not None and self.vocab is not None:
+            logits_processor = GrammarLogitsProcessor(self.grammar_index(grammar), input_length, max_new_tokens)
+        abort = None
+        if controls is not None and any(control is not None for control in controls):
+            abort = _AbortCriteria(controls)
+
+        started = time.perf_counter()
+        binding = self.session.io_binding()
+        unfinished = np.ones(rows, dtype=bool)
+        length = input_length
+        for _ in range(max_new_tokens):
+            binding.bind_cpu_input("input_ids", step_ids)
+            binding.bind_cpu_input("attention_mask", attention_mask)
+            if self.uses_position_ids:
+                binding.bind_cpu_input("position_ids", np.ascontiguousarray(position_ids))
+            for name, value in zip(self.past_names, past):
+                if isinstance(value, np.ndarray):
+                    binding.bind_cpu_input(name, value)
+                else:
+                    binding.bind_ortvalue_input(name, value)
+            for name in self.output_names:
+                binding.bind_output(name, "cpu")
+            self.session.run_with_iobinding(binding)
+            outputs = binding.get_outputs()
+            scores = outputs[0].numpy()[:, -1, :].astype(np.float32)
+            past = outputs[1:]
+            binding.clear_binding_inputs()
+            binding.clear_binding_outputs()
+
+            if seen is None:
+                # Sized from the logits, which may be padded past len(tokenizer)
+                seen = np.zeros(scores.shape, dtype=bool)
+                np.put_along_axis(seen, sequences[:, :input_length], True, axis=1)
+            scores = self._penalize_repeats(scores, seen)
+            if logits_processor is not None:
+                scores = logits_processor(sequences[:, :length], scores)
+            next_tokens = np.where(unfinished, self._sample(scores), pad_id)
+            sequences[:, length] = next_tokens
+            length += 1
+            seen[np.arange(rows), next_tokens] = True
+
+            unfinished &= next_tokens != eos_id
+            if abort is not None:
+                unfinished &= ~np.array(abort.poll())
+            if not unfinished.any():
+                break
+            step_ids = next_tokens[:, None]
+            attention_mask = np.concatenate([attention_mask, np.ones((rows, 1), dtype=np.int64)], axis=1)
+            position_ids = position_ids[:, -1:] + 1
+        elapsed = time.perf_counter() - started
+
+        generated = sequences[:, input_length:length]
+        row_tokens = (generated != pad_id).sum(axis=1).tolist()
+        return self._finish_batch(
+            grammar, generated.tolist(), row_tokens, elapsed, abort.aborted if abort is not None else {}
+        )
+
+    @staticmethod
+    def _penalize_repeats(scores, seen):
+        """transformers' RepetitionPenaltyLogitsProcessor over every token already in the row."""
+        import numpy as np
+
+        penalty = LLM_SAMPLING["repetition_penalty"]
+        penalized = np.where(scores < 0, scores * penalty, scores / penalty)
+        return np.where(seen, penalized, scores)
+
+    def _sample(self, scores):
+        """Temperature, top-k, then top-p sampling, in the order generate() applies them."""
+        import numpy as np
+
+        scores = scores / LLM_SAMPLING["temperature"]
+        # Only the top-k candidates can survive, so sort and normalize just those
+        top_k = min(LLM_SAMPLING["top_k"], scores.shape[-1])
+        candidates = np.argpartition(-scores, top_k - 1, axis=-1)[:, :top_k]
+        candidate_scores = np.take_along_axis(scores, candidates, axis=-1)
+        order = np.argsort(-candidate_scores, axis=-1)
+        candidates = np.take_along_axis(candidates, order, axis=-1)
+        candidate_scores = np.take_along_axis(candidate_scores, order, axis=-1)
+
+        probs = np.exp(candidate_scores - candidate_scores[:, :1])
+        probs /= probs.sum(axis=-1, keepdims=True)
+        # Keep the smallest head whose mass reaches top_p; the best token always stays
+        keep = np.cumsum(probs, axis=-1) - probs < LLM_SAMPLING["top_p"]
+        probs = np.where(keep, probs, 0.0)
+        probs /= probs.sum(axis=-1, keepdims=True)
+
+        draws = self.rng.random((probs.shape[0], 1))
+        picks = (np.cumsum(probs, axis=-1) < draws).sum(axis=-1).clip(max=top_k - 1)
+        return candidates[np.arange(len(picks)), picks]
+
+
+# LLM_BACKEND value -> the _LoadedModel implementation that serves it
+LLM_MODEL_CLASSES = {
+    "tinyllama": _TorchModel,
+    "tinyllama-int8": _TorchModel,
+    "tinyllama-onnx": _OnnxModel,
+}
+
 
-        new_tokens = output[0][input_length:]
-        return cls._tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
+class LlmEngine:
+    _state: Optional[_LoadedModel] = None
+    _loaded: bool = False
+    _batcher: Optional["LlmBatcher"] = None
+    _remote: Optional["InferenceClient"] = None
+    _load_task: Optional[asyncio.Task] = None
+    # Progress of the most recent (re)load, reported by /api/health
+    _load_status: dict = {"state": "idle", "stage": None, "progress": 0.0, "model": None, "error": None}
+
+    @classmethod
+    def _set_load_progress(cls, stage: str, progress: float) -> None:
+        cls._load_status = {**cls._load_status, "stage": stage, "progress": progress}
+        logger.info(f"LlmEngine: {stage} ({progress:.0%})")
+
+    @classmethod
+    def _load_blocking(cls, model_id: Optional[str] = None, backend: Optional[str] = None) -> None:
+        """Load, prefill and warm up a model, then switch it in; the previous model serves until then."""
+        model_id = model_id or _llm_model_id()
+        backend = backend or os.environ.get("LLM_BACKEND", "rule-based")
+        model_class = LLM_MODEL_CLASSES.get(backend)
+        if model_class is None:
+            raise RuntimeError(f"LLM_BACKEND={backend!r} has no model to load")
+        logger.info(f"Loading model: {model_id} (backend={backend})")
+        state = model_class.load(model_id, backend, cls._set_load_progress)
+        if os.environ.get("LLM_CONSTRAINED_DECODING", "1") == "1":
+            cls._set_load_progress("indexing vocabulary", 0.65)
+            state.vocab = TokenVocabulary(state.tokenizer)
+        if os.environ.get("LLM_PREFIX_CACHE", "1") == "1":
+            cls._set_load_progress("prefilling system prompts", 0.75)
+            for system_prompt in (CALLOUT_SYSTEM, MUSCLE_SYSTEM, BREAK_TIP_SYSTEM):
+                state.prefill_system_prompt(system_prompt)
+        cls._set_load_progress("warming up", 0.9)
+        cls._warm_up(state)
+
+        # Atomic switch-in: the next batch picks up the new state, running ones finish on the old
+        cls._state = state
+        cls._loaded = True
+        logger.info("LlmEngine: model loaded successfully")
+
+    @classmethod
+    def _warm_up(cls, state: _LoadedModel) -> None:
+        """Run one short callout so lazy init, compilation and grammar masks are paid before traffic."""
+        started = time.perf_counter()
+        state.generate_batch([_build_callout_messages(0.0, 0.0, 1, "")], 8, CALLOUT_GRAMMARS[(0, 0)])
+        elapsed = time.perf_counter() - started
+        logger.info(f"LlmEngine: warm-up generation took {elapsed:.2f}s")
 
     @classmethod
-    async def generate(cls, messages: list, max_new_tokens: int = 60) -> str:
-        if not cls._loaded or cls._model is None:
+    def _begin_load_status(cls, model_id: str) -> None:
+        cls._load_status = {
+            "state": "loading", "stage": "starting", "progress": 0.0, "model": model_id,
+            "error": None, "started_at": time.time(),
+        }
+
+    @classmethod
+    async def load(cls, model_id: Optional[str] = None, backend: Optional[str] = None) -> None:
+        socket_path = os.environ.get("LLM_WORKER_SOCKET")
+        model_id = model_id or _llm_model_id()
+        if cls._load_status.get("state") != "loading":
+            cls._begin_load_status(model_id)
+        try:
+            if socket_path:
+                # The model lives in the inference sidecar; this process only holds a client
+                cls._set_load_progress(f"waiting for inference worker at {socket_path}", 0.0)
+                cls._remote = InferenceClient(socket_path)
+                # Stays "loading" for as long as the worker takes; requests use the fallbacks meanwhile
+                await cls._remote.wait_ready(
+                    lambda note: cls._set_load_progress(f"waiting for inference worker at {socket_path}: {note}", 0.0)
+                )
+                cls._loaded = True
+            else:
+                await asyncio.to_thread(cls._load_blocking, model_id, backend)
+        except Exception as e:
+            cls._load_status = {**cls._load_status, "state": "failed", "error": str(e) or type(e).__name__}
+            raise
+        cls._load_status = {
+            **cls._load_status, "state": "ready", "stage": "ready", "progress": 1.0, "loaded_at": time.time(),
+        }
+
+    @classmethod
+    def start_loading(cls, model_id: Optional[str] = None, backend: Optional[str] = None) -> asyncio.Task:
+        """Load (or reload) in the background; requests keep using the current model or the fallbacks."""
+        if cls.is_loading():
+            raise RuntimeError("A model load is already in progress")
+
+        cls._begin_load_status(model_id or _llm_model_id())
+
+        async def run() -> None:
+            try:
+                await cls.load(model_id, backend)
+            except Exception:
+                logger.exception("LlmEngine: model load failed — serving with the previous model or fallbacks")
+                return
+            if model_id:
+                os.environ["TINYLLAMA_MODEL"] = model_id
+            if backend:
+                os.environ["LLM_BACKEND"] = backend
+            # Pooled callouts came from the previous model
+            callout_pool.clear()
+            callout_pool.start()
+
+        cls._load_task = asyncio.create_task(run())
+        return cls._load_task
+
+    @classmethod
+    def is_loading(cls) -> bool:
+        return cls._load_task is not None and not cls._load_task.done()
+
+    @classmethod
+    def status(cls) -> dict:
+        return {**cls._load_status, "ready": cls._loaded, "loading": cls.is_loading()}
+
+    @classmethod
+    def _generate_batch_blocking(
+        cls,
+        batch_messages: List[list],
+        max_new_tokens: int,
+        grammar: Optional[Grammar] = None,
+        controls: Optional[List[Optional[GenerationControl]]] = None,
+    ) -> List[Optional[str]]:
+        state = cls._state
+        if state is None:
+            raise RuntimeError("LlmEngine not loaded")
+        return state.generate_batch(batch_messages, max_new_tokens, grammar, controls)
+
+    @classmethod
+    def _generate_blocking(cls, messages: list, max_new_tokens: int, grammar: Optional[Grammar] = None) -> str:
+        return cls._generate_batch_blocking([messages], max_new_tokens, grammar)[0]
+
+    @classmethod
+    async def generate(
+        cls,
+        messages: list,
+        max_new_tokens: int = 60,
+        grammar: Optional[Grammar] = None,
+        deadline: Optional[float] = None,
+        priority: str = "callout",
+    ) -> str:
+        """Generate a reply; ``deadline`` is a ``time.time()`` after which nobody wants the answer.
+
+        ``priority`` is a LLM_PRIORITIES class. Raises LlmOverloaded when the
+        scheduler turns the request away.
+        """
+        if not cls._loaded:
+            raise RuntimeError("LlmEngine not loaded")
+        if cls._remote is not None:
+            return await cls._remote.generate(messages, max_new_tokens, grammar, deadline, priority)
+        if cls._state is None:
             raise RuntimeError("LlmEngine not loaded")
-        return await asyncio.to_thread(cls._generate_blocking, messages, max_new_tokens)
+        if cls._batcher is None:
+            cls._batcher = LlmBatcher(
+                max_batch_size=int(os.environ.get("LLM_BATCH_MAX_SIZE", "8")),
+                max_wait_ms=float(os.environ.get("LLM_BATCH_MAX_WAIT_MS", "25")),
+                max_queue_depth=int(os.environ.get("LLM_QUEUE_MAX_DEPTH", "64")),
+            )
+        return await cls._batcher.submit(messages, max_new_tokens, grammar, deadline, priority)
+
+    @classmethod
+    async def backlog(cls) -> int:
+        """Generations queued and not yet running, here or in the inference worker."""
+        if cls._remote is not None:
+            return await cls._remote.backlog()
+        return cls._batcher.backlog if cls._batcher is not None else 0
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        if cls._load_task is not None:
+            cls._load_task.cancel()
+            try:
+                await cls._load_task
+            except asyncio.CancelledError:
+                pass
+            cls._load_task = None
+        if cls._batcher is not None:
+            await cls._batcher.stop()
+            cls._batcher = None
+        if cls._remote is not None:
+            await cls._remote.close()
+            cls._remote = None
+
+
+class LlmOverloaded(RuntimeError):
+    """LlmBatcher turned a request away; the caller serves its fallback instead."""
+
+
+class _PendingGeneration:
+    __slots__ = (
+        "messages", "max_new_tokens", "grammar", "deadline", "future", "enqueued_at", "control",
+        "priority", "rank",
+    )
+
+    def __init__(
+        self,
+        messages: list,
+        max_new_tokens: int,
+        grammar: Optional[Grammar],
+        deadline: Optional[float],
+        future: asyncio.Future,
+        priority: str = "callout",
+        sequence: int = 0,
+    ):
+        self.messages = messages
+        self.max_new_tokens = max_new_tokens
+        self.grammar = grammar
+        self.deadline = deadline
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+        # Cancelling the caller cancels the future; pass that on to the model thread
+        self.control = GenerationControl(deadline)
+        future.add_done_callback(self._on_done)
+        self.priority = priority
+        # Priority class first, then earliest deadline; arrival order breaks ties
+        self.rank = (
+            LLM_PRIORITIES.get(priority, LLM_LOWEST_PRIORITY),
+            deadline if deadline is not None else float("inf"),
+            sequence,
+        )
+
+    def __lt__(self, other: "_PendingGeneration") -> bool:
+        return self.rank < other.rank
+
+    def _on_done(self, future: asyncio.Future) -> None:
+        if future.cancelled():
+            self.control.cancel()
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def batches_with(self, other: "_PendingGeneration") -> bool:
+        return self.max_new_tokens == other.max_new_tokens and self.grammar is other.grammar
+
+
+class LlmBatcher:
+    """Priority scheduler and micro-batching queue in front of LlmEngine.
+
+    Queued requests are ordered by priority class (LLM_PRIORITIES), then
+    earliest deadline first. The most urgent request opens a batch, and
+    compatible requests queued within ``max_wait_ms`` join it, up to
+    ``max_batch_size`` rows. Only requests with the same ``max_new_tokens``
+    and decoding grammar share a batch, so a 30-token callout never waits on
+    an 80-token muscle-info generation; the others stay queued in order, and
+    a more urgent arrival that cannot join closes the window early. One
+    batch runs at a time, which keeps the model weights owned by a single
+    worker thread.
+
+    Admission control keeps at most ``max_queue_depth`` requests queued. A
+    request is turned away with LlmOverloaded when recent batch times say it
+    would finish after its deadline, or when the queue is full and it ranks
+    below everything in it; if it outranks the lowest queued request, that
+    one is evicted instead. Rejected callers fall back at once rather than
+    timing out in the queue, so a burst of break tips cannot push callouts
+    past their budget.
+
+    Every row carries its request's GenerationControl into the model thread,
+    so a caller that times out or is cancelled frees its row at the next
+    decode step instead of when ``max_new_tokens`` runs out.
+    """
+
+    def __init__(self, max_batch_size: int = 8, max_wait_ms: float = 25.0, max_queue_depth: int = 64):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue_depth = max(1, max_queue_depth)
+        self._queue: List[_PendingGeneration] = []  # heap ordered by rank
+        self._arrived: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._sequence = itertools.count()
+        self._running = False
+        # Smoothed wall time of one generate call, for the deadline admission check
+        self._batch_seconds: Optional[float] = None
+
+    async def submit(
+        self,
+        messages: list,
+        max_new_tokens: int,
+        grammar: Optional[Grammar] = None,
+        deadline: Optional[float] = None,
+        priority: str = "callout",
+    ) -> str:
+        if self._worker is None or self._worker.done():
+            self._arrived = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        pending = _PendingGeneration(
+            messages, max_new_tokens, grammar, deadline, future, priority, next(self._sequence)
+        )
+        self._admit(pending)
+        # If the caller is cancelled (e.g. wait_for timeout) the future is cancelled
+        # too and the worker drops it before the next batch is built.
+        return await future
+
+    @property
+    def backlog(self) -> int:
+        """Requests queued but not yet handed to the model."""
+        return len(self._queue)
+
+    def _admit(self, pending: _PendingGeneration) -> None:
+        """Queue ``pending`` or raise LlmOverloaded; may evict a lower-ranked request."""
+        if pending.deadline is not None and self._batch_seconds is not None:
+            ahead = sum(1 for queued in self._queue if queued.rank < pending.rank)
+            # Batches that finish before this one does, counting the one in flight
+            batches = ahead // self.max_batch_size + 1 + (1 if self._running else 0)
+            if time.time() + batches * self._batch_seconds > pending.deadline:
+                LLM_ADMISSION_REJECTIONS.labels(pending.priority, "deadline").inc()
+                raise LlmOverloaded("cannot finish before the deadline")
+
+        if len(self._queue) >= self.max_queue_depth:
+            self._drop_abandoned()
+        if len(self._queue) >= self.max_queue_depth:
+            lowest = max(self._queue, key=lambda queued: queued.rank)
+            if lowest.rank < pending.rank:
+                LLM_ADMISSION_REJECTIONS.labels(pending.priority, "queue_full").inc()
+                raise LlmOverloaded("generation queue is full")
+            self._queue.remove(lowest)
+            heapq.heapify(self._queue)
+            LLM_ADMISSION_REJECTIONS.labels(lowest.priority, "evicted").inc()
+            lowest.future.set_exception(LlmOverloaded("evicted by a more urgent request"))
+
+        heapq.heappush(self._queue, pending)
+        self._arrived.set()
+
+    @staticmethod
+    def _abandoned(pending: _PendingGeneration) -> bool:
+        """True, and counted, if nobody is waiting for ``pending`` any more."""
+        if pending.future.cancelled():
+            LLM_GENERATIONS_ABORTED.labels("queued", "cancelled").inc()
+            return True
+        if pending.future.done():
+            return True
+        if pending.expired():
+            LLM_GENERATIONS_ABORTED.labels("queued", "deadline").inc()
+            pending.future.set_exception(asyncio.TimeoutError("deadline passed while queued"))
+            return True
+        return False
+
+    def _drop_abandoned(self) -> None:
+        self._queue = [pending for pending in self._queue if not self._abandoned(pending)]
+        heapq.heapify(self._queue)
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for pending in self._queue:
+            if not pending.future.done():
+                pending.future.cancel()
+        self._queue.clear()
+
+    async def _collect_batch(self) -> List[_PendingGeneration]:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._drop_abandoned()
+            if self._queue:
+                break
+            self._arrived.clear()
+            await self._arrived.wait()
+
+        first = heapq.heappop(self._queue)
+        deadline = loop.time() + self.max_wait
+        while True:
+            compatible = [pending for pending in self._queue if pending.batches_with(first)]
+            if len(compatible) + 1 >= self.max_batch_size:
+                break
+            # Something more urgent is waiting that cannot ride along; run now and take it next
+            if self._queue and self._queue[0] < first and not self._queue[0].batches_with(first):
+                break
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+
+        joining = sorted(compatible)[:self.max_batch_size - 1]
+        if joining:
+            taken = set(map(id, joining))
+            self._queue = [pending for pending in self._queue if id(pending) not in taken]
+            heapq.heapify(self._queue)
+        return [pending for pending in (first, *joining) if not self._abandoned(pending)]
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect_batch()
+            if not batch:
+                continue
+            started = time.perf_counter()
+            for pending in batch:
+                LLM_QUEUE_WAIT_SECONDS.observe(started - pending.enqueued_at)
+            self._running = True
+            try:
+                results = await asyncio.to_thread(
+                    LlmEngine._generate_batch_blocking,
+                    [p.messages for p in batch],
+                    batch[0].max_new_tokens,
+                    batch[0].grammar,
+                    [p.control for p in batch],
+                )
+            except asyncio.CancelledError:
+                # stop(): nobody will collect these, so let the model thread drop them too
+                for pending in batch:
+                    pending.future.cancel()
+                raise
+            except Exception as e:
+                logger.exception(f"LlmBatcher: batch of {len(batch)} failed")
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                continue
+            finally:
+                self._running = False
+            elapsed = time.perf_counter() - started
+            self._batch_seconds = elapsed if self._batch_seconds is None else 0.8 * self._batch_seconds + 0.2 * elapsed
+            for pending, result in zip(batch, results):
+                if pending.future.done():
+                    continue
+                if result is None:
+                    pending.future.set_exception(asyncio.TimeoutError("deadline passed while generating"))
+                else:
+                    pending.future.set_result(result)
+
+
+class InferenceClient:
+    """Client for the out-of-process inference worker (see inference_worker.py).
+
+    Speaks newline-delimited JSON over a Unix socket. Every request carries an
+    id and an absolute deadline, and responses may arrive out of order, so many
+    concurrent generations share one connection. A cancelled request sends a
+    ``cancel`` for its id so the worker stops generating it. A dropped connection fails
+    the in-flight requests (callers fall back) and is re-opened on next use.
+    """
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._connect_lock = asyncio.Lock()
+
+    async def _ensure_connected(self) -> None:
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path, limit=2 ** 20)
+            self._reader_task = asyncio.create_task(self._read_responses())
+
+    async def _read_responses(self) -> None:
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self._pending.pop(response.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if response.get("overloaded"):
+                    future.set_exception(LlmOverloaded(f"Inference worker: {response['error']}"))
+                elif "error" in response:
+                    future.set_exception(RuntimeError(f"Inference worker: {response['error']}"))
+                else:
+                    future.set_result(response)
+        except Exception:
+            logger.exception("InferenceClient: reader failed")
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+            self._writer = None
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Inference worker connection lost"))
+
+    async def request(self, payload: dict) -> dict:
+        await self._ensure_connected()
+        request_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            self._writer.write(json.dumps({"id": request_id, **payload}).encode() + b"\n")
+            await self._writer.drain()
+            return await future
+        except asyncio.CancelledError:
+            # The caller gave up; let the worker stop decoding for it
+            if self._writer is not None and not self._writer.is_closing():
+                self._writer.write(json.dumps({"id": request_id, "op": "cancel"}).encode() + b"\n")
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def wait_ready(
+        self,
+        progress: Optional[Callable[[str], None]] = None,
+        initial_delay: float = 0.5,
+        max_delay: float = 30.0,
+        poll_interval: float = 2.0,
+    ) -> None:
+        """Block until the worker answers a ping with ready; cancel the caller to stop waiting.
+
+        Never gives up: the worker may still be starting, loading its model or
+        restarting. While it is unreachable, retries back off from
+        ``initial_delay`` to ``max_delay``; once it answers, it is polled every
+        ``poll_interval`` until its model is loaded. ``progress`` is told why
+        each attempt did not succeed.
+        """
+        delay, attempt = initial_delay, 0
+        while True:
+            attempt += 1
+            try:
+                response = await self.request({"op": "ping"})
+                if response.get("ready"):
+                    return
+                note, wait, delay = "worker is loading its model", poll_interval, initial_delay
+            except (OSError, ConnectionError) as e:
+                note, wait, delay = f"worker unreachable ({e})", delay, min(max_delay, delay * 2)
+            if progress is not None:
+                progress(f"{note}; attempt {attempt}, retrying in {wait:g}s")
+            await asyncio.sleep(wait)
+
+    async def backlog(self) -> int:
+        """Requests queued in the worker's LlmBatcher, as reported by ping."""
+        response = await self.request({"op": "ping"})
+        return int(response.get("backlog", 0))
+
+    async def generate(
+        self,
+        messages: list,
+        max_new_tokens: int,
+        grammar: Optional[Grammar],
+        deadline: Optional[float],
+        priority: str = "callout",
+    ) -> str:
+        response = await self.request({
+            "op": "generate",
+            "messages": messages,
+            "max_new_tokens": max_new_tokens,
+            "grammar": grammar.name if grammar is not None else None,
+            "deadline": deadline,
+            "priority": priority,
+        })
+        return response["text"]
+
+    async def close(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
 
 
 def _build_callout_messages(complexity: float, intensity: float, round_num: int, previous_move: str) -> list:
@@ -315,55 +1461,823 @@ def _build_callout_messages(complexity: float, intensity: float, round_num: int,
     ]
 
 
-def _estimate_duration(command: str) -> int:
-    tokens = [t.strip() for t in re.split(r'[,\-\s]+', command) if t.strip()]
-    return len(tokens) * 1200 + 800
-
-
-def _validate_callout(raw: str) -> Optional[str]:
-    """Return cleaned callout if valid, else None."""
+def _validate_callout(raw: str) -> Optional[ParsedCallout]:
+    """Return the parsed callout if the output holds a valid one, else None."""
     cleaned = raw.strip().strip('"\'').strip()
 
     # Strip common LLM preamble phrases
+    lowered = cleaned.lower()
     for prefix in ("here's", "here is", "call out", "combo:", "move:", "i say", "say", "call"):
-        if cleaned.lower().startswith(prefix):
+        if lowered.startswith(prefix):
             cleaned = cleaned[len(prefix):].strip(' :-')
+            lowered = cleaned.lower()
 
-    # Full match: only digits, Defense, commas, hyphens, spaces
-    if re.fullmatch(r'[\d,\-\s]*(Defense[\s,\-]*[\d,\-\s]*)*', cleaned, re.IGNORECASE):
-        result = cleaned.strip()
-        return result if result else None
-
-    # Partial match: find the first valid combo anywhere in the output
-    match = re.search(
-        r'\b(?:Defense[\s,\-]*)?[1-4](?:[\s,\-]+[1-4])*(?:[\s,\-]+Defense)?',
-        cleaned,
-        re.IGNORECASE,
-    )
-    if match:
-        return match.group(0).strip(' ,\-')
+    # The whole output is a callout: only numbered punches, Defense and separators
+    callout = parse_callout(cleaned.strip())
+    if callout.is_numeric:
+        return callout
 
-    # Last resort: if the first token is a single digit, use it
-    first = cleaned.split()[0] if cleaned.split() else ''
-    if first in ('1', '2', '3', '4'):
-        return first
+    # Otherwise take the first valid combo anywhere in the output
+    combo = callout.first_combo()
+    if combo is not None:
+        return combo
 
+    LLM_CALLOUT_VALIDATION_FAILURES.inc()
     return None
 
 
+# ---------------------------------------------------------------------------
+# CalloutPool (background pre-generated LLM callouts)
+# ---------------------------------------------------------------------------
+
+CalloutBucket = Tuple[int, int]
+
+# Representative (complexity, intensity) per bucket — the callout prompt only
+# distinguishes three combo lengths and Defense/no-Defense.
+_BUCKET_COMPLEXITY = (0.0, 0.4, 0.8)
+_BUCKET_INTENSITY = (0.0, 1.0)
+
+
+def _callout_bucket(complexity: float, intensity: float) -> CalloutBucket:
+    """Map a request onto the prompt class _build_callout_messages would produce."""
+    if complexity < 0.2:
+        complexity_bucket = 0
+    elif complexity < 0.6:
+        complexity_bucket = 1
+    else:
+        complexity_bucket = 2
+    return complexity_bucket, 1 if intensity > 0.5 else 0
+
+
+class CalloutPool:
+    """Bounded pool of validated LLM callouts per (complexity, intensity) bucket.
+
+    ``pop`` is O(1) and never touches the model. When a bucket drops below the
+    low watermark the background worker refills it up to the high watermark,
+    but only while no foreground LLM requests are waiting in the batcher.
+    """
+
+    def __init__(self, low_watermark: int = 4, high_watermark: int = 16):
+        self.low_watermark = max(0, low_watermark)
+        self.high_watermark = max(self.low_watermark, high_watermark)
+        self._buckets: Dict[CalloutBucket, Deque[ParsedCallout]] = {
+            (c, i): deque(maxlen=max(1, self.high_watermark))
+            for c in range(len(_BUCKET_COMPLEXITY))
+            for i in range(len(_BUCKET_INTENSITY))
+        }
+        self._round_hint: Dict[CalloutBucket, int] = {}
+        self.hits: Dict[CalloutBucket, int] = {b: 0 for b in self._buckets}
+        self.misses: Dict[CalloutBucket, int] = {b: 0 for b in self._buckets}
+        self._refill_needed = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.high_watermark > 0
+
+    def pop(self, complexity: float, intensity: float, round_num: int, previous_move: str = "") -> Optional[ParsedCallout]:
+        bucket = _callout_bucket(complexity, intensity)
+        pool = self._buckets[bucket]
+        self._round_hint[bucket] = round_num
+        command = None
+        # Keep the no-repeat rule; the head entry almost always qualifies
+        for index, candidate in enumerate(pool):
+            if candidate.source != previous_move:
+                command = candidate
+                del pool[index]
+                break
+        if command is None:
+            self.misses[bucket] += 1
+            CALLOUT_POOL_REQUESTS.labels("miss").inc()
+        else:
+            self.hits[bucket] += 1
+            CALLOUT_POOL_REQUESTS.labels("hit").inc()
+        if len(pool) < self.low_watermark:
+            self._refill_needed.set()
+        return command
+
+    def stats(self) -> dict:
+        return {
+            f"c{c}-i{i}": {
+                "size": len(pool),
+                "hits": self.hits[(c, i)],
+                "misses": self.misses[(c, i)],
+            }
+            for (c, i), pool in self._buckets.items()
+        }
+
+    def clear(self) -> None:
+        for pool in self._buckets.values():
+            pool.clear()
+
+    def start(self) -> None:
+        if self.enabled and (self._worker is None or self._worker.done()):
+            self._refill_needed.set()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def _wait_for_idle(self) -> None:
+        # In worker mode this asks the sidecar, so live requests from any API process come first
+        while await LlmEngine.backlog() > 0:
+            await asyncio.sleep(0.05)
+
+    async def _refill_bucket(self, bucket: CalloutBucket) -> None:
+        pool = self._buckets[bucket]
+        complexity_bucket, intensity_bucket = bucket
+        batch_size = int(os.environ.get("LLM_BATCH_MAX_SIZE", "8"))
+        while len(pool) < self.high_watermark:
+            await self._wait_for_idle()
+            messages = _build_callout_messages(
+                _BUCKET_COMPLEXITY[complexity_bucket],
+                _BUCKET_INTENSITY[intensity_bucket],
+                self._round_hint.get(bucket, 1),
+                "",
+            )
+            count = min(batch_size, self.high_watermark - len(pool))
+            results = await asyncio.gather(
+                *(
+                    LlmEngine.generate(messages, max_new_tokens=30, grammar=CALLOUT_GRAMMARS[bucket], priority="pool")
+                    for _ in range(count)
+                ),
+                return_exceptions=True,
+            )
+            valid = [c for c in (_validate_callout(r) for r in results if isinstance(r, str)) if c]
+            pool.extend(valid)
+            if not valid:
+                # Nothing usable this pass; let the next refill signal retry
+                return
+
+    async def _run(self) -> None:
+        while True:
+            await self._refill_needed.wait()
+            self._refill_needed.clear()
+            for bucket, pool in self._buckets.items():
+                if len(pool) < self.low_watermark or not pool:
+                    try:
+                        await self._refill_bucket(bucket)
+                    except Exception:
+                        logger.exception(f"CalloutPool: refill of bucket {bucket} failed")
+
+
+callout_pool = CalloutPool(
+    low_watermark=int(os.environ.get("CALLOUT_POOL_LOW_WATERMARK", "4")),
+    high_watermark=int(os.environ.get("CALLOUT_POOL_HIGH_WATERMARK", "16")),
+)
+
+# ---------------------------------------------------------------------------
+# MuscleInfoCache (in-process LRU in front of Mongo)
+# ---------------------------------------------------------------------------
+
+class MuscleInfoCache:
+    """Two-tier cache for LLM muscle-info answers.
+
+    Tier one is an in-process LRU with TTL; tier two is the ``muscle_info_cache``
+    collection, so warm entries survive restarts and are shared between workers.
+    Entries are keyed on ``ParsedCallout.key`` and the model id, so swapping
+    ``TINYLLAMA_MODEL`` never serves answers from a previous model. Only
+    generations whose JSON parsed are ever stored.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl_seconds: float = 7 * 24 * 3600):
+        self.ttl_seconds = ttl_seconds
+        self._memory: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl_seconds)
+
+    async def get(self, callout: ParsedCallout) -> Optional[MuscleInfoResponse]:
+        # ParsedCallout.key: '1-2', '1, 2' and ' 1 2 ' share one entry
+        model = _llm_model_id()
+        key = callout.key
+        cached = self._memory.get((model, key))
+        if cached is None:
+            try:
+                doc = await db.muscle_info_cache.find_one({"key": key, "model": model}, {"_id": 0})
+            except Exception:
+                logger.exception("Muscle info cache lookup failed")
+                return None
+            if not doc:
+                return None
+            created_at = doc["created_at"]
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            if datetime.now(timezone.utc) - created_at > timedelta(seconds=self.ttl_seconds):
+                return None
+            cached = (doc["primary_muscles"], doc["secondary_muscles"], doc["description"])
+            self._memory[(model, key)] = cached
+        primary, secondary, description = cached
+        return MuscleInfoResponse(
+            move=callout.source,
+            primary_muscles=list(primary),
+            secondary_muscles=list(secondary),
+            description=description,
+        )
+
+    async def put(self, callout: ParsedCallout, info: MuscleInfoResponse) -> None:
+        model = _llm_model_id()
+        key = callout.key
+        self._memory[(model, key)] = (
+            tuple(info.primary_muscles), tuple(info.secondary_muscles), info.description,
+        )
+        try:
+            await db.muscle_info_cache.update_one(
+                {"key": key, "model": model},
+                {"$set": {
+                    "key": key,
+                    "model": model,
+                    "primary_muscles": info.primary_muscles,
+                    "secondary_muscles": info.secondary_muscles,
+                    "description": info.description,
+                    "created_at": datetime.now(timezone.utc),
+                }},
+                upsert=True,
+            )
+        except Exception:
+            logger.exception("Muscle info cache write failed")
+
+
+muscle_info_cache = MuscleInfoCache(
+    maxsize=int(os.environ.get("MUSCLE_INFO_CACHE_SIZE", "256")),
+    ttl_seconds=float(os.environ.get("MUSCLE_INFO_CACHE_TTL_S", str(7 * 24 * 3600))),
+)
+
+# ---------------------------------------------------------------------------
+# Workout progress ingestion (write-behind buffer)
+# ---------------------------------------------------------------------------
+
+class ProgressBuffer:
+    """In-process write-behind buffer for workout progress events.
+
+    Posts only append to memory. A background task flushes when
+    ``max_batch_events`` are pending or every ``flush_interval_s``, whichever
+    comes first, so a whole workout of punches costs a handful of bulk writes.
+
+    Events land in ``workout_progress`` as time-series buckets: one document
+    per (session, round), holding at most ``bucket_max_events`` events, plus
+    count and first/last timestamps. A full bucket spills into another
+    document for the same round. ``round_complete`` events also roll up into
+    the session document (``rounds_completed``, ``complexity_progression``,
+    ``intensity_progression``) in the same flush.
+
+    A failed flush puts its events back in the buffer for the next attempt;
+    when only some bucket writes fail, only their events go back, because the
+    applied ones would be pushed again. Once ``max_pending_events`` is exceeded the oldest events are dropped and
+    counted. ``stop`` drains whatever is still buffered.
+    """
+
+    def __init__(
+        self,
+        max_batch_events: int = 500,
+        flush_interval_s: float = 2.0,
+        bucket_max_events: int = 200,
+        max_pending_events: int = 50_000,
+    ):
+        self.max_batch_events = max(1, max_batch_events)
+        self.flush_interval_s = max(0.01, flush_interval_s)
+        self.bucket_max_events = max(1, bucket_max_events)
+        self.max_pending_events = max(self.max_batch_events, max_pending_events)
+        self._pending: Dict[str, List[ProgressEvent]] = {}
+        self._pending_count = 0
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._worker: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.written = 0
+        self.dropped = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending_count
+
+    def add(self, session_id: str, events: List[ProgressEvent]) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        self._pending.setdefault(session_id, []).extend(events)
+        self._pending_count += len(events)
+        PROGRESS_EVENTS.labels("buffered").inc(len(events))
+        self._enforce_limit()
+        if self._pending_count >= self.max_batch_events:
+            self._flush_requested.set()
+
+    def _enforce_limit(self) -> None:
+        while self._pending_count > self.max_pending_events:
+            # Drop from the session holding the most buffered events
+            session_id = max(self._pending, key=lambda sid: len(self._pending[sid]))
+            events = self._pending[session_id]
+            excess = min(len(events), self._pending_count - self.max_pending_events)
+            del events[:excess]
+            if not events:
+                del self._pending[session_id]
+            self._pending_count -= excess
+            self.dropped += excess
+            PROGRESS_EVENTS.labels("dropped").inc(excess)
+            logger.warning(f"ProgressBuffer: dropped {excess} events for session {session_id} (buffer full)")
+
+    def _bucket_updates(self, session_id: str, events: List[ProgressEvent]) -> List[Tuple[UpdateOne, List[ProgressEvent]]]:
+        """One upsert per chunk of a round, paired with the events it writes."""
+        by_round: Dict[int, List[ProgressEvent]] = {}
+        for event in sorted(events, key=lambda e: e.timestamp):
+            by_round.setdefault(event.round_number, []).append(event)
+        updates = []
+        # Chunks never exceed a quarter bucket, so a bucket overshoots its cap by less than that
+        chunk_size = max(1, self.bucket_max_events // 4)
+        for round_number, round_events in by_round.items():
+            for start in range(0, len(round_events), chunk_size):
+                chunk_events = round_events[start:start + chunk_size]
+                chunk = [event.dict(exclude={"round_number"}) for event in chunk_events]
+                updates.append((UpdateOne(
+                    {"session_id": session_id, "round_number": round_number,
+                     "count": {"$lt": self.bucket_max_events}},
+                    {
+                        "$push": {"events": {"$each": chunk}},
+                        "$inc": {"count": len(chunk)},
+                        "$min": {"first_ts": chunk[0]["timestamp"]},
+                        "$max": {"last_ts": chunk[-1]["timestamp"]},
+                        "$setOnInsert": {"id": str(uuid.uuid4())},
+                    },
+                    upsert=True,
+                ), chunk_events))
+        return updates
+
+    @staticmethod
+    def _session_update(session_id: str, events: List[ProgressEvent]) -> Optional[UpdateOne]:
+        completed = sorted((e for e in events if e.type == "round_complete"), key=lambda e: e.timestamp)
+        if not completed:
+            return None
+        return UpdateOne(
+            {"id": session_id},
+            {
+                "$max": {"rounds_completed": max(e.round_number for e in completed)},
+                "$push": {
+                    "complexity_progression": {"$each": [e.complexity for e in completed]},
+                    "intensity_progression": {"$each": [e.intensity for e in completed]},
+                },
+            },
+        )
+
+    async def flush(self) -> int:
+        """Write everything buffered so far; returns the number of events written."""
+        async with self._flush_lock:
+            if not self._pending_count:
+                return 0
+            batch, self._pending = self._pending, {}
+            count, self._pending_count = self._pending_count, 0
+
+            bucket_ops: List[UpdateOne] = []
+            op_events: List[Tuple[str, List[ProgressEvent]]] = []
+            for session_id, events in batch.items():
+                for op, chunk_events in self._bucket_updates(session_id, events):
+                    bucket_ops.append(op)
+                    op_events.append((session_id, chunk_events))
+
+            started = time.perf_counter()
+            failed: List[int] = []
+            try:
+                await db.workout_progress.bulk_write(bucket_ops, ordered=False)
+            except BulkWriteError as exc:
+                # Unordered: every op not listed in writeErrors was applied, and
+                # $push/$inc must not run twice, so only the failed ones go back
+                failed = sorted({error["index"] for error in exc.details.get("writeErrors", [])})
+                logger.error(f"ProgressBuffer: {len(failed)} of {len(bucket_ops)} bucket writes failed, requeueing them")
+            except Exception:
+                logger.exception(f"ProgressBuffer: flush of {count} events failed, requeueing")
+                failed = list(range(len(bucket_ops)))
+            if failed:
+                requeued: Dict[str, List[ProgressEvent]] = {}
+                for index in failed:
+                    session_id, chunk_events = op_events[index]
+                    requeued.setdefault(session_id, []).extend(chunk_events)
+                for session_id, events in requeued.items():
+                    self._pending.setdefault(session_id, [])[:0] = events
+                    self._pending_count += len(events)
+                    count -= len(events)
+                self._enforce_limit()
+                failed_ops = set(failed)
+                op_events = [pair for index, pair in enumerate(op_events) if index not in failed_ops]
+
+            # Roll up only what was stored; requeued events roll up when they are
+            written: Dict[str, List[ProgressEvent]] = {}
+            for session_id, chunk_events in op_events:
+                written.setdefault(session_id, []).extend(chunk_events)
+            session_ops = [
+                op for op in (self._session_update(session_id, events) for session_id, events in written.items())
+                if op is not None
+            ]
+            if session_ops:
+                try:
+                    await db.workout_sessions.bulk_write(session_ops, ordered=False)
+                except Exception:
+                    # The events themselves are stored; only the session roll-up is lost
+                    logger.exception("ProgressBuffer: session roll-up failed")
+            if not count:
+                return 0
+
+            PROGRESS_FLUSH_SECONDS.observe(time.perf_counter() - started)
+            PROGRESS_FLUSH_EVENTS.observe(count)
+            PROGRESS_EVENTS.labels("written").inc(count)
+            self.flushes += 1
+            self.written += count
+            return count
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._pending_count,
+            "sessions": len(self._pending),
+            "flushes": self.flushes,
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("ProgressBuffer: flush failed")
+
+
+progress_buffer = ProgressBuffer(
+    max_batch_events=int(os.environ.get("PROGRESS_FLUSH_MAX_EVENTS", "500")),
+    flush_interval_s=float(os.environ.get("PROGRESS_FLUSH_INTERVAL_S", "2.0")),
+    bucket_max_events=int(os.environ.get("PROGRESS_BUCKET_MAX_EVENTS", "200")),
+    max_pending_events=int(os.environ.get("PROGRESS_MAX_PENDING_EVENTS", "50000")),
+)
+
+# ---------------------------------------------------------------------------
+# Audit log sink
+# ---------------------------------------------------------------------------
+
+class AuditLogSink:
+    """Fire-and-forget writer for audit-style documents (e.g. ``tts_requests``).
+
+    ``log`` only enqueues and never awaits, so request handlers do not pay a
+    MongoDB round trip for rows nobody reads on the hot path. A background task
+    drains the queue in batches of up to ``max_batch`` documents, flushing at
+    least every ``flush_interval_s``, and writes each collection's share with
+    one unordered ``insert_many``. Target collections are expected to be
+    bounded by a TTL index (see INDEX_SPECS) or to be capped.
+
+    Logging is best effort: when the queue holds ``max_queue`` documents new
+    ones are dropped and counted, and a failed batch is logged and counted
+    rather than retried. ``stop`` lets the worker finish the batch it holds,
+    including a write already in flight, then drains what is still queued.
+    """
+
+    # Queued by stop(): the worker writes what it has collected and exits
+    _STOP = object()
+
+    def __init__(self, max_queue: int = 10_000, max_batch: int = 500, flush_interval_s: float = 1.0):
+        self.max_batch = max(1, max_batch)
+        self.flush_interval_s = max(0.01, flush_interval_s)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_queue))
+        self._worker: Optional[asyncio.Task] = None
+        # Documents taken off the queue by _run but not yet written
+        self._collecting: Dict[str, List[dict]] = {}
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() + sum(len(docs) for docs in self._collecting.values())
+
+    def log(self, collection: str, document: dict) -> bool:
+        """Queue ``document`` for ``collection``; False if it was dropped."""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        try:
+            self._queue.put_nowait((collection, document))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            AUDIT_LOG_DOCUMENTS.labels(collection, "dropped").inc()
+            return False
+        AUDIT_LOG_DOCUMENTS.labels(collection, "queued").inc()
+        return True
+
+    def _take_batch(self) -> Dict[str, List[dict]]:
+        batch: Dict[str, List[dict]] = {}
+        for _ in range(min(self.max_batch, self._queue.qsize())):
+            item = self._queue.get_nowait()
+            if item is self._STOP:
+                continue
+            collection, document = item
+            batch.setdefault(collection, []).append(document)
+        return batch
+
+    async def _write(self, batch: Dict[str, List[dict]]) -> None:
+        for collection, documents in batch.items():
+            try:
+                await db[collection].insert_many(documents, ordered=False)
+            except Exception:
+                self.failed += len(documents)
+                AUDIT_LOG_DOCUMENTS.labels(collection, "failed").inc(len(documents))
+                logger.exception(f"AuditLogSink: insert of {len(documents)} {collection} documents failed")
+                continue
+            self.written += len(documents)
+            AUDIT_LOG_DOCUMENTS.labels(collection, "written").inc(len(documents))
+
+    async def flush(self) -> None:
+        """Write everything queued so far."""
+        while not self._queue.empty():
+            await self._write(self._take_batch())
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    async def stop(self) -> None:
+        if self._worker is not None and not self._worker.done():
+            # Not cancel(): that would drop a batch whose insert_many is in flight
+            await self._queue.put(self._STOP)
+            await self._worker
+        self._worker = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            # Block for a first document, then let the batch fill for up to flush_interval_s
+            item = await self._queue.get()
+            if item is self._STOP:
+                return
+            collection, document = item
+            self._collecting = {collection: [document]}
+            size = 1
+            batch_deadline = loop.time() + self.flush_interval_s
+            while size < self.max_batch:
+                remaining = batch_deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                collection, document = item
+                self._collecting.setdefault(collection, []).append(document)
+                size += 1
+            try:
+                await self._write(self._collecting)
+            except Exception:
+                logger.exception("AuditLogSink: flush failed")
+            finally:
+                self._collecting = {}
+
+
+audit_log = AuditLogSink(
+    max_queue=int(os.environ.get("AUDIT_LOG_MAX_QUEUE", "10000")),
+    max_batch=int(os.environ.get("AUDIT_LOG_BATCH_SIZE", "500")),
+    flush_interval_s=float(os.environ.get("AUDIT_LOG_FLUSH_INTERVAL_S", "1.0")),
+)
+
+# ---------------------------------------------------------------------------
+# Index management
+# ---------------------------------------------------------------------------
+
+class IndexSpec:
+    """One index the application relies on, declared next to the others in INDEX_SPECS."""
+
+    __slots__ = ("collection", "keys", "name", "unique", "expire_after_seconds")
+
+    def __init__(
+        self,
+        collection: str,
+        keys: List[Tuple[str, int]],
+        name: str,
+        unique: bool = False,
+        expire_after_seconds: Optional[int] = None,
+    ):
+        self.collection = collection
+        self.keys = keys
+        self.name = name
+        self.unique = unique
+        self.expire_after_seconds = expire_after_seconds
+
+    def options(self) -> dict:
+        options = {"name": self.name}
+        if self.unique:
+            options["unique"] = True
+        if self.expire_after_seconds is not None:
+            options["expireAfterSeconds"] = self.expire_after_seconds
+        return options
+
+
+TTS_REQUEST_TTL_S = int(os.environ.get("TTS_REQUEST_TTL_S", str(30 * 24 * 3600)))
+AUDIO_UPLOAD_TTL_S = int(os.environ.get("AUDIO_UPLOAD_TTL_S", str(24 * 3600)))
+
+INDEX_SPECS: List[IndexSpec] = [
+    IndexSpec("workout_sessions", [("id", 1)], "id_unique", unique=True),
+    IndexSpec("workout_sessions", [("user_id", 1), ("start_time", -1)], "user_start_time"),
+    IndexSpec("audio_tracks", [("id", 1)], "id_unique", unique=True),
+    # Keyset pagination order for the track listing, with and without a genre filter
+    IndexSpec("audio_tracks", [("genre", 1), ("created_at", -1), ("id", -1)], "genre_created_at_id"),
+    IndexSpec("audio_tracks", [("created_at", -1), ("id", -1)], "created_at_id"),
+    IndexSpec("audio_tracks", [("sha256", 1)], "sha256"),
+    IndexSpec("audio_uploads", [("id", 1)], "id_unique", unique=True),
+    IndexSpec("audio_uploads", [("updated_at", 1)], "updated_at_ttl", expire_after_seconds=AUDIO_UPLOAD_TTL_S),
+    IndexSpec("audio_upload_chunks", [("upload_id", 1), ("offset", 1)], "upload_offset_unique", unique=True),
+    # Chunks share the session's clock: each append stamps them with the session's updated_at
+    IndexSpec("audio_upload_chunks", [("updated_at", 1)], "updated_at_ttl", expire_after_seconds=AUDIO_UPLOAD_TTL_S),
+    IndexSpec("tts_requests", [("id", 1)], "id_unique", unique=True),
+    IndexSpec("tts_requests", [("created_at", 1)], "created_at_ttl", expire_after_seconds=TTS_REQUEST_TTL_S),
+    IndexSpec("muscle_info_cache", [("key", 1), ("model", 1)], "key_model_unique", unique=True),
+    IndexSpec(
+        "muscle_info_cache", [("created_at", 1)], "created_at_ttl",
+        expire_after_seconds=int(os.environ.get("MUSCLE_INFO_CACHE_TTL_S", str(7 * 24 * 3600))),
+    ),
+    IndexSpec("workout_progress", [("session_id", 1), ("round_number", 1), ("count", 1)], "session_round_count"),
+    IndexSpec("workout_progress", [("session_id", 1), ("first_ts", 1)], "session_first_ts"),
+]
+
+# (collection, name) of indexes earlier versions created and nothing queries any
+# more; IndexManager drops them once the replacements in INDEX_SPECS are built
+RETIRED_INDEXES: List[Tuple[str, str]] = [
+    # Superseded by the keyset pagination indexes, which add the id tiebreak
+    ("audio_tracks", "genre_created_at"),
+    ("audio_tracks", "created_at"),
+]
+
+
+class IndexManager:
+    """Ensures INDEX_SPECS at startup and reports per-index status for /api/health.
+
+    Creating an index that already exists with the same options is a no-op, so
+    this runs on every boot. A TTL index whose ``expireAfterSeconds`` changed is
+    updated in place with ``collMod`` instead of being dropped and rebuilt.
+    Indexes listed in ``retired`` are dropped after every spec has been
+    ensured, so queries keep an index throughout a rollout. A failure (e.g.
+    duplicate ``id`` values blocking a unique index) is recorded and logged
+    without stopping the app or the remaining builds.
+    """
+
+    def __init__(self, specs: List[IndexSpec], retired: List[Tuple[str, str]] = ()):
+        self.specs = specs
+        self.retired = list(retired)
+        self.status: Dict[str, dict] = {
+            f"{spec.collection}.{spec.name}": {"state": "pending"} for spec in specs
+        }
+        self.status.update({f"{collection}.{name}": {"state": "pending"} for collection, name in self.retired})
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.ensure_all())
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def ensure_all(self) -> None:
+        for spec in self.specs:
+            await self._ensure(spec)
+        for collection, name in self.retired:
+            await self._drop(collection, name)
+        failed = [name for name, status in self.status.items() if status["state"] == "failed"]
+        if failed:
+            logger.error(f"IndexManager: {len(failed)} index(es) failed: {', '.join(failed)}")
+        else:
+            logger.info(f"IndexManager: {len(self.specs)} indexes ready, {len(self.retired)} retired")
+
+    async def _ensure(self, spec: IndexSpec) -> None:
+        from pymongo.errors import OperationFailure
+
+        name = f"{spec.collection}.{spec.name}"
+        self.status[name] = {"state": "building"}
+        started = time.perf_counter()
+        try:
+            try:
+                await db[spec.collection].create_index(spec.keys, **spec.options())
+            except OperationFailure as e:
+                # 85 IndexOptionsConflict: same keys/name, different TTL -> adjust in place
+                if e.code != 85 or spec.expire_after_seconds is None:
+                    raise
+                await db.command({
+                    "collMod": spec.collection,
+                    "index": {"name": spec.name, "expireAfterSeconds": spec.expire_after_seconds},
+                })
+        except Exception as e:
+            self.status[name] = {"state": "failed", "error": str(e)}
+            logger.exception(f"IndexManager: could not ensure {name}")
+            return
+        self.status[name] = {"state": "ready", "seconds": round(time.perf_counter() - started, 3)}
+
+    async def _drop(self, collection: str, index_name: str) -> None:
+        name = f"{collection}.{index_name}"
+        try:
+            # Checked first: the error for a missing index differs by server version
+            if index_name in await db[collection].index_information():
+                await db[collection].drop_index(index_name)
+                logger.info(f"IndexManager: dropped retired index {name}")
+        except Exception as e:
+            self.status[name] = {"state": "failed", "error": str(e)}
+            logger.exception(f"IndexManager: could not drop {name}")
+            return
+        self.status[name] = {"state": "dropped"}
+
+    def stats(self) -> dict:
+        states = [status["state"] for status in self.status.values()]
+        if "failed" in states:
+            overall = "degraded"
+        elif all(state in ("ready", "dropped") for state in states):
+            overall = "ready"
+        else:
+            overall = "building"
+        return {"state": overall, "indexes": self.status}
+
+
+index_manager = IndexManager(INDEX_SPECS, RETIRED_INDEXES)
+
 # ---------------------------------------------------------------------------
 # API Routes
 # ---------------------------------------------------------------------------
 
 @api_router.get("/health")
 async def health_check():
-    """Health check including LLM readiness."""
+    """Health check including LLM readiness and load progress."""
     return {
         "status": "ok",
         "llm_ready": LlmEngine._loaded,
         "llm_backend": os.environ.get("LLM_BACKEND", "rule-based"),
+        "llm_worker": os.environ.get("LLM_WORKER_SOCKET"),
+        "llm_load": LlmEngine.status(),
+        "callout_pool": callout_pool.stats(),
+        "progress_buffer": progress_buffer.stats(),
+        "audit_log": audit_log.stats(),
+        "indexes": index_manager.stats(),
+        "tts_cache": tts_cache.stats(),
     }
 
+@api_router.get("/health/live")
+async def liveness_check():
+    """The process is up and the event loop is responsive."""
+    return {"status": "alive"}
+
+@api_router.get("/health/ready")
+async def readiness_check(require_llm: bool = False):
+    """Ready for traffic once MongoDB answers; rule-based engines cover the LLM while it loads.
+
+    Pass ``require_llm=true`` to also wait for the model to be warm.
+    """
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), timeout=2.0)
+        mongo_ok = True
+    except Exception:
+        mongo_ok = False
+    llm_wanted = os.environ.get("LLM_BACKEND", "rule-based") in TINYLLAMA_BACKENDS
+    ready = mongo_ok and (LlmEngine._loaded or not (require_llm and llm_wanted))
+    body = {"ready": ready, "mongo": mongo_ok, "llm_ready": LlmEngine._loaded, "llm_load": LlmEngine.status()}
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
+@api_router.post("/admin/llm/reload", status_code=202)
+async def reload_llm(request: LlmReloadRequest, x_admin_token: Optional[str] = Header(default=None)):
+    """Load ``model`` (or reload the current one) in the background and switch it in once warm."""
+    admin_token = os.environ.get("ADMIN_TOKEN")
+    # compare_digest: how long a mismatch takes must not reveal how much of the token matched
+    if not admin_token or x_admin_token is None or not hmac.compare_digest(
+        x_admin_token.encode("utf-8"), admin_token.encode("utf-8")
+    ):
+        raise HTTPException(status_code=403, detail="Admin token required")
+    if os.environ.get("LLM_WORKER_SOCKET"):
+        raise HTTPException(status_code=409, detail="Model is served by the inference worker; restart it instead")
+    backend = request.backend or os.environ.get("LLM_BACKEND", "rule-based")
+    if backend not in TINYLLAMA_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"backend must be one of {', '.join(TINYLLAMA_BACKENDS)}")
+    if LlmEngine.is_loading():
+        raise HTTPException(status_code=409, detail="A model load is already in progress")
+    LlmEngine.start_loading(request.model or _llm_model_id(), backend)
+    return LlmEngine.status()
+
 @api_router.get("/")
 async def root():
     return {"message": "Brutality Fitness API - Ready to train!"}
@@ -411,15 +2325,82 @@ async def complete_workout(session_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error completing workout: {str(e)}")
 
+@api_router.post("/workout/{session_id}/round-plan", response_model=RoundPlan)
+async def generate_round_plan(session_id: str, request: RoundPlanRequest):
+    """Return the full timed callout sequence for a round in one response"""
+    try:
+        session = await db.workout_sessions.find_one({"id": session_id}, {"_id": 0, "id": 1})
+        if not session:
+            raise HTTPException(status_code=404, detail="Workout session not found")
+        intensity = request.intensity
+        if intensity is None:
+            intensity = min(1.0, 0.1 * request.round_number)
+        callouts = workout_engine.plan_round(
+            request.round_number,
+            request.round_length_ms,
+            intensity,
+            complexity_step=request.complexity_step,
+            complexity_interval_ms=request.complexity_interval_ms,
+            previous_move=request.previous_move,
+            # Same session and round -> same plan, so a plan can be re-fetched or replayed
+            rng=seeded_rng("round-plan", session_id, request.round_number, salt=workout_engine.seed),
+        )
+        return RoundPlan(
+            session_id=session_id,
+            round_number=request.round_number,
+            total_duration_ms=sum(c.duration_ms for c in callouts),
+            callouts=callouts,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating round plan: {str(e)}")
+
+# Sessions recently confirmed to exist, so progress posts skip the lookup
+_known_sessions: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
+
+@api_router.post("/workout/{session_id}/progress", response_model=ProgressAccepted, status_code=202)
+async def post_workout_progress(session_id: str, batch: ProgressBatch):
+    """Buffer progress events; they are bulk-written to workout_progress in the background"""
+    if session_id not in _known_sessions:
+        try:
+            session = await db.workout_sessions.find_one({"id": session_id}, {"_id": 0, "id": 1})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error recording progress: {str(e)}")
+        if not session:
+            raise HTTPException(status_code=404, detail="Workout session not found")
+        _known_sessions[session_id] = True
+    progress_buffer.add(session_id, batch.events)
+    return ProgressAccepted(accepted=len(batch.events), buffered=progress_buffer.pending)
+
+@api_router.get("/workout/{session_id}/progress", response_model=List[ProgressEvent])
+async def get_workout_progress(session_id: str, round_number: Optional[int] = None):
+    """All recorded progress events for a session, oldest first"""
+    try:
+        # Read-your-writes: anything still buffered is written first
+        await progress_buffer.flush()
+        query = {"session_id": session_id}
+        if round_number is not None:
+            query["round_number"] = round_number
+        events = []
+        async for bucket in db.workout_progress.find(query, {"_id": 0}).sort("first_ts", 1):
+            events.extend(ProgressEvent(round_number=bucket["round_number"], **e) for e in bucket["events"])
+        events.sort(key=lambda e: e.timestamp)
+        return events
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching progress: {str(e)}")
+
 @api_router.post("/workout/move-command", response_model=MoveCommand)
 async def generate_move_command(
     complexity: float = 0.0,
     intensity: float = 0.0,
-    round_number: int = 1
+    round_number: int = 1,
+    session_id: Optional[str] = None,
 ):
     """Generate a move command based on workout parameters"""
     try:
-        command = workout_engine.generate_move_command(complexity, intensity, round_number)
+        rng = workout_engine.session_rng(session_id) if session_id else None
+        command = workout_engine.generate_move_command(complexity, intensity, round_number, rng)
         return command
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating move: {str(e)}")
@@ -429,67 +2410,122 @@ async def llm_callout(request: CalloutRequest):
     """Generate a workout callout using the configured LLM backend."""
     backend = os.environ.get("LLM_BACKEND", "rule-based")
 
-    if backend == "tinyllama" and LlmEngine._loaded:
+    if backend in TINYLLAMA_BACKENDS and LlmEngine._loaded:
+        pooled = callout_pool.pop(
+            request.complexity, request.intensity,
+            request.round_number, request.previous_move
+        )
+        if pooled:
+            return CalloutResponse(
+                command=pooled.source,
+                duration_ms=pooled.duration_ms,
+                muscle_groups=[],
+            )
         try:
             messages = _build_callout_messages(
                 request.complexity, request.intensity,
                 request.round_number, request.previous_move
             )
             raw = await asyncio.wait_for(
-                LlmEngine.generate(messages, max_new_tokens=30),
-                timeout=8.0,
+                LlmEngine.generate(
+                    messages,
+                    max_new_tokens=30,
+                    grammar=CALLOUT_GRAMMARS[_callout_bucket(request.complexity, request.intensity)],
+                    deadline=time.time() + CALLOUT_TIMEOUT_S,
+                    priority="callout",
+                ),
+                timeout=CALLOUT_TIMEOUT_S,
             )
-            command = _validate_callout(raw)
-            if command:
+            callout = _validate_callout(raw)
+            if callout:
                 return CalloutResponse(
-                    command=command,
-                    duration_ms=_estimate_duration(command),
+                    command=callout.source,
+                    duration_ms=callout.duration_ms,
                     muscle_groups=[],
                 )
             logger.warning(f"LLM callout failed validation (raw={raw!r}), falling back")
+            LLM_FALLBACKS.labels("callout", "invalid").inc()
+        except LlmOverloaded as e:
+            logger.info(f"LLM callout rejected ({e}), falling back to rule-based")
+            LLM_FALLBACKS.labels("callout", "overloaded").inc()
         except asyncio.TimeoutError:
             logger.warning("LLM callout timed out, falling back to rule-based")
+            LLM_TIMEOUTS.labels("callout").inc()
+            LLM_FALLBACKS.labels("callout", "timeout").inc()
         except Exception as e:
             logger.exception(f"LLM callout error: {e}")
+            LLM_FALLBACKS.labels("callout", "error").inc()
+    elif backend in TINYLLAMA_BACKENDS:
+        LLM_FALLBACKS.labels("callout", "not_loaded").inc()
 
     # Fallback: rule-based
     return workout_engine.generate_callout(
         request.complexity, request.intensity,
-        request.round_number, request.previous_move
+        request.round_number, request.previous_move,
+        rng=workout_engine.session_rng(request.session_id) if request.session_id else None,
     )
 
 @api_router.post("/llm/muscle-info", response_model=MuscleInfoResponse)
 async def llm_muscle_info(request: MuscleInfoRequest):
     """Return anatomical muscle info for a given boxing move."""
     backend = os.environ.get("LLM_BACKEND", "rule-based")
+    callout = parse_callout(request.move)
+
+    if backend in TINYLLAMA_BACKENDS:
+        cached = await muscle_info_cache.get(callout)
+        if cached:
+            return cached
 
-    if backend == "tinyllama" and LlmEngine._loaded:
+    if backend in TINYLLAMA_BACKENDS and LlmEngine._loaded:
         try:
             messages = [
                 {"role": "system", "content": MUSCLE_SYSTEM},
                 {"role": "user", "content": f"Move: {request.move}"},
             ]
             raw = await asyncio.wait_for(
-                LlmEngine.generate(messages, max_new_tokens=80),
-                timeout=10.0,
+                LlmEngine.generate(
+                    messages,
+                    max_new_tokens=80,
+                    grammar=MUSCLE_GRAMMAR,
+                    deadline=time.time() + MUSCLE_INFO_TIMEOUT_S,
+                    priority="muscle_info",
+                ),
+                timeout=MUSCLE_INFO_TIMEOUT_S,
             )
             # Extract JSON from response
             json_match = re.search(r'\{.*\}', raw, re.DOTALL)
-            if json_match:
-                data = json.loads(json_match.group(0))
-                return MuscleInfoResponse(
-                    move=request.move,
-                    primary_muscles=data.get("primary", []),
-                    secondary_muscles=data.get("secondary", []),
-                    description=data.get("description", ""),
-                )
-        except (asyncio.TimeoutError, json.JSONDecodeError, Exception) as e:
+            if not json_match:
+                raise json.JSONDecodeError("no JSON object in output", raw, 0)
+            data = json.loads(json_match.group(0))
+            info = MuscleInfoResponse(
+                move=request.move,
+                primary_muscles=data.get("primary", []),
+                secondary_muscles=data.get("secondary", []),
+                description=data.get("description", ""),
+            )
+            await muscle_info_cache.put(callout, info)
+            return info
+        except LlmOverloaded as e:
+            logger.info(f"Muscle info LLM rejected ({e}), using static fallback")
+            LLM_FALLBACKS.labels("muscle_info", "overloaded").inc()
+        except asyncio.TimeoutError:
+            logger.warning("Muscle info LLM timed out, using static fallback")
+            LLM_TIMEOUTS.labels("muscle_info").inc()
+            LLM_FALLBACKS.labels("muscle_info", "timeout").inc()
+        except json.JSONDecodeError:
+            logger.warning("Muscle info LLM returned unparseable JSON, using static fallback")
+            LLM_JSON_PARSE_FAILURES.inc()
+            LLM_FALLBACKS.labels("muscle_info", "invalid").inc()
+        except Exception as e:
             logger.warning(f"Muscle info LLM error ({type(e).__name__}), using static fallback")
+            LLM_FALLBACKS.labels("muscle_info", "error").inc()
+    elif backend in TINYLLAMA_BACKENDS:
+        LLM_FALLBACKS.labels("muscle_info", "not_loaded").inc()
 
     # Static fallback
-    return _static_muscle_info(request.move)
+    return _static_muscle_info(callout)
 
-def _static_muscle_info(move: str) -> MuscleInfoResponse:
+def _static_muscle_info(callout: ParsedCallout) -> MuscleInfoResponse:
     """Static anatomical data fallback when LLM is unavailable."""
     static = {
         "1": ("Left jab", ["anterior deltoid", "triceps brachii"], ["serratus anterior", "core"], "A fast linear punch engaging the front shoulder and triceps."),
@@ -498,17 +2534,16 @@ def _static_muscle_info(move: str) -> MuscleInfoResponse:
         "4": ("Right uppercut", ["biceps brachii", "deltoid"], ["quadriceps", "glutes"], "An upward punch driven by leg drive and the bicep."),
         "Defense": ("Defensive movement", ["core stabilizers", "glutes"], ["hamstrings", "calves"], "Active footwork and slipping engage the full posterior chain."),
     }
-    # Try to match by digit or keyword
-    for key, (_, primary, secondary, desc) in static.items():
-        if key.lower() in move.lower():
-            return MuscleInfoResponse(
-                move=move,
-                primary_muscles=primary,
-                secondary_muscles=secondary,
-                description=desc,
-            )
+    if callout.key_move is not None:
+        _, primary, secondary, desc = static[callout.key_move]
+        return MuscleInfoResponse(
+            move=callout.source,
+            primary_muscles=primary,
+            secondary_muscles=secondary,
+            description=desc,
+        )
     return MuscleInfoResponse(
-        move=move,
+        move=callout.source,
         primary_muscles=["full body"],
         secondary_muscles=[],
         description="Combination movement engaging multiple muscle groups.",
@@ -534,7 +2569,7 @@ async def llm_break_tip(request: BreakTipRequest):
     """Generate a conversational muscle coaching tip for the rest break."""
     backend = os.environ.get("LLM_BACKEND", "rule-based")
 
-    if backend == "tinyllama" and LlmEngine._loaded:
+    if backend in TINYLLAMA_BACKENDS and LlmEngine._loaded:
         muscles_str = ", ".join(request.primary_muscles) if request.primary_muscles else "multiple muscle groups"
         messages = [
             {"role": "system", "content": BREAK_TIP_SYSTEM},
@@ -546,19 +2581,35 @@ async def llm_break_tip(request: BreakTipRequest):
         ]
         try:
             raw = await asyncio.wait_for(
-                LlmEngine.generate(messages, max_new_tokens=60),
-                timeout=12.0,
+                LlmEngine.generate(
+                    messages,
+                    max_new_tokens=60,
+                    deadline=time.time() + BREAK_TIP_TIMEOUT_S,
+                    priority="break_tip",
+                ),
+                timeout=BREAK_TIP_TIMEOUT_S,
             )
             tip = raw.strip().strip('"\'')
             if tip:
                 return BreakTipResponse(tip=tip)
-        except (asyncio.TimeoutError, Exception) as e:
+            LLM_FALLBACKS.labels("break_tip", "invalid").inc()
+        except LlmOverloaded as e:
+            logger.info(f"Break tip LLM rejected ({e}), using static fallback")
+            LLM_FALLBACKS.labels("break_tip", "overloaded").inc()
+        except asyncio.TimeoutError:
+            logger.warning("Break tip LLM timed out, using static fallback")
+            LLM_TIMEOUTS.labels("break_tip").inc()
+            LLM_FALLBACKS.labels("break_tip", "timeout").inc()
+        except Exception as e:
             logger.warning(f"Break tip LLM error ({type(e).__name__}), using static fallback")
+            LLM_FALLBACKS.labels("break_tip", "error").inc()
+    elif backend in TINYLLAMA_BACKENDS:
+        LLM_FALLBACKS.labels("break_tip", "not_loaded").inc()
 
     # Static fallback
-    return BreakTipResponse(tip=_static_break_tip(request.move, request.primary_muscles))
+    return BreakTipResponse(tip=_static_break_tip(parse_callout(request.move), request.primary_muscles))
 
-def _static_break_tip(move: str, muscles: List[str]) -> str:
+def _static_break_tip(callout: ParsedCallout, muscles: List[str]) -> str:
     """Rule-based coaching tips when LLM is unavailable."""
     static = {
         "1": "Your jab works your front shoulder and triceps. Make sure to snap it back fast to keep your guard up.",
@@ -567,40 +2618,74 @@ def _static_break_tip(move: str, muscles: List[str]) -> str:
         "4": "Uppercuts come from your legs. Bend your knees slightly and drive upward through your bicep and shoulder.",
         "Defense": "Slipping and footwork engage your entire core and legs. Stay light on your toes and keep your hands up as you move.",
     }
-    for key, tip in static.items():
-        if key.lower() in move.lower():
-            return tip
+    if callout.key_move is not None:
+        return static[callout.key_move]
     if muscles:
         muscle_str = " and ".join(muscles[:2])
         return f"That combination really worked your {muscle_str}. Stay loose and breathe deep during your rest."
     return "Good round. Focus on your breathing and stay hydrated before we go again."
 
+def _log_tts_request(request: TTSRequest) -> None:
+    tts_record = {
+        "id": str(uuid.uuid4()),
+        "text": request.text,
+        "voice": request.voice,
+        "speed": request.speed,
+        # A BSON date, so the created_at TTL index can expire it
+        "created_at": datetime.now(timezone.utc),
+    }
+    audit_log.log("tts_requests", tts_record)
+
+async def _stream_speech_response(request: TTSRequest) -> StreamingResponse:
+    """Start synthesis and return a StreamingResponse once the first chunk is ready.
+
+    Pulling the first chunk before responding means backend failures still surface
+    as a proper HTTP error instead of a truncated 200 body.
+    """
+    openai_key = os.environ.get('OPENAI_API_KEY')
+    if not openai_key:
+        raise HTTPException(status_code=503, detail="Text-to-speech is not configured")
+    try:
+        chunks = stream_speech(request.text, request.voice, request.speed, openai_key)
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = b""
+        _log_tts_request(request)
+    except Exception as e:
+        logging.error(f"TTS stream error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error generating speech: {str(e)}")
+
+    async def body():
+        if first:
+            yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(body(), media_type="audio/mpeg")
+
+@api_router.post("/tts/stream")
+async def stream_speech_audio(request: TTSRequest):
+    """Stream text-to-speech audio as binary MP3 chunks."""
+    return await _stream_speech_response(request)
+
 @api_router.post("/tts/generate", response_model=TTSResponse)
-async def generate_speech(request: TTSRequest):
-    """Generate text-to-speech audio. Returns empty audio_base64 if no OpenAI key configured."""
+async def generate_speech(request: TTSRequest, raw_request: Request):
+    """Generate text-to-speech audio. Returns empty audio_base64 if no OpenAI key configured.
+
+    Clients sending ``Accept: audio/mpeg`` get the binary stream from /tts/stream instead.
+    """
+    if "audio/mpeg" in raw_request.headers.get("accept", ""):
+        return await _stream_speech_response(request)
     try:
         openai_key = os.environ.get('OPENAI_API_KEY')
         if openai_key:
-            import openai
-            oai_client = openai.AsyncOpenAI(api_key=openai_key)
-            response = await oai_client.audio.speech.create(
-                model="tts-1",
-                voice=request.voice,
-                input=request.text,
-                speed=request.speed,
-            )
-            audio_base64 = base64.b64encode(response.content).decode('utf-8')
+            audio = await synthesize_speech(request.text, request.voice, request.speed, openai_key)
+            audio_base64 = base64.b64encode(audio).decode('utf-8')
         else:
             audio_base64 = ""
 
-        tts_record = {
-            "id": str(uuid.uuid4()),
-            "text": request.text,
-            "voice": request.voice,
-            "speed": request.speed,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-        }
-        await db.tts_requests.insert_one(tts_record)
+        _log_tts_request(request)
 
         return TTSResponse(
             audio_base64=audio_base64,
@@ -611,46 +2696,682 @@ async def generate_speech(request: TTSRequest):
         logging.error(f"TTS error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating speech: {str(e)}")
 
+async def _stored_blob(sha256: str):
+    """GridFS file id of an existing track with this content hash, if any."""
+    existing = await db.audio_tracks.find_one(
+        {"sha256": sha256, "file_id": {"$ne": None}}, {"_id": 0, "file_id": 1}
+    )
+    return existing["file_id"] if existing else None
+
 @api_router.post("/audio/upload", response_model=AudioTrack)
 async def upload_audio_track(track_data: AudioTrackCreate):
-    """Upload a new audio track for workouts"""
+    """Upload a new audio track for workouts (small files; see /audio/uploads for chunked uploads)"""
     try:
-        track = AudioTrack(**track_data.dict())
+        audio = base64.b64decode(track_data.audio_base64)
+        track = AudioTrack(
+            name=track_data.name,
+            artist=track_data.artist,
+            duration_ms=track_data.duration_ms,
+            content_type=track_data.content_type,
+            size_bytes=len(audio),
+            sha256=hashlib.sha256(audio).hexdigest(),
+        )
         track_dict = track.dict()
+        track_dict["file_id"] = await _stored_blob(track.sha256) or await audio_fs.upload_from_stream(
+            track.id, audio, metadata={"track_id": track.id, "content_type": track.content_type, "sha256": track.sha256}
+        )
         await db.audio_tracks.insert_one(track_dict)
         return track
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading track: {str(e)}")
 
-@api_router.get("/audio/tracks", response_model=List[AudioTrack])
-async def get_audio_tracks(genre: Optional[str] = None):
-    """Get available audio tracks"""
+# Chunked uploads: bytes are staged in audio_upload_chunks as they arrive, then
+# copied into GridFS at finalize unless an identical blob already exists.
+AUDIO_UPLOAD_MAX_BYTES = int(os.environ.get("AUDIO_UPLOAD_MAX_BYTES", str(200 * 1024 * 1024)))
+# An append or finalize that has not made progress for this long is treated as
+# dead (e.g. its worker crashed) and another request may take the upload over.
+AUDIO_UPLOAD_LEASE_S = int(os.environ.get("AUDIO_UPLOAD_LEASE_S", "120"))
+
+# upload_id -> (offset, running SHA-256). Lost on restart or on another worker;
+# finalize then re-hashes the staged chunks instead.
+_upload_hashes: TTLCache = TTLCache(maxsize=1024, ttl=AUDIO_UPLOAD_TTL_S)
+
+def _upload_status(upload: dict) -> AudioUploadStatus:
+    return AudioUploadStatus(
+        upload_id=upload["id"],
+        status=upload["status"],
+        received_bytes=upload["received_bytes"],
+        size_bytes=upload.get("size_bytes"),
+        chunk_size=AUDIO_CHUNK_SIZE,
+        track_id=upload.get("track_id"),
+    )
+
+async def _get_upload(upload_id: str) -> dict:
+    upload = await db.audio_uploads.find_one({"id": upload_id}, {"_id": 0})
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+@api_router.post("/audio/uploads", response_model=AudioUploadStatus, status_code=201)
+async def create_audio_upload(request: AudioUploadCreate):
+    """Open a resumable upload session; append bytes to it, then finalize."""
+    if request.size_bytes is not None and request.size_bytes > AUDIO_UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Uploads are limited to {AUDIO_UPLOAD_MAX_BYTES} bytes")
+    now = datetime.now(timezone.utc)
+    upload = {
+        **request.dict(),
+        "id": str(uuid.uuid4()),
+        "status": "open",
+        "received_bytes": 0,
+        "created_at": now,
+        "updated_at": now,  # TTL field: abandoned sessions expire AUDIO_UPLOAD_TTL_S after their last append
+    }
+    await db.audio_uploads.insert_one(upload)
+    _upload_hashes[upload["id"]] = (0, hashlib.sha256())
+    return _upload_status(upload)
+
+@api_router.get("/audio/uploads/{upload_id}", response_model=AudioUploadStatus)
+async def get_audio_upload(upload_id: str):
+    """Upload progress; after an interruption, resume appending at ``received_bytes``."""
+    return _upload_status(await _get_upload(upload_id))
+
+@api_router.post("/audio/uploads/{upload_id}/chunks", response_model=AudioUploadStatus)
+async def append_audio_upload(upload_id: str, request: Request, offset: int = Query(..., ge=0)):
+    """Append the raw request body at ``offset``, which must equal ``received_bytes``.
+
+    The body is streamed into storage in AUDIO_CHUNK_SIZE pieces and each piece
+    is acknowledged as it lands, so a dropped connection keeps what was stored.
+    Only one append runs per upload: it first claims the session at ``offset``,
+    and a concurrent append gets 409 with the offset to resume from.
+    """
+    from pymongo.errors import DuplicateKeyError
+
+    now = datetime.now(timezone.utc)
+    lease = str(uuid.uuid4())
+    claimed = await db.audio_uploads.update_one(
+        {
+            "id": upload_id,
+            "status": "open",
+            "received_bytes": offset,
+            # A lease left by a crashed worker stops blocking once it goes stale
+            "$or": [{"appending": None}, {"appending_at": {"$lt": now - timedelta(seconds=AUDIO_UPLOAD_LEASE_S)}}],
+        },
+        {"$set": {"appending": lease, "appending_at": now, "updated_at": now}},
+    )
+    if not claimed.matched_count:
+        upload = await _get_upload(upload_id)
+        if upload["status"] != "open":
+            raise HTTPException(status_code=409, detail=f"Upload is {upload['status']}")
+        detail = (
+            f"Expected offset {upload['received_bytes']}" if offset != upload["received_bytes"]
+            else "Another append is in progress"
+        )
+        raise HTTPException(status_code=409, detail=detail, headers={"Upload-Offset": str(upload["received_bytes"])})
+    upload = await _get_upload(upload_id)
+    limit = min(upload.get("size_bytes") or AUDIO_UPLOAD_MAX_BYTES, AUDIO_UPLOAD_MAX_BYTES)
+
+    # A piece stored by an interrupted append but never acknowledged would collide
+    await db.audio_upload_chunks.delete_many({"upload_id": upload_id, "offset": {"$gte": offset}})
+    # Keep earlier pieces alive for as long as the session: neither expires before the other
+    await db.audio_upload_chunks.update_many({"upload_id": upload_id}, {"$set": {"updated_at": now}})
+    cached = _upload_hashes.pop(upload_id, None)
+    hasher = cached[1] if cached and cached[0] == offset else None
+
+    async def store(piece: bytes) -> None:
+        nonlocal offset
+        if offset + len(piece) > limit:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {limit} bytes")
+        try:
+            await db.audio_upload_chunks.insert_one(
+                {"upload_id": upload_id, "offset": offset, "size": len(piece), "data": piece, "updated_at": now}
+            )
+        except DuplicateKeyError:
+            raise HTTPException(
+                status_code=409, detail="Upload changed concurrently", headers={"Upload-Offset": str(offset)}
+            )
+        advanced = await db.audio_uploads.update_one(
+            {"id": upload_id, "appending": lease, "received_bytes": offset},
+            {"$set": {"received_bytes": offset + len(piece), "appending_at": datetime.now(timezone.utc)}},
+        )
+        if not advanced.matched_count:
+            raise HTTPException(
+                status_code=409, detail="Upload changed concurrently", headers={"Upload-Offset": str(offset)}
+            )
+        if hasher is not None:
+            hasher.update(piece)
+        offset += len(piece)
+
+    pending = bytearray()
     try:
-        query = {}
-        if genre:
-            query["genre"] = genre
-        tracks = await db.audio_tracks.find(query).to_list(100)
-        return [AudioTrack(**track) for track in tracks]
+        async for data in request.stream():
+            pending += data
+            while len(pending) >= AUDIO_CHUNK_SIZE:
+                await store(bytes(pending[:AUDIO_CHUNK_SIZE]))
+                del pending[:AUDIO_CHUNK_SIZE]
+        if pending:
+            await store(bytes(pending))
+    finally:
+        await db.audio_uploads.update_one(
+            {"id": upload_id, "appending": lease}, {"$unset": {"appending": "", "appending_at": ""}}
+        )
+        if hasher is not None:
+            _upload_hashes[upload_id] = (offset, hasher)
+    return _upload_status({**upload, "received_bytes": offset})
+
+@api_router.post("/audio/uploads/{upload_id}/finalize", response_model=AudioTrack)
+async def finalize_audio_upload(upload_id: str):
+    """Turn a complete upload into a track. Repeating it returns the same track.
+
+    A finalize that stops making progress for AUDIO_UPLOAD_LEASE_S (e.g. its
+    worker died mid-copy) no longer holds the upload, and a retry takes it over.
+    """
+    upload = await _get_upload(upload_id)
+    if upload["status"] == "finalized":
+        track = await db.audio_tracks.find_one({"id": upload["track_id"]}, {"_id": 0, "audio_base64": 0})
+        if not track:
+            raise HTTPException(status_code=404, detail="Track not found")
+        return AudioTrack(**track)
+    received = upload["received_bytes"]
+    if not received:
+        raise HTTPException(status_code=400, detail="Upload is empty")
+    if upload.get("size_bytes") is not None and received != upload["size_bytes"]:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Upload incomplete: {received} of {upload['size_bytes']} bytes",
+            headers={"Upload-Offset": str(received)},
+        )
+    staged = await db.audio_upload_chunks.aggregate([
+        {"$match": {"upload_id": upload_id}},
+        {"$group": {"_id": None, "bytes": {"$sum": "$size"}}},
+    ]).to_list(1)
+    if (staged[0]["bytes"] if staged else 0) != received:
+        raise HTTPException(status_code=410, detail="Staged upload data has expired; start a new upload")
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(seconds=AUDIO_UPLOAD_LEASE_S)
+    lease = str(uuid.uuid4())
+    claimed = await db.audio_uploads.update_one(
+        {
+            "id": upload_id,
+            "received_bytes": received,
+            "$or": [
+                {"status": "open", "$or": [{"appending": None}, {"appending_at": {"$lt": stale}}]},
+                {"status": "finalizing", "finalizing_at": {"$lt": stale}},
+            ],
+        },
+        {
+            "$set": {"status": "finalizing", "finalizing": lease, "finalizing_at": now},
+            "$unset": {"appending": "", "appending_at": ""},
+        },
+    )
+    if not claimed.matched_count:
+        raise HTTPException(status_code=409, detail="Upload changed concurrently")
+    last_renewed = time.monotonic()
+
+    async def renew_lease() -> None:
+        nonlocal last_renewed
+        if time.monotonic() - last_renewed > AUDIO_UPLOAD_LEASE_S / 3:
+            await db.audio_uploads.update_one(
+                {"id": upload_id, "finalizing": lease}, {"$set": {"finalizing_at": datetime.now(timezone.utc)}}
+            )
+            last_renewed = time.monotonic()
+
+    def staged_chunks():
+        return db.audio_upload_chunks.find({"upload_id": upload_id}, {"_id": 0, "data": 1}).sort("offset", 1)
+
+    track = AudioTrack(
+        name=upload["name"],
+        artist=upload["artist"],
+        duration_ms=upload["duration_ms"],
+        genre=upload["genre"],
+        content_type=upload["content_type"],
+        size_bytes=received,
+    )
+    try:
+        cached = _upload_hashes.pop(upload_id, None)
+        if cached and cached[0] == received:
+            hasher = cached[1]
+        else:
+            hasher = hashlib.sha256()
+            async for chunk in staged_chunks():
+                hasher.update(chunk["data"])
+                await renew_lease()
+        track.sha256 = hasher.hexdigest()
+
+        file_id = await _stored_blob(track.sha256)
+        if file_id is None:
+            grid_in = audio_fs.open_upload_stream(
+                track.id, metadata={"track_id": track.id, "content_type": track.content_type, "sha256": track.sha256}
+            )
+            async for chunk in staged_chunks():
+                await grid_in.write(chunk["data"])
+                await renew_lease()
+            await grid_in.close()
+            file_id = grid_in._id
+        await db.audio_tracks.insert_one({**track.dict(), "file_id": file_id})
+    except Exception as e:
+        await db.audio_uploads.update_one(
+            {"id": upload_id, "finalizing": lease},
+            {"$set": {"status": "open"}, "$unset": {"finalizing": "", "finalizing_at": ""}},
+        )
+        raise HTTPException(status_code=500, detail=f"Error finalizing upload: {str(e)}")
+
+    finished = await db.audio_uploads.update_one(
+        {"id": upload_id, "finalizing": lease},
+        {
+            "$set": {"status": "finalized", "track_id": track.id, "updated_at": datetime.now(timezone.utc)},
+            "$unset": {"finalizing": "", "finalizing_at": ""},
+        },
+    )
+    if not finished.matched_count:
+        # Our lease went stale and a retry took over; it owns the upload's track
+        await db.audio_tracks.delete_one({"id": track.id})
+        raise HTTPException(status_code=409, detail="Upload changed concurrently")
+    await db.audio_upload_chunks.delete_many({"upload_id": upload_id})
+    return track
+
+AUDIO_TRACKS_PAGE_SIZE = int(os.environ.get("AUDIO_TRACKS_PAGE_SIZE", "50"))
+AUDIO_TRACKS_MAX_PAGE_SIZE = int(os.environ.get("AUDIO_TRACKS_MAX_PAGE_SIZE", "200"))
+# Listing fields a client may ask for; audio bytes are only ever served by /stream
+AUDIO_TRACK_FIELDS = frozenset(AudioTrack.__fields__)
+
+def _encode_track_cursor(track: dict) -> str:
+    key = json.dumps([track["created_at"].isoformat(), track["id"]])
+    return base64.urlsafe_b64encode(key.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_track_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        created_at, track_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), str(track_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _track_json(track: dict) -> str:
+    return json.dumps(track, default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value))
+
+@api_router.get("/audio/tracks", response_model=None, responses={200: {"model": AudioTrackPage}})
+async def get_audio_tracks(
+    genre: Optional[str] = None,
+    limit: int = Query(AUDIO_TRACKS_PAGE_SIZE, ge=1, le=AUDIO_TRACKS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    """List audio tracks newest first, one keyset-paginated page at a time.
+
+    ``fields`` is a comma-separated subset of AudioTrack fields (``id`` is always
+    included). Pass the returned ``next_cursor`` back as ``cursor`` for the next
+    page; it is null on the last page. A page is at most
+    AUDIO_TRACKS_MAX_PAGE_SIZE rows, so it is read in full before the response
+    starts and a database error is a 500, never a truncated 200.
+    """
+    if fields:
+        requested = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = requested - AUDIO_TRACK_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        returned = requested | {"id"}
+    else:
+        returned = set(AUDIO_TRACK_FIELDS)
+    # created_at is always read because the next cursor is built from it
+    projection = {"_id": 0, **{name: 1 for name in returned | {"created_at"}}}
+
+    query: dict = {}
+    if genre:
+        query["genre"] = genre
+    if cursor:
+        created_at, track_id = _decode_track_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": track_id}},
+        ]
+
+    # One extra row tells whether another page follows, without a count query
+    try:
+        tracks = await (
+            db.audio_tracks.find(query, projection)
+            .sort([("created_at", -1), ("id", -1)])
+            .limit(limit + 1)
+            .batch_size(limit + 1)
+            .to_list(limit + 1)
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching tracks: {str(e)}")
 
+    next_cursor = _encode_track_cursor(tracks[limit - 1]) if len(tracks) > limit else None
+    body = ",".join(_track_json({k: v for k, v in track.items() if k in returned}) for track in tracks[:limit])
+    return Response(
+        '{"tracks":[' + body + '],"next_cursor":' + json.dumps(next_cursor) + "}", media_type="application/json"
+    )
+
 @api_router.get("/audio/track/{track_id}", response_model=AudioTrack)
 async def get_audio_track(track_id: str):
     """Get specific audio track"""
     try:
-        track = await db.audio_tracks.find_one({"id": track_id})
+        track = await db.audio_tracks.find_one({"id": track_id}, {"audio_base64": 0})
         if not track:
             raise HTTPException(status_code=404, detail="Track not found")
         return AudioTrack(**track)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching track: {str(e)}")
 
+async def _track_file_id(track: dict):
+    """Return the GridFS file id for a track, moving legacy inline audio into GridFS first."""
+    if track.get("file_id") is not None:
+        return track["file_id"]
+    legacy = await db.audio_tracks.find_one({"id": track["id"]}, {"audio_base64": 1})
+    if not legacy or not legacy.get("audio_base64"):
+        raise HTTPException(status_code=404, detail="Track audio not found")
+    audio = base64.b64decode(legacy["audio_base64"])
+    file_id = await audio_fs.upload_from_stream(
+        track["id"], audio, metadata={"track_id": track["id"], "content_type": track.get("content_type", "audio/mpeg")}
+    )
+    await db.audio_tracks.update_one(
+        {"id": track["id"]},
+        {"$set": {"file_id": file_id, "size_bytes": len(audio)}, "$unset": {"audio_base64": ""}},
+    )
+    return file_id
+
+def _parse_byte_range(header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range ``Range: bytes=...`` header into an inclusive (start, end)."""
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None  # Unsupported or multi-range: serve the whole file
+    start_s, _, end_s = spec.strip().partition("-")
+    try:
+        if start_s:
+            start = int(start_s)
+            end = int(end_s) if end_s else length - 1
+        else:
+            suffix = int(end_s)
+            if suffix <= 0:
+                raise ValueError
+            start, end = max(0, length - suffix), length - 1
+    except ValueError:
+        start, end = length, length  # Malformed — fall through to 416
+    end = min(end, length - 1)
+    if start >= length or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{length}"},
+        )
+    return start, end
+
+@api_router.get("/audio/track/{track_id}/stream")
+async def stream_audio_track(track_id: str, request: Request):
+    """Stream raw track bytes from GridFS, honoring HTTP Range requests"""
+    try:
+        track = await db.audio_tracks.find_one({"id": track_id}, {"audio_base64": 0})
+        if not track:
+            raise HTTPException(status_code=404, detail="Track not found")
+        grid_out = await audio_fs.open_download_stream(await _track_file_id(track))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error opening track: {str(e)}")
+
+    length = grid_out.length
+    byte_range = _parse_byte_range(request.headers.get("range"), length)
+    start, end = byte_range if byte_range else (0, length - 1)
+
+    async def body():
+        grid_out.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await grid_out.read(min(AUDIO_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(max(0, end - start + 1)),
+    }
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    return StreamingResponse(
+        body(),
+        status_code=206 if byte_range else 200,
+        media_type=track.get("content_type", "audio/mpeg"),
+        headers=headers,
+    )
+
+# ---------------------------------------------------------------------------
+# Workout WebSocket channel
+# ---------------------------------------------------------------------------
+
+class WorkoutChannel:
+    """Drives one athlete's workout over a single WebSocket.
+
+    The server pushes ``callout``, ``muscle_info``, ``round_complete``,
+    ``break_start``, ``break_tip`` and ``workout_complete`` messages. The client
+    only sends control events mirroring the HoldMenu actions: ``pause``,
+    ``resume``, ``next_round`` and ``repeat_round``. The next callout is
+    generated while the current one is being performed, so it is ready the
+    moment the move timer expires.
+    """
+
+    COMPLEXITY_STEP = 0.1
+    COMPLEXITY_INTERVAL_MS = 30_000
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        session_id: str,
+        total_rounds: int = 7,
+        round_length_ms: int = 300_000,
+        break_length_ms: int = 180_000,
+    ):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.total_rounds = total_rounds
+        self.round_length_ms = round_length_ms
+        self.break_length_ms = break_length_ms
+        self.round_number = 1
+        self.paused = False
+        self.last_move = ""
+        self.last_muscle_info: Optional[MuscleInfoResponse] = None
+        self._jump: Optional[str] = None
+        self._control = asyncio.Event()
+        self._background: set = set()
+
+    async def send(self, message_type: str, **payload) -> None:
+        await self.websocket.send_json({"type": message_type, **payload})
+
+    @property
+    def intensity(self) -> float:
+        return min(1.0, 0.1 * self.round_number)
+
+    async def run(self) -> None:
+        receiver = asyncio.create_task(self._receive_controls())
+        driver = asyncio.create_task(self._drive())
+        try:
+            done, _ = await asyncio.wait({receiver, driver}, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            for task in (receiver, driver, *self._background):
+                task.cancel()
+
+    async def _receive_controls(self) -> None:
+        while True:
+            message = await self.websocket.receive_json()
+            kind = message.get("type") if isinstance(message, dict) else None
+            if kind == "pause":
+                self.paused = True
+                await self.send("paused", round_number=self.round_number)
+            elif kind == "resume":
+                self.paused = False
+                await self.send("resumed", round_number=self.round_number)
+            elif kind == "next_round" and self.round_number >= self.total_rounds:
+                await self.send("error", detail="Already on the final round")
+                continue
+            elif kind in ("next_round", "repeat_round"):
+                self._jump = kind
+                self.paused = False
+            else:
+                await self.send("error", detail=f"Unknown control event: {kind!r}")
+                continue
+            self._control.set()
+
+    async def _wait(self, duration_ms: int) -> Optional[str]:
+        """Sleep for ``duration_ms`` of un-paused time; return a round jump if one arrives."""
+        loop = asyncio.get_running_loop()
+        remaining = duration_ms / 1000.0
+        while True:
+            if self._jump is not None:
+                jump, self._jump = self._jump, None
+                return jump
+            if not self.paused and remaining <= 0:
+                return None
+            was_paused = self.paused
+            self._control.clear()
+            started = loop.time()
+            try:
+                await asyncio.wait_for(self._control.wait(), timeout=None if was_paused else remaining)
+            except asyncio.TimeoutError:
+                return None
+            if not was_paused:
+                remaining -= loop.time() - started
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _push_muscle_info(self, move: str) -> None:
+        info = await llm_muscle_info(MuscleInfoRequest(move=move))
+        if move == self.last_move:
+            self.last_muscle_info = info
+        await self.send("muscle_info", **info.dict())
+
+    async def _next_callout(self, complexity: float, previous_move: str) -> CalloutResponse:
+        return await llm_callout(CalloutRequest(
+            complexity=complexity,
+            intensity=self.intensity,
+            round_number=self.round_number,
+            previous_move=previous_move,
+            session_id=self.session_id,
+        ))
+
+    async def _drive(self) -> None:
+        while True:
+            jump = await self._run_round()
+            if jump == "repeat_round":
+                continue
+            if jump is None:
+                if self.round_number >= self.total_rounds:
+                    break
+                jump = await self._run_break()
+                if jump == "repeat_round":
+                    continue
+            self.round_number += 1
+        await self.send("workout_complete", session_id=self.session_id)
+
+    async def _run_round(self) -> Optional[str]:
+        elapsed_ms = 0
+        pending = asyncio.create_task(self._next_callout(0.0, ""))
+        try:
+            while True:
+                callout = await pending
+                self.last_move = callout.command
+                self.last_muscle_info = None
+                await self.send(
+                    "callout",
+                    round_number=self.round_number,
+                    offset_ms=elapsed_ms,
+                    **callout.dict(),
+                )
+                self._spawn(self._push_muscle_info(callout.command))
+
+                elapsed_ms += callout.duration_ms
+                if elapsed_ms < self.round_length_ms:
+                    complexity = min(
+                        1.0,
+                        (elapsed_ms // self.COMPLEXITY_INTERVAL_MS) * self.COMPLEXITY_STEP,
+                    )
+                    pending = asyncio.create_task(self._next_callout(complexity, callout.command))
+
+                jump = await self._wait(callout.duration_ms)
+                if jump is not None:
+                    return jump
+                if elapsed_ms >= self.round_length_ms:
+                    await self.send("round_complete", round_number=self.round_number)
+                    return None
+        finally:
+            if not pending.done():
+                pending.cancel()
+
+    async def _run_break(self) -> Optional[str]:
+        await self.send(
+            "break_start",
+            round_number=self.round_number,
+            break_length_ms=self.break_length_ms,
+        )
+        if self.last_move:
+            primary = self.last_muscle_info.primary_muscles if self.last_muscle_info else []
+            self._spawn(self._push_break_tip(self.last_move, primary))
+        return await self._wait(self.break_length_ms)
+
+    async def _push_break_tip(self, move: str, primary_muscles: List[str]) -> None:
+        tip = await llm_break_tip(BreakTipRequest(
+            move=move,
+            primary_muscles=primary_muscles,
+            round_number=self.round_number,
+        ))
+        await self.send("break_tip", round_number=self.round_number, tip=tip.tip)
+
+
+@api_router.websocket("/ws/workout/{session_id}")
+async def workout_channel(
+    websocket: WebSocket,
+    session_id: str,
+    round_length_ms: int = 300_000,
+    break_length_ms: int = 180_000,
+):
+    """Persistent workout channel: server pushes callouts, client sends control events."""
+    session = await db.workout_sessions.find_one({"id": session_id}, {"_id": 0, "total_rounds": 1})
+    if not session:
+        await websocket.close(code=4404, reason="Workout session not found")
+        return
+    await websocket.accept()
+    channel = WorkoutChannel(
+        websocket,
+        session_id,
+        total_rounds=session.get("total_rounds", 7),
+        round_length_ms=max(1, round_length_ms),
+        break_length_ms=max(0, break_length_ms),
+    )
+    try:
+        await channel.run()
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info(f"Workout channel closed by client (session_id={session_id})")
+    except Exception:
+        logger.exception(f"Workout channel error (session_id={session_id})")
+        await websocket.close(code=1011)
+
 # ---------------------------------------------------------------------------
 # App setup
 # ---------------------------------------------------------------------------
 
 app.include_router(api_router)
 
+app.add_middleware(PrometheusMiddleware)
+
+LLM_QUEUE_DEPTH.set_function(lambda: LlmEngine._batcher.backlog if LlmEngine._batcher is not None else 0)
+LLM_READY.set_function(lambda: 1 if LlmEngine._loaded else 0)
+AUDIT_LOG_QUEUE_DEPTH.set_function(lambda: audit_log.pending)
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -669,15 +3390,16 @@ async def startup_event():
         logger.exception("MongoDB startup check failed")
         raise
 
+    # Build or verify indexes in the background; progress is reported by /api/health
+    index_manager.start()
+
     # Load LLM if configured
     backend = os.environ.get("LLM_BACKEND", "rule-based")
     logger.info(f"LLM_BACKEND={backend}")
-    if backend == "tinyllama":
-        logger.info("Loading TinyLlama model (this may take 30–120 seconds)...")
-        try:
-            await LlmEngine.load()
-        except Exception:
-            logger.exception("Failed to load TinyLlama — falling back to rule-based")
+    if backend in TINYLLAMA_BACKENDS:
+        # Load in the background; rule-based engines answer until the model is warm
+        logger.info("Loading TinyLlama model in the background (this may take 30–120 seconds)...")
+        LlmEngine.start_loading()
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -688,6 +3410,12 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await callout_pool.stop()
+    await index_manager.stop()
+    await progress_buffer.stop()
+    await audit_log.stop()
+    await LlmEngine.shutdown()
+    await close_openai_client()
     client.close()
 
 if __name__ == "__main__":
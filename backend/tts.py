@@ -0,0 +1,213 @@
+"""Text-to-speech synthesis with a content-addressed on-disk audio cache.
+
+Callouts repeat constantly ("1-2", "Defense 3", "Round 1 complete..."), so
+synthesized clips are stored on disk under a hash of everything that affects
+the audio and evicted least-recently-used once the cache exceeds its size
+budget. Cache misses go through a shared, connection-pooled OpenAI client
+(one per API key) instead of a fresh client per request.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+
+from metrics import TTS_FIRST_CHUNK_SECONDS, TTS_REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+TTS_MODEL = "tts-1"
+
+
+class TTSAudioCache:
+    """LRU cache of synthesized audio files bounded by total size on disk."""
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._load_index()
+
+    @staticmethod
+    def key(text: str, voice: str, speed: float, model: str = TTS_MODEL) -> str:
+        payload = json.dumps([text, voice, round(speed, 3), model], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.mp3"
+
+    def _load_index(self) -> None:
+        """Rebuild the LRU order from file mtimes so the cache survives restarts."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = sorted(self.directory.glob("*/*.mp3"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self._entries[path.stem] = size
+            self._total_bytes += size
+        self._evict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if not data or len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so a concurrent reader never sees a partial clip
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+tts_cache = TTSAudioCache(
+    Path(os.environ.get("TTS_CACHE_DIR", Path(__file__).parent / ".tts_cache")),
+    max_bytes=int(float(os.environ.get("TTS_CACHE_MAX_MB", "256")) * 1024 * 1024),
+)
+
+# api_key -> AsyncOpenAI. Keys come from configuration, so this holds one
+# client per key the process has been configured with, not one per request.
+_openai_clients: Dict[str, object] = {}
+
+
+def get_openai_client(api_key: str):
+    """Return the process-wide AsyncOpenAI client for ``api_key``, creating it on first use."""
+    client = _openai_clients.get(api_key)
+    if client is None:
+        import httpx
+        import openai
+
+        client = _openai_clients[api_key] = openai.AsyncOpenAI(
+            api_key=api_key,
+            http_client=openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=int(os.environ.get("TTS_MAX_CONNECTIONS", "20")),
+                    max_keepalive_connections=int(os.environ.get("TTS_MAX_KEEPALIVE", "10")),
+                ),
+            ),
+        )
+    return client
+
+
+async def close_openai_client() -> None:
+    clients = list(_openai_clients.values())
+    _openai_clients.clear()
+    for client in clients:
+        await client.close()
+
+
+async def synthesize_speech(text: str, voice: str, speed: float, api_key: str) -> bytes:
+    """Return MP3 bytes for ``text``, from the disk cache when possible."""
+    started = time.perf_counter()
+    key = TTSAudioCache.key(text, voice, speed)
+    cached = await asyncio.to_thread(tts_cache.get, key)
+    if cached is not None:
+        TTS_REQUEST_SECONDS.labels("buffered", "hit").observe(time.perf_counter() - started)
+        return cached
+
+    response = await get_openai_client(api_key).audio.speech.create(
+        model=TTS_MODEL,
+        voice=voice,
+        input=text,
+        speed=speed,
+    )
+    audio = response.content
+    TTS_REQUEST_SECONDS.labels("buffered", "miss").observe(time.perf_counter() - started)
+    try:
+        await asyncio.to_thread(tts_cache.put, key, audio)
+    except OSError:
+        logger.exception("TTS cache write failed")
+    return audio
+
+
+async def stream_speech(
+    text: str,
+    voice: str,
+    speed: float,
+    api_key: str,
+    chunk_size: int = 4096,
+) -> AsyncIterator[bytes]:
+    """Yield MP3 chunks for ``text`` as they arrive from the synthesis backend.
+
+    Cached clips are replayed in ``chunk_size`` pieces; a miss is streamed
+    straight through from OpenAI and stored once the last chunk has arrived.
+    """
+    started = time.perf_counter()
+    key = TTSAudioCache.key(text, voice, speed)
+    cached = await asyncio.to_thread(tts_cache.get, key)
+    if cached is not None:
+        TTS_FIRST_CHUNK_SECONDS.labels("hit").observe(time.perf_counter() - started)
+        for offset in range(0, len(cached), chunk_size):
+            yield cached[offset:offset + chunk_size]
+        TTS_REQUEST_SECONDS.labels("stream", "hit").observe(time.perf_counter() - started)
+        return
+
+    parts = []
+    async with get_openai_client(api_key).audio.speech.with_streaming_response.create(
+        model=TTS_MODEL,
+        voice=voice,
+        input=text,
+        speed=speed,
+        response_format="mp3",
+    ) as response:
+        async for chunk in response.iter_bytes(chunk_size):
+            if not parts:
+                TTS_FIRST_CHUNK_SECONDS.labels("miss").observe(time.perf_counter() - started)
+            parts.append(chunk)
+            yield chunk
+    TTS_REQUEST_SECONDS.labels("stream", "miss").observe(time.perf_counter() - started)
+
+    try:
+        await asyncio.to_thread(tts_cache.put, key, b"".join(parts))
+    except OSError:
+        logger.exception("TTS cache write failed")
@@ -326,12 +326,16 @@ class BrutalityBackendTester:
             
             if response.status_code == 200:
                 data = response.json()
-                # Should return a list (even if empty)
-                if isinstance(data, list):
-                    self.log_test("Audio Tracks Get", True, f"Retrieved {len(data)} tracks")
-                    return True
+                # Should return a page of tracks (even if empty) and the cursor for the next one
+                if isinstance(data, dict) and isinstance(data.get("tracks"), list) and "next_cursor" in data:
+                    if all("audio_base64" not in track for track in data["tracks"]):
+                        self.log_test("Audio Tracks Get", True, f"Retrieved {len(data['tracks'])} tracks")
+                        return True
+                    else:
+                        self.log_test("Audio Tracks Get", False, "Listing included audio bytes")
+                        return False
                 else:
-                    self.log_test("Audio Tracks Get", False, f"Expected list, got: {type(data)}")
+                    self.log_test("Audio Tracks Get", False, f"Expected {{tracks, next_cursor}}, got: {data}")
                     return False
             else:
                 self.log_test("Audio Tracks Get", False, f"Status: {response.status_code}, Response: {response.text}")
@@ -341,6 +345,48 @@ class BrutalityBackendTester:
             self.log_test("Audio Tracks Get", False, f"Exception: {str(e)}")
             return False
     
+    def test_audio_tracks_pagination(self):
+        """Test that following next_cursor visits every track exactly once"""
+        try:
+            # Reference listing: one large page, newest first
+            response = self.session.get(f"{BACKEND_URL}/audio/tracks", params={"limit": 200, "fields": "id"})
+            if response.status_code != 200:
+                self.log_test("Audio Tracks Pagination", False, f"Status: {response.status_code}, Response: {response.text}")
+                return False
+            expected = [track["id"] for track in response.json()["tracks"]]
+            
+            # Walk the same listing two tracks at a time
+            seen = []
+            cursor = None
+            for _ in range(len(expected) + 1):
+                params = {"limit": 2, "fields": "id"}
+                if cursor:
+                    params["cursor"] = cursor
+                response = self.session.get(f"{BACKEND_URL}/audio/tracks", params=params)
+                if response.status_code != 200:
+                    self.log_test("Audio Tracks Pagination", False, f"Status: {response.status_code}, Response: {response.text}")
+                    return False
+                page = response.json()
+                seen.extend(track["id"] for track in page["tracks"])
+                cursor = page["next_cursor"]
+                if not cursor or len(seen) >= len(expected):
+                    break
+            
+            duplicates = len(seen) - len(set(seen))
+            if duplicates:
+                self.log_test("Audio Tracks Pagination", False, f"{duplicates} tracks returned on more than one page")
+                return False
+            if seen[:len(expected)] != expected:
+                missing = [track_id for track_id in expected if track_id not in seen]
+                self.log_test("Audio Tracks Pagination", False, f"Pages skipped or reordered tracks; missing: {missing}")
+                return False
+            self.log_test("Audio Tracks Pagination", True, f"Walked {len(seen)} tracks in pages of 2")
+            return True
+                
+        except Exception as e:
+            self.log_test("Audio Tracks Pagination", False, f"Exception: {str(e)}")
+            return False
+    
     def test_audio_upload(self):
         """Test uploading an audio track"""
         try:
@@ -357,7 +403,7 @@ class BrutalityBackendTester:
             
             if response.status_code == 200:
                 data = response.json()
-                required_fields = ["id", "name", "artist", "audio_base64", "duration_ms", "genre", "created_at"]
+                required_fields = ["id", "name", "artist", "size_bytes", "duration_ms", "genre", "created_at"]
                 
                 if all(field in data for field in required_fields):
                     if data["name"] == "Intense Workout Beat" and data["artist"] == "DJ Brutality":
@@ -395,7 +441,8 @@ class BrutalityBackendTester:
             self.test_tts_basic,
             self.test_tts_with_speed,
             self.test_audio_tracks_get,
-            self.test_audio_upload
+            self.test_audio_upload,
+            self.test_audio_tracks_pagination
         ]
         
         for test in tests:
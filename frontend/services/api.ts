@@ -18,6 +18,31 @@ export interface WorkoutSession {
   intensity_progression: number[];
 }
 
+export interface PlannedCallout {
+  offset_ms: number;
+  command: string;
+  duration_ms: number;
+  complexity: number;
+  intensity: number;
+}
+
+export interface RoundPlan {
+  session_id: string;
+  round_number: number;
+  total_duration_ms: number;
+  callouts: PlannedCallout[];
+}
+
+export interface ProgressEvent {
+  type?: 'move' | 'round_complete';
+  round_number: number;
+  offset_ms?: number;
+  command?: string;
+  complexity?: number;
+  intensity?: number;
+  timestamp?: string;
+}
+
 export class BrutalityAPI {
   private static baseUrl = `${API_BASE_URL}/api`;
 
@@ -44,6 +69,34 @@ export class BrutalityAPI {
     return response.json();
   }
 
+  static async getRoundPlan(
+    sessionId: string,
+    roundNumber: number,
+    roundLengthMs: number = 300000,
+    previousMove: string = ''
+  ): Promise<RoundPlan> {
+    const response = await fetch(`${this.baseUrl}/workout/${sessionId}/round-plan`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        round_number: roundNumber,
+        round_length_ms: roundLengthMs,
+        previous_move: previousMove,
+      }),
+    });
+    if (!response.ok) throw new Error(`Round plan failed: ${response.statusText}`);
+    return response.json();
+  }
+
+  static async postProgress(sessionId: string, events: ProgressEvent[]): Promise<void> {
+    const response = await fetch(`${this.baseUrl}/workout/${sessionId}/progress`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ events }),
+    });
+    if (!response.ok) throw new Error(`Progress post failed: ${response.statusText}`);
+  }
+
   static async completeWorkoutSession(sessionId: string): Promise<void> {
     const response = await fetch(`${this.baseUrl}/workout/${sessionId}/complete`, {
       method: 'POST',
@@ -101,3 +101,46 @@ export async function checkBackendHealth(): Promise<HealthResponse | null> {
     return null;
   }
 }
+
+export type WorkoutChannelMessage =
+  | ({ type: 'callout'; round_number: number; offset_ms: number } & CalloutResponse)
+  | ({ type: 'muscle_info' } & MuscleInfoResponse)
+  | { type: 'round_complete'; round_number: number }
+  | { type: 'break_start'; round_number: number; break_length_ms: number }
+  | { type: 'break_tip'; round_number: number; tip: string }
+  | { type: 'paused' | 'resumed'; round_number: number }
+  | { type: 'workout_complete'; session_id: string }
+  | { type: 'error'; detail: string };
+
+export type WorkoutControl = 'pause' | 'resume' | 'next_round' | 'repeat_round';
+
+export interface WorkoutChannel {
+  send: (control: WorkoutControl) => void;
+  close: () => void;
+}
+
+/**
+ * Open the persistent workout WebSocket. The server pushes callouts, muscle info
+ * and break tips; the client only sends HoldMenu control events.
+ */
+export function openWorkoutChannel(
+  sessionId: string,
+  onMessage: (message: WorkoutChannelMessage) => void,
+  onClose?: () => void,
+): WorkoutChannel {
+  const ws = new WebSocket(`${BASE.replace(/^http/, 'ws')}/ws/workout/${sessionId}`);
+  ws.onmessage = event => {
+    try {
+      onMessage(JSON.parse(event.data) as WorkoutChannelMessage);
+    } catch {
+      // Ignore malformed frames
+    }
+  };
+  ws.onclose = () => onClose?.();
+  return {
+    send: control => {
+      if (ws.readyState === WebSocket.OPEN) ws.send(JSON.stringify({ type: control }));
+    },
+    close: () => ws.close(),
+  };
+}
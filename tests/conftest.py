@@ -0,0 +1,13 @@
+import os
+import sys
+from pathlib import Path
+
+# The backend is a flat set of modules (server.py imports its siblings by name)
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND))
+# The benchmarks keep the legacy helpers and in-memory stand-ins the tests reuse
+sys.path.insert(0, str(BACKEND / "benchmarks"))
+
+# server.py reads these at import; the client only connects on first use
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "brutality_test")
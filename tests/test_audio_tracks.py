@@ -0,0 +1,98 @@
+"""/api/audio/tracks keyset pagination and field projection, against mongomock."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+from fastapi.testclient import TestClient
+
+import server
+
+
+def _tracks() -> list:
+    start = datetime(2026, 1, 1)
+    # Groups of three share a created_at, so the id tiebreak matters on page edges
+    return [
+        {
+            "id": f"track-{i:02d}",
+            "name": f"Track {i}",
+            "artist": "Gym",
+            "duration_ms": 1000 * i,
+            "genre": "techno_house" if i % 3 else "drum_and_bass",
+            "content_type": "audio/mpeg",
+            "size_bytes": i,
+            "sha256": None,
+            "created_at": start + timedelta(minutes=i // 3),
+            "file_id": None,
+        }
+        for i in range(23)
+    ]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(server, "db", mongomock_motor.AsyncMongoMockClient()["brutality_test"])
+    monkeypatch.setattr(server.app.router, "on_startup", [])
+    monkeypatch.setattr(server.app.router, "on_shutdown", [])
+    with TestClient(server.app) as test_client:
+        test_client.portal.call(server.db.audio_tracks.insert_many, _tracks())
+        yield test_client
+
+
+def _all_pages(client, **params) -> list:
+    pages, cursor = [], None
+    while True:
+        response = client.get("/api/audio/tracks", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        page = response.json()
+        pages.append(page["tracks"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def _newest_first(tracks: list) -> list:
+    return [t["id"] for t in sorted(tracks, key=lambda t: (t["created_at"], t["id"]), reverse=True)]
+
+
+@pytest.mark.parametrize("limit", [1, 4, 5, 23, 50])
+def test_cursor_round_trip_visits_every_track_once_in_order(client, limit):
+    pages = _all_pages(client, limit=limit)
+
+    assert all(len(page) == limit for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= limit
+    assert [track["id"] for page in pages for track in page] == _newest_first(_tracks())
+
+
+def test_cursor_round_trip_with_genre_filter_and_fields(client):
+    pages = _all_pages(client, limit=3, genre="drum_and_bass", fields="name, duration_ms")
+
+    tracks = [track for page in pages for track in page]
+    assert [track["id"] for track in tracks] == _newest_first([t for t in _tracks() if t["genre"] == "drum_and_bass"])
+    assert all(set(track) == {"id", "name", "duration_ms"} for track in tracks)
+
+
+def test_full_tracks_match_the_model(client):
+    track = client.get("/api/audio/tracks", params={"limit": 1}).json()["tracks"][0]
+
+    assert set(track) == set(server.AudioTrack.__fields__)
+    assert server.AudioTrack(**track).id == "track-22"
+
+
+@pytest.mark.parametrize("params", [{"cursor": "not-a-cursor"}, {"fields": "name,audio_base64"}, {"limit": 0}])
+def test_bad_parameters_are_rejected(client, params):
+    assert client.get("/api/audio/tracks", params=params).status_code in (400, 422)
+
+
+def test_database_error_is_a_500_not_a_truncated_page(client, monkeypatch):
+    cursor_class = type(server.db.audio_tracks.find())
+
+    async def to_list(self, length=None):
+        raise ConnectionError("connection reset mid-batch")
+
+    monkeypatch.setattr(cursor_class, "to_list", to_list)
+    response = client.get("/api/audio/tracks")
+
+    assert response.status_code == 500
+    assert "connection reset" in response.json()["detail"]
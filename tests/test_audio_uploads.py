@@ -0,0 +1,128 @@
+"""Resumable audio uploads: offsets, leases, takeover and SHA-256 dedupe, against mongomock."""
+
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+from fastapi.testclient import TestClient
+
+import server
+from bench_endpoints import InMemoryGridFS
+
+_TRACK = {"name": "Round bell", "artist": "Gym", "duration_ms": 3000}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(server, "db", mongomock_motor.AsyncMongoMockClient()["brutality_test"])
+    monkeypatch.setattr(server, "audio_fs", InMemoryGridFS())
+    # Small pieces so a few KB exercise multi-chunk appends
+    monkeypatch.setattr(server, "AUDIO_CHUNK_SIZE", 1000)
+    monkeypatch.setattr(server.app.router, "on_startup", [])
+    monkeypatch.setattr(server.app.router, "on_shutdown", [])
+    server._upload_hashes.clear()
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+
+def _open(client, **extra) -> str:
+    response = client.post("/api/audio/uploads", json={**_TRACK, **extra})
+    assert response.status_code == 201
+    return response.json()["upload_id"]
+
+
+def _append(client, upload_id: str, offset: int, data: bytes):
+    return client.post(f"/api/audio/uploads/{upload_id}/chunks", params={"offset": offset}, content=data)
+
+
+def _set_upload(client, upload_id: str, fields: dict) -> None:
+    client.portal.call(server.db.audio_uploads.update_one, {"id": upload_id}, {"$set": fields})
+
+
+def _stream(client, track: dict) -> bytes:
+    return client.get(f"/api/audio/track/{track['id']}/stream").content
+
+
+def test_out_of_order_offsets_are_rejected_with_the_resume_offset(client):
+    data = os.urandom(2500)
+    upload_id = _open(client, size_bytes=len(data))
+
+    assert _append(client, upload_id, 0, data[:1200]).json()["received_bytes"] == 1200
+    for wrong in (0, 1000, 2000):
+        response = _append(client, upload_id, wrong, data[wrong:])
+        assert response.status_code == 409
+        assert response.headers["Upload-Offset"] == "1200"
+    assert client.post(f"/api/audio/uploads/{upload_id}/finalize").status_code == 409
+
+    assert _append(client, upload_id, 1200, data[1200:]).json()["received_bytes"] == len(data)
+    track = client.post(f"/api/audio/uploads/{upload_id}/finalize").json()
+
+    assert _stream(client, track) == data
+    # Finalize is idempotent
+    assert client.post(f"/api/audio/uploads/{upload_id}/finalize").json()["id"] == track["id"]
+
+
+def test_live_append_lease_blocks_until_it_goes_stale(client):
+    data = os.urandom(1500)
+    upload_id = _open(client)
+    now = datetime.now(timezone.utc)
+
+    # A worker that claimed the upload and then died, mid-append
+    _set_upload(client, upload_id, {"appending": "dead-worker", "appending_at": now})
+    response = _append(client, upload_id, 0, data)
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Another append is in progress"
+    assert client.post(f"/api/audio/uploads/{upload_id}/finalize").status_code == 400
+
+    _set_upload(client, upload_id, {"appending_at": now - timedelta(seconds=server.AUDIO_UPLOAD_LEASE_S + 1)})
+    assert _append(client, upload_id, 0, data).json()["received_bytes"] == len(data)
+    upload = client.portal.call(server.db.audio_uploads.find_one, {"id": upload_id})
+    assert "appending" not in upload
+
+    track = client.post(f"/api/audio/uploads/{upload_id}/finalize").json()
+    assert _stream(client, track) == data
+
+
+def test_stale_finalize_is_taken_over(client):
+    data = os.urandom(2100)
+    upload_id = _open(client)
+    _append(client, upload_id, 0, data)
+    now = datetime.now(timezone.utc)
+
+    _set_upload(client, upload_id, {"status": "finalizing", "finalizing": "dead-worker", "finalizing_at": now})
+    assert client.post(f"/api/audio/uploads/{upload_id}/finalize").status_code == 409
+    assert _append(client, upload_id, len(data), b"x").status_code == 409
+
+    _set_upload(client, upload_id, {"finalizing_at": now - timedelta(seconds=server.AUDIO_UPLOAD_LEASE_S + 1)})
+    response = client.post(f"/api/audio/uploads/{upload_id}/finalize")
+    assert response.status_code == 200
+
+    upload = client.portal.call(server.db.audio_uploads.find_one, {"id": upload_id})
+    assert upload["status"] == "finalized" and "finalizing" not in upload
+    assert _stream(client, response.json()) == data
+
+
+@pytest.mark.parametrize("rehash", [False, True], ids=["running-hash", "rehash-staged"])
+def test_identical_content_is_stored_once(client, rehash):
+    data = os.urandom(3200)
+    tracks = []
+    for _ in range(2):
+        upload_id = _open(client)
+        _append(client, upload_id, 0, data[:1700])
+        _append(client, upload_id, 1700, data[1700:])
+        if rehash:
+            # As after a restart, or when finalize lands on another worker
+            server._upload_hashes.clear()
+        tracks.append(client.post(f"/api/audio/uploads/{upload_id}/finalize").json())
+
+    first, second = tracks
+    assert first["id"] != second["id"]
+    assert first["sha256"] == second["sha256"]
+    stored = client.portal.call(server.db.audio_tracks.find({}, {"_id": 0, "file_id": 1}).to_list, None)
+    assert len({track["file_id"] for track in stored}) == 1
+    assert len(server.audio_fs._files) == 1
+    assert _stream(client, second) == data
+    # Staged pieces are gone once a track owns the bytes
+    assert client.portal.call(server.db.audio_upload_chunks.count_documents, {}) == 0
@@ -0,0 +1,88 @@
+"""AuditLogSink batching and shutdown against an in-memory Mongo."""
+
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import server
+from server import AuditLogSink
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient()["brutality_test"]
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+@pytest.fixture
+def slow_inserts(db, monkeypatch):
+    """Hold every insert_many until ``release`` is set; ``started`` is set once one is in flight."""
+    collection_class = type(db.tts_requests)
+    real_insert_many = collection_class.insert_many
+    gate = {"started": None, "release": None}
+
+    async def insert_many(self, documents, *args, **kwargs):
+        gate["started"].set()
+        await gate["release"].wait()
+        return await real_insert_many(self, documents, *args, **kwargs)
+
+    monkeypatch.setattr(collection_class, "insert_many", insert_many)
+    return gate
+
+
+def test_batches_documents_per_collection(db):
+    async def scenario():
+        sink = AuditLogSink(max_batch=10, flush_interval_s=0.05)
+        for i in range(25):
+            sink.log("tts_requests" if i % 2 else "other_log", {"i": i})
+        await asyncio.sleep(0.3)
+        stats = sink.stats()
+        await sink.stop()
+        return stats, await db.tts_requests.count_documents({}), await db.other_log.count_documents({})
+
+    stats, tts_rows, other_rows = asyncio.run(scenario())
+
+    assert stats == {"pending": 0, "written": 25, "dropped": 0, "failed": 0}
+    assert (tts_rows, other_rows) == (12, 13)
+
+
+def test_stop_keeps_the_batch_being_written_and_drains_the_queue(db, slow_inserts):
+    async def scenario():
+        slow_inserts["started"], slow_inserts["release"] = asyncio.Event(), asyncio.Event()
+        sink = AuditLogSink(max_batch=5, flush_interval_s=0.01)
+        for i in range(5):
+            sink.log("tts_requests", {"i": i})
+        await slow_inserts["started"].wait()
+        # Queued behind the batch whose insert_many is in flight
+        for i in range(5, 12):
+            sink.log("tts_requests", {"i": i})
+        pending = sink.pending
+        stopping = asyncio.create_task(sink.stop())
+        await asyncio.sleep(0.05)
+        assert not stopping.done()
+        slow_inserts["release"].set()
+        await stopping
+        rows = await db.tts_requests.find({}, {"_id": 0, "i": 1}).to_list(None)
+        return pending, sink.stats(), sorted(row["i"] for row in rows)
+
+    pending, stats, written = asyncio.run(scenario())
+
+    assert pending == 12
+    assert written == list(range(12))
+    assert stats["written"] == 12 and stats["pending"] == 0
+
+
+def test_full_queue_drops_and_counts(db):
+    async def scenario():
+        sink = AuditLogSink(max_queue=3, max_batch=10, flush_interval_s=60)
+        accepted = [sink.log("tts_requests", {"i": i}) for i in range(5)]
+        await sink.stop()
+        return accepted, sink.stats(), await db.tts_requests.count_documents({})
+
+    accepted, stats, rows = asyncio.run(scenario())
+
+    assert accepted == [True, True, True, False, False]
+    assert stats["dropped"] == 2 and stats["written"] == rows == 3
@@ -0,0 +1,92 @@
+"""parse_callout against the regex chain it replaced, on fuzzed and catalog input.
+
+The legacy helpers live in benchmarks/bench_callout_parser.py, kept verbatim.
+Both sides must agree except for these intended differences, each counted
+under its own class:
+
+  digit_outside_1_4   the old full-string match accepted any digit ("1-5", "0")
+  no_moves            the old full-string match accepted separators alone ("-")
+  glued_moves         durations now count moves, so "12" / "Defense1" are two
+  named_punch         static lookups now recognise "Left hook" etc. as punches
+"""
+
+import random
+import re
+from typing import Dict
+
+import pytest
+
+import server
+from bench_callout_parser import (
+    CHATTY,
+    legacy_estimate_duration,
+    legacy_normalize,
+    legacy_static_key,
+    legacy_validate_callout,
+)
+from callouts import ParsedCallout, parse_callout
+from combos import combo_catalog
+
+FRAGMENTS = [
+    "1", "2", "3", "4", "0", "5", "9", "12", "Defense", "defense", "DEFENSE", "Defenseless", "xDefense",
+    " ", "  ", ",", "-", ", ", " - ", "\n", "\t", "Left hook", "left  straight", "Right uppercut",
+    "Right straight", "Left foot", "Here's", "here is", "Call out:", "combo:", "move:", "say", "I say",
+    '"', "'", "now", "jab", "the", "a1", "_2", "é3", "Round", "!", ".", ":", "then", "d", "l", "r",
+]
+
+
+def _fuzz_inputs(cases: int, seed: int) -> list:
+    rng = random.Random(seed)
+    inputs = ["".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 8))) for _ in range(cases)]
+    inputs += [template.format(c=entry.command) for entry in combo_catalog.entries.values() for template in CHATTY]
+    return inputs
+
+
+def classify(raw: str) -> Dict[str, str]:
+    """Expected-difference class per check that disagrees; "unexpected" is a bug."""
+    classes = {}
+    old = legacy_validate_callout(raw)
+    new = server._validate_callout(raw)
+    new_text = new.source if new is not None else None
+    if old != new_text:
+        if old is not None and re.search(r"[^\D1-4]", old):
+            classes["validate"] = "digit_outside_1_4"
+        elif old is not None and not re.search(r"[1-4]|defense", old, re.IGNORECASE):
+            classes["validate"] = "no_moves"
+        else:
+            classes["validate"] = "unexpected"
+    elif old is not None and legacy_estimate_duration(old) != new.duration_ms:
+        glued = re.search(r"[1-4]{2}|[1-4]defense|defense[1-4]|defensedefense", old, re.IGNORECASE)
+        classes["duration"] = "glued_moves" if glued else "unexpected"
+
+    parsed = parse_callout(raw)
+    if legacy_normalize(raw) != parsed.key:
+        classes["key"] = "unexpected"
+    if legacy_static_key(raw) != parsed.key_move:
+        named = any(token.kind == "punch" and not token.text.isdigit() for token in parsed.tokens)
+        classes["static"] = "named_punch" if named else "unexpected"
+    return classes
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_parser_matches_legacy_except_intended_differences(seed):
+    seen, unexpected = set(), []
+    for raw in _fuzz_inputs(10_000, seed):
+        for check, outcome in classify(raw).items():
+            seen.add(outcome)
+            if outcome == "unexpected":
+                unexpected.append((check, raw))
+
+    assert not unexpected, unexpected[:10]
+    # The fuzz is wide enough to reach every intended difference
+    assert seen == {"digit_outside_1_4", "no_moves", "glued_moves", "named_punch"}
+
+
+def test_ascii_summary_matches_token_scan():
+    for raw in _fuzz_inputs(10_000, 2):
+        fast = ParsedCallout(raw)
+        scanned = ParsedCallout(raw)
+        scanned._summarize_groups(scanned.groups)
+        assert (fast.move_count, fast.is_numeric, fast.key_move) == (
+            scanned.move_count, scanned.is_numeric, scanned.key_move,
+        ), raw
@@ -0,0 +1,24 @@
+"""Rule-based combo draws from the precompiled catalog."""
+
+import pytest
+
+from combos import DEFENSE, INTENSITY_LEVELS, combo_catalog, seeded_rng
+
+
+def _defense_rate(complexity: float, intensity: float, draws: int = 4000) -> float:
+    rng = seeded_rng("defense-rate", complexity, intensity)
+    table = combo_catalog.callout_table(complexity, intensity)
+    return sum(DEFENSE in table.sample(rng).moves for _ in range(draws)) / draws
+
+
+@pytest.mark.parametrize("complexity", [0.55, 0.8])  # numbered and named combos
+def test_defense_follows_unrounded_intensity_around_half(complexity):
+    # 0.51 rounds to the 0.5 level, which must not switch Defense off
+    assert _defense_rate(complexity, 0.51) == pytest.approx(0.51, abs=1 / INTENSITY_LEVELS + 0.03)
+    assert _defense_rate(complexity, 0.49) == 0.0
+    assert _defense_rate(complexity, 0.5) == 0.0
+
+
+def test_defense_rate_tracks_intensity_above_half():
+    for intensity in (0.6, 0.75, 0.9, 1.0):
+        assert _defense_rate(0.8, intensity) == pytest.approx(intensity, abs=1 / INTENSITY_LEVELS + 0.03)
@@ -0,0 +1,43 @@
+"""IndexManager against an in-memory Mongo: specs are built, retired indexes dropped."""
+
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import server
+from server import INDEX_SPECS, RETIRED_INDEXES, IndexManager
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient()["brutality_test"]
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+def test_retired_track_indexes_are_dropped_after_the_new_ones_exist(db):
+    async def scenario():
+        # What the track listing indexes looked like before keyset pagination
+        await db.audio_tracks.create_index([("genre", 1), ("created_at", -1)], name="genre_created_at")
+        await db.audio_tracks.create_index([("created_at", -1)], name="created_at")
+        manager = IndexManager(INDEX_SPECS, RETIRED_INDEXES)
+        await manager.ensure_all()
+        first = manager.stats(), set(await db.audio_tracks.index_information())
+        # Every boot runs this; the second pass finds nothing to drop
+        await manager.ensure_all()
+        return first, manager.stats()
+
+    (stats, indexes), again = asyncio.run(scenario())
+
+    assert {"genre_created_at_id", "created_at_id"} <= indexes
+    assert not {"genre_created_at", "created_at"} & indexes
+    assert stats["state"] == again["state"] == "ready"
+    assert stats["indexes"]["audio_tracks.created_at"] == {"state": "dropped"}
+
+
+def test_spec_indexes_are_never_retired():
+    specs = {(spec.collection, spec.name) for spec in INDEX_SPECS}
+
+    assert not specs & set(RETIRED_INDEXES)
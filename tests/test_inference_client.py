@@ -0,0 +1,95 @@
+"""InferenceClient readiness against a stand-in worker on a Unix socket."""
+
+import asyncio
+import json
+
+import pytest
+
+import server
+from server import InferenceClient, LlmEngine
+
+
+class FakeWorker:
+    """Answers pings over the inference_worker.py protocol; not ready for the first ``loading_pings``."""
+
+    def __init__(self, socket_path: str, loading_pings: int):
+        self.socket_path = socket_path
+        self.loading_pings = loading_pings
+        self.pings = 0
+        self._server = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_unix_server(self._serve, path=self.socket_path)
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader, writer) -> None:
+        while line := await reader.readline():
+            request = json.loads(line)
+            self.pings += 1
+            ready = self.pings > self.loading_pings
+            writer.write(json.dumps({"id": request["id"], "ready": ready, "backlog": 0}).encode() + b"\n")
+            await writer.drain()
+        writer.close()
+
+
+@pytest.fixture
+def engine(monkeypatch, tmp_path):
+    socket_path = str(tmp_path / "worker.sock")
+    monkeypatch.setenv("LLM_WORKER_SOCKET", socket_path)
+    monkeypatch.setattr(LlmEngine, "_loaded", False)
+    monkeypatch.setattr(LlmEngine, "_remote", None)
+    monkeypatch.setattr(LlmEngine, "_load_task", None)
+    monkeypatch.setattr(LlmEngine, "_load_status", dict(LlmEngine._load_status))
+    # Keep the retries fast; the schedule is what is under test, not the defaults
+    wait_ready = InferenceClient.wait_ready
+
+    def fast_wait_ready(self, progress=None):
+        return wait_ready(self, progress, initial_delay=0.01, max_delay=0.08, poll_interval=0.01)
+
+    monkeypatch.setattr(InferenceClient, "wait_ready", fast_wait_ready)
+    return socket_path
+
+
+def test_keeps_loading_until_a_late_worker_is_ready(engine, monkeypatch):
+    # No pool refills against the stand-in worker once it is ready
+    monkeypatch.setattr(server.callout_pool, "high_watermark", 0)
+
+    async def scenario():
+        task = LlmEngine.start_loading()
+        # Several backed-off retries in, the worker is not even listening yet
+        await asyncio.sleep(0.5)
+        waiting = LlmEngine.status()
+        worker = FakeWorker(engine, loading_pings=3)
+        await worker.start()
+        await asyncio.wait_for(task, timeout=5)
+        ready = LlmEngine.status()
+        await LlmEngine.shutdown()
+        await worker.stop()
+        return waiting, ready, worker.pings
+
+    waiting, ready, pings = asyncio.run(scenario())
+
+    assert waiting["state"] == "loading" and waiting["loading"] and not waiting["ready"]
+    assert "worker unreachable" in waiting["stage"]
+    assert ready["state"] == "ready" and ready["ready"]
+    assert pings == 4
+
+
+def test_unreachable_retries_back_off():
+    async def scenario():
+        notes = []
+        client = InferenceClient("/nonexistent/worker.sock")
+        waiting = asyncio.create_task(client.wait_ready(notes.append, initial_delay=0.01, max_delay=0.04))
+        await asyncio.sleep(0.3)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        return notes
+
+    notes = asyncio.run(scenario())
+
+    delays = [note.rsplit("retrying in ", 1)[1] for note in notes]
+    assert delays[:4] == ["0.01s", "0.02s", "0.04s", "0.04s"]
@@ -0,0 +1,121 @@
+"""Greedy-decoding parity: prefix cache on vs off, and PyTorch vs ONNX Runtime.
+
+A tiny random-init Llama (two layers, a BPE tokenizer trained on prompt-like
+text) is built once per session, so these run offline in a few seconds. With
+``top_k=1`` both backends decode greedily, so any difference in outputs is a
+bug in the cache layout, padding, position ids or the ONNX decode loop.
+"""
+
+from pathlib import Path
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+import server
+from server import CALLOUT_GRAMMARS, MUSCLE_SYSTEM, TokenVocabulary, _build_callout_messages
+
+_CORPUS = [
+    "1-2 Defense 3, 1-2-3-4 Left hook Right uppercut",
+    '{"primary": ["anterior deltoid", "triceps brachii"], "secondary": ["core"], "description": "A fast punch."}',
+    "You are a boxing trainer calling out combinations during a workout. Respond with ONLY the combination",
+    "Round 1, single move, no Defense. Previous: 4. Choose something different. Move: obliques biceps glutes",
+] * 50
+
+_CHAT_TEMPLATE = (
+    "{% for message in messages %}"
+    "{{ '<|' + message['role'] + '|>\n' + message['content'] + eos_token }}"
+    "{% if loop.last and add_generation_prompt %}{{ '<|assistant|>' }}{% endif %}"
+    "{% endfor %}"
+)
+
+
+@pytest.fixture(scope="session")
+def tiny_model_dir(tmp_path_factory) -> Path:
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+    path = tmp_path_factory.mktemp("tiny_llama")
+    bpe = Tokenizer(models.BPE(unk_token="<unk>"))
+    bpe.pre_tokenizer = pre_tokenizers.Metaspace()
+    bpe.decoder = decoders.Metaspace()
+    bpe.train_from_iterator(_CORPUS, trainers.BpeTrainer(
+        vocab_size=600,
+        special_tokens=["<unk>", "<s>", "</s>"],
+        initial_alphabet=list("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 ,.-'\"{}[]:()|<>/\n"),
+    ))
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=bpe, bos_token="<s>", eos_token="</s>", unk_token="<unk>")
+    tokenizer.chat_template = _CHAT_TEMPLATE
+    tokenizer.save_pretrained(path)
+
+    torch.manual_seed(0)
+    config = LlamaConfig(
+        vocab_size=len(tokenizer), hidden_size=64, intermediate_size=128, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=512,
+        bos_token_id=1, eos_token_id=2,
+        # Larger than the default 0.02 so outputs depend on the prompt, not just the position
+        initializer_range=0.2,
+    )
+    LlamaForCausalLM(config).save_pretrained(path)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def greedy(monkeypatch):
+    # top_k=1 turns both samplers into argmax; the repetition penalty still applies in both
+    monkeypatch.setattr(server, "LLM_SAMPLING", {**server.LLM_SAMPLING, "top_k": 1})
+
+
+def _load(model_class, model_id: Path, backend: str) -> server._LoadedModel:
+    state = model_class.load(str(model_id), backend, lambda stage, progress: None)
+    state.vocab = TokenVocabulary(state.tokenizer)
+    return state
+
+
+def _batches() -> list:
+    """Rows of different prompt lengths, so left padding is exercised."""
+    muscle = [{"role": "system", "content": MUSCLE_SYSTEM}, {"role": "user", "content": "Move: Left hook"}]
+    return [
+        ([_build_callout_messages(0.2, 0.3, 1, ""), _build_callout_messages(0.9, 0.8, 7, "1-2")], None),
+        ([_build_callout_messages(0.5, 0.5, 3, "3")], CALLOUT_GRAMMARS[(1, 0)]),
+        ([muscle, [muscle[0], {"role": "user", "content": "Move: 1-2-3-4 Defense"}]], None),
+    ]
+
+
+def _generate_all(state: server._LoadedModel) -> list:
+    return [state.generate_batch(messages, 12, grammar) for messages, grammar in _batches()]
+
+
+def test_prefix_cache_does_not_change_output(tiny_model_dir):
+    state = _load(server._TorchModel, tiny_model_dir, "tinyllama")
+    uncached = _generate_all(state)
+
+    for system_prompt in (server.CALLOUT_SYSTEM, MUSCLE_SYSTEM):
+        state.prefill_system_prompt(system_prompt)
+    assert state.prefix_caches
+    cached = _generate_all(state)
+
+    assert cached == uncached
+    assert all(text for batch in uncached for text in batch)
+
+
+@pytest.mark.parametrize("prefix_cache", [False, True])
+def test_onnx_matches_torch(tiny_model_dir, tmp_path, prefix_cache):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    import export_onnx
+
+    export_onnx.export(str(tiny_model_dir), tmp_path / "exported.onnx", 17)
+    onnx_dir = tmp_path / "onnx"
+    onnx_dir.mkdir()
+    export_onnx.consolidate(tmp_path / "exported.onnx", onnx_dir / "model.onnx")
+    server._TorchModel._load_tokenizer(str(tiny_model_dir)).save_pretrained(onnx_dir)
+
+    torch_state = _load(server._TorchModel, tiny_model_dir, "tinyllama")
+    onnx_state = _load(server._OnnxModel, onnx_dir, "tinyllama-onnx")
+    if prefix_cache:
+        for state in (torch_state, onnx_state):
+            for system_prompt in (server.CALLOUT_SYSTEM, MUSCLE_SYSTEM):
+                state.prefill_system_prompt(system_prompt)
+    assert _generate_all(onnx_state) == _generate_all(torch_state)
@@ -0,0 +1,208 @@
+"""LlmBatcher scheduling, admission control and mid-decode aborts, against a fake model."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+import server
+from server import LlmBatcher, LlmEngine, LlmOverloaded, _AbortCriteria, _LoadedModel
+
+
+class _CharTokenizer:
+    """Just enough tokenizer for _finish_batch: a "token" is one character."""
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(ids)
+
+
+class FakeModel(_LoadedModel):
+    """Decodes the user message one character per step, ``step_seconds`` per step.
+
+    Records each batch it ran and how many steps every row got, and can hold
+    the model thread at the start of a batch until ``release`` is set.
+    """
+
+    def __init__(self, step_seconds: float = 0.01):
+        super().__init__("fake", "fake", _CharTokenizer())
+        self.step_seconds = step_seconds
+        self.batches = []
+        self.row_steps = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    @classmethod
+    def load(cls, model_id, backend, progress):
+        return cls()
+
+    def _prefill(self, prefix_ids):
+        return ()
+
+    def generate_batch(self, batch_messages, max_new_tokens, grammar=None, controls=None):
+        targets = [messages[-1]["content"] for messages in batch_messages]
+        self.batches.append(targets)
+        self.started.set()
+        self.release.wait()
+        abort = _AbortCriteria(controls or [None] * len(targets))
+        rows = [[] for _ in targets]
+        started = time.perf_counter()
+        for step in range(max_new_tokens):
+            stopped = abort.poll()
+            live = [row for row, target in enumerate(targets) if not stopped[row] and step < len(target)]
+            if not live:
+                break
+            time.sleep(self.step_seconds)
+            for row in live:
+                rows[row].append(targets[row][step])
+        self.row_steps.append([len(row) for row in rows])
+        return self._finish_batch(grammar, rows, [len(row) for row in rows], time.perf_counter() - started, abort.aborted)
+
+
+def _messages(text: str) -> list:
+    return [{"role": "user", "content": text}]
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = FakeModel()
+    monkeypatch.setattr(LlmEngine, "_state", fake)
+    return fake
+
+
+async def _hold_model(batcher: LlmBatcher, model: FakeModel) -> asyncio.Task:
+    """Start a request and keep the model busy with it until ``model.release`` is set."""
+    model.release.clear()
+    blocker = asyncio.create_task(batcher.submit(_messages("hold"), 8))
+    await asyncio.to_thread(model.started.wait)
+    return blocker
+
+
+def _arrivals() -> list:
+    soon = time.time() + 30
+    later = time.time() + 60
+    return [
+        ("pool-1", "pool", None),
+        ("tip-later", "break_tip", later),
+        ("callout-none", "callout", None),
+        ("tip-soon", "break_tip", soon),
+        ("callout-later", "callout", later),
+        ("pool-2", "pool", None),
+        ("callout-soon", "callout", soon),
+    ]
+
+
+def test_queue_runs_by_priority_then_deadline_then_arrival(model):
+    async def scenario():
+        batcher = LlmBatcher(max_batch_size=1, max_wait_ms=0)
+        blocker = await _hold_model(batcher, model)
+        requests = _arrivals()
+        tasks = [
+            asyncio.create_task(batcher.submit(_messages(text), 32, deadline=deadline, priority=priority))
+            for text, priority, deadline in requests
+        ]
+        await asyncio.sleep(0.05)
+        model.release.set()
+        results = await asyncio.gather(blocker, *tasks)
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert results == ["hold", *(text for text, _, _ in _arrivals())]
+    assert [batch[0] for batch in model.batches[1:]] == [
+        "callout-soon", "callout-later", "callout-none", "tip-soon", "tip-later", "pool-1", "pool-2",
+    ]
+
+
+def test_full_queue_rejects_lower_priority_and_evicts_for_higher(model):
+    async def scenario():
+        batcher = LlmBatcher(max_batch_size=1, max_wait_ms=0, max_queue_depth=2)
+        blocker = await _hold_model(batcher, model)
+        tip = asyncio.create_task(batcher.submit(_messages("tip"), 8, priority="break_tip"))
+        pool = asyncio.create_task(batcher.submit(_messages("pool"), 8, priority="pool"))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(LlmOverloaded, match="queue is full"):
+            await batcher.submit(_messages("pool-late"), 8, priority="pool")
+
+        callout = asyncio.create_task(batcher.submit(_messages("callout"), 8, priority="callout"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(LlmOverloaded, match="evicted"):
+            await pool
+
+        model.release.set()
+        results = await asyncio.gather(blocker, tip, callout)
+        await batcher.stop()
+        return results
+
+    assert asyncio.run(scenario()) == ["hold", "tip", "callout"]
+    assert [batch[0] for batch in model.batches] == ["hold", "callout", "tip"]
+
+
+def test_rejects_a_deadline_recent_batches_say_it_would_miss(model):
+    model.step_seconds = 0.02
+
+    async def scenario():
+        batcher = LlmBatcher(max_batch_size=1, max_wait_ms=0)
+        # One finished batch (~10 steps) teaches the batcher how long a batch takes
+        assert await batcher.submit(_messages("a" * 10), 16) == "a" * 10
+
+        with pytest.raises(LlmOverloaded, match="deadline"):
+            await batcher.submit(_messages("late"), 16, deadline=time.time() + 0.01)
+        # A deadline that leaves room for a batch is still admitted
+        result = await batcher.submit(_messages("on time"), 16, deadline=time.time() + 5)
+        await batcher.stop()
+        return result
+
+    assert asyncio.run(scenario()) == "on time"
+    assert len(model.batches) == 2
+
+
+def test_cancelled_row_stops_while_rest_of_batch_finishes(model):
+    model.step_seconds = 0.02
+    aborted = server.LLM_GENERATIONS_ABORTED.labels("decoding", "cancelled")
+    aborted_before = aborted._value.get()
+    texts = ["first row text", "second row txt", "third row text"]
+
+    async def scenario():
+        batcher = LlmBatcher(max_batch_size=3, max_wait_ms=50)
+        tasks = [asyncio.create_task(batcher.submit(_messages(text), 32)) for text in texts]
+        await asyncio.to_thread(model.started.wait)
+        await asyncio.sleep(0.06)
+        tasks[1].cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert model.batches == [texts]
+    assert results[0] == texts[0] and results[2] == texts[2]
+    assert isinstance(results[1], asyncio.CancelledError)
+    steps = model.row_steps[0]
+    assert steps[0] == len(texts[0]) and steps[2] == len(texts[2])
+    assert 0 < steps[1] < len(texts[1])
+    assert aborted._value.get() == aborted_before + 1
+
+
+def test_deadline_during_decode_times_out_only_that_row(model):
+    model.step_seconds = 0.02
+
+    async def scenario():
+        batcher = LlmBatcher(max_batch_size=2, max_wait_ms=50)
+        hurried = asyncio.create_task(
+            batcher.submit(_messages("x" * 30), 32, deadline=time.time() + 0.2)
+        )
+        patient = asyncio.create_task(batcher.submit(_messages("y" * 30), 32))
+        results = await asyncio.gather(hurried, patient, return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    hurried, patient = asyncio.run(scenario())
+
+    assert isinstance(hurried, asyncio.TimeoutError)
+    assert patient == "y" * 30
+    assert model.row_steps[0][0] < 30
+
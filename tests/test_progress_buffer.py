@@ -0,0 +1,105 @@
+"""ProgressBuffer flushes against an in-memory Mongo: requeue on failure, never a double write."""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import server
+from server import ProgressBuffer, ProgressEvent
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient()["brutality_test"]
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+def _events(round_number: int, moves: int, complete: bool = False) -> list:
+    start = datetime(2026, 1, 1) + timedelta(minutes=round_number)
+    events = [
+        ProgressEvent(round_number=round_number, offset_ms=i * 1000, command="1-2",
+                      timestamp=start + timedelta(seconds=i))
+        for i in range(moves)
+    ]
+    if complete:
+        events.append(ProgressEvent(type="round_complete", round_number=round_number, complexity=0.5,
+                                    intensity=0.5, timestamp=start + timedelta(seconds=moves)))
+    return events
+
+
+def _fail_bucket_writes(monkeypatch, db, fail_index=None, times: int = 1) -> list:
+    """Make the next ``times`` bucket bulk writes fail, wholly or just op ``fail_index``."""
+    collection_class = type(db.workout_progress)
+    real_bulk_write = collection_class.bulk_write
+    calls = []
+
+    async def bulk_write(self, requests, ordered=True, **kwargs):
+        if self.name != "workout_progress":
+            return await real_bulk_write(self, requests, ordered=ordered, **kwargs)
+        calls.append(len(requests))
+        if len(calls) > times:
+            return await real_bulk_write(self, requests, ordered=ordered, **kwargs)
+        if fail_index is None:
+            raise ConnectionError("primary stepped down")
+        applied = [op for index, op in enumerate(requests) if index != fail_index]
+        await real_bulk_write(self, applied, ordered=ordered, **kwargs)
+        raise BulkWriteError({"writeErrors": [{"index": fail_index, "code": 11000, "errmsg": "E11000"}]})
+
+    monkeypatch.setattr(collection_class, "bulk_write", bulk_write)
+    return calls
+
+
+async def _stored(db, session_id: str) -> list:
+    buckets = await db.workout_progress.find({"session_id": session_id}).to_list(None)
+    return sorted((event["offset_ms"], event["type"]) for bucket in buckets for event in bucket["events"])
+
+
+def test_failed_flush_requeues_everything_for_the_next_one(db, monkeypatch):
+    calls = _fail_bucket_writes(monkeypatch, db)
+    events = _events(1, 5, complete=True)
+
+    async def scenario():
+        await db.workout_sessions.insert_one({"id": "s1", "rounds_completed": 0})
+        buffer = ProgressBuffer(max_batch_events=1000, flush_interval_s=60)
+        buffer.add("s1", events)
+        assert await buffer.flush() == 0
+        assert buffer.pending == len(events)
+        assert await buffer.flush() == len(events)
+        await buffer.stop()
+        return await _stored(db, "s1"), await db.workout_sessions.find_one({"id": "s1"})
+
+    stored, session = asyncio.run(scenario())
+
+    assert len(calls) == 2
+    assert stored == sorted((e.offset_ms, e.type) for e in events)
+    assert session["rounds_completed"] == 1
+    assert session["complexity_progression"] == [0.5]
+
+
+def test_partial_bulk_write_failure_requeues_only_the_failed_ops(db, monkeypatch):
+    # One chunk per round: op 0 holds round 1, op 1 holds round 2
+    _fail_bucket_writes(monkeypatch, db, fail_index=0)
+    round_one, round_two = _events(1, 3, complete=True), _events(2, 3, complete=True)
+
+    async def scenario():
+        await db.workout_sessions.insert_one({"id": "s1", "rounds_completed": 0})
+        buffer = ProgressBuffer(max_batch_events=1000, flush_interval_s=60)
+        buffer.add("s1", round_one + round_two)
+        first = await buffer.flush()
+        after_first = buffer.pending
+        second = await buffer.flush()
+        await buffer.stop()
+        return first, after_first, second, await _stored(db, "s1"), await db.workout_sessions.find_one({"id": "s1"})
+
+    first, after_first, second, stored, session = asyncio.run(scenario())
+
+    assert (first, after_first, second) == (len(round_two), len(round_one), len(round_one))
+    # Round 2 was applied by the partial write and must not have been pushed again
+    assert stored == sorted((e.offset_ms, e.type) for e in round_one + round_two)
+    assert session["rounds_completed"] == 2
+    assert sorted(session["complexity_progression"]) == [0.5, 0.5]
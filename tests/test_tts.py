@@ -0,0 +1,23 @@
+"""The pooled OpenAI client behind TTS cache misses."""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("openai")
+
+import tts
+
+
+def test_client_is_shared_per_api_key():
+    try:
+        first = tts.get_openai_client("key-one")
+        assert tts.get_openai_client("key-one") is first
+        # A rotated key must not keep authenticating with the old one
+        rotated = tts.get_openai_client("key-two")
+        assert rotated is not first
+        assert (first.api_key, rotated.api_key) == ("key-one", "key-two")
+    finally:
+        asyncio.run(tts.close_openai_client())
+    assert tts.get_openai_client("key-one") is not first
+    asyncio.run(tts.close_openai_client())